@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import copy
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Roaring-style layout: row ids are split into 2^16-row chunks; a chunk holds either a sorted
+# uint16 array (sparse) or a 1024-word uint64 bitmap (dense)
+_CHUNK_BITS = 16
+_CHUNK_ROWS = 1 << _CHUNK_BITS
+_ARRAY_MAX = 4096
+
+
+def _popcount(words: np.ndarray) -> int:
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def _dense(container: np.ndarray) -> np.ndarray:
+    """container → 1024 個 uint64 的點陣（已是點陣時直接回傳）。"""
+    if container.dtype == np.uint64:
+        return container
+    mask = np.zeros(_CHUNK_ROWS, dtype=bool)
+    mask[container] = True
+    return np.packbits(mask, bitorder="little").view(np.uint64)
+
+
+def _low_rows(words: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _shrink(words: np.ndarray) -> Optional[np.ndarray]:
+    """點陣結果依筆數轉回適合的容器；空的回傳 None。"""
+    card = _popcount(words)
+    if card == 0:
+        return None
+    return _low_rows(words) if card <= _ARRAY_MAX else words
+
+
+def _bits_of(words: np.ndarray, low: np.ndarray) -> np.ndarray:
+    idx = low.astype(np.int64)
+    return ((words[idx >> 6] >> (idx & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+class RowBitmap:
+    """
+    壓縮的列集合（roaring 風格）：每 65536 列一個容器，稀疏時為遞增 uint16 陣列，稠密時為點陣。
+    AND / OR / ANDNOT 只處理兩邊都有的容器，筆數（cardinality）建立時即已知。
+    """
+
+    __slots__ = ("_keys", "_containers", "cardinality")
+
+    def __init__(self, keys: Sequence[int], containers: Sequence[np.ndarray]):
+        self._keys: List[int] = list(keys)
+        self._containers: List[np.ndarray] = list(containers)
+        self.cardinality = int(sum(_popcount(c) if c.dtype == np.uint64 else c.size for c in self._containers))
+
+    # ====== 建立 ======
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "RowBitmap":
+        """rows 需遞增且不重複。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return cls([], [])
+        high = rows >> _CHUNK_BITS
+        starts = np.flatnonzero(np.r_[True, high[1:] != high[:-1]])
+        ends = np.r_[starts[1:], rows.size]
+        keys, containers = [], []
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            low = (rows[s:e] & (_CHUNK_ROWS - 1)).astype(np.uint16)
+            keys.append(int(high[s]))
+            containers.append(low if low.size <= _ARRAY_MAX else _dense(low))
+        return cls(keys, containers)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "RowBitmap":
+        return cls.from_rows(np.flatnonzero(mask))
+
+    @classmethod
+    def full(cls, n: int) -> "RowBitmap":
+        return cls.from_rows(np.arange(n, dtype=np.int64))
+
+    # ====== 集合運算 ======
+    def __and__(self, other: "RowBitmap") -> "RowBitmap":
+        keys, out = [], []
+        theirs = dict(zip(other._keys, other._containers))
+        for k, a in zip(self._keys, self._containers):
+            b = theirs.get(k)
+            if b is None:
+                continue
+            if a.dtype == np.uint16 and b.dtype == np.uint16:
+                c = np.intersect1d(a, b, assume_unique=True)
+            elif a.dtype == np.uint16:
+                c = a[_bits_of(b, a)]
+            elif b.dtype == np.uint16:
+                c = b[_bits_of(a, b)]
+            else:
+                c = _shrink(a & b)
+            if c is not None and c.size:
+                keys.append(k)
+                out.append(c)
+        return RowBitmap(keys, out)
+
+    def __or__(self, other: "RowBitmap") -> "RowBitmap":
+        merged: Dict[int, np.ndarray] = dict(zip(self._keys, self._containers))
+        for k, b in zip(other._keys, other._containers):
+            a = merged.get(k)
+            if a is None:
+                merged[k] = b
+            elif a.dtype == np.uint16 and b.dtype == np.uint16 and a.size + b.size <= _ARRAY_MAX:
+                merged[k] = np.union1d(a, b)
+            else:
+                merged[k] = _dense(a) | _dense(b)
+        keys = sorted(merged)
+        return RowBitmap(keys, [merged[k] for k in keys])
+
+    def andnot(self, other: "RowBitmap") -> "RowBitmap":
+        keys, out = [], []
+        theirs = dict(zip(other._keys, other._containers))
+        for k, a in zip(self._keys, self._containers):
+            b = theirs.get(k)
+            if b is None:
+                c = a
+            elif a.dtype == np.uint16 and b.dtype == np.uint16:
+                c = np.setdiff1d(a, b, assume_unique=True)
+            elif a.dtype == np.uint16:
+                c = a[~_bits_of(b, a)]
+            else:
+                c = _shrink(a & ~_dense(b))
+            if c is not None and c.size:
+                keys.append(k)
+                out.append(c)
+        return RowBitmap(keys, out)
+
+    @staticmethod
+    def union_all(bitmaps: Sequence["RowBitmap"]) -> "RowBitmap":
+        """多個集合的聯集：每個容器位置只合併一次（不逐一兩兩 OR）。"""
+        parts: Dict[int, List[np.ndarray]] = {}
+        for b in bitmaps:
+            for k, c in zip(b._keys, b._containers):
+                parts.setdefault(k, []).append(c)
+        keys = sorted(parts)
+        out = []
+        for k in keys:
+            cs = parts[k]
+            if len(cs) == 1:
+                out.append(cs[0])
+            elif all(c.dtype == np.uint16 for c in cs) and sum(c.size for c in cs) <= _ARRAY_MAX:
+                out.append(np.unique(np.concatenate(cs)))
+            else:
+                out.append(np.bitwise_or.reduce([_dense(c) for c in cs]))
+        return RowBitmap(keys, out)
+
+    # ====== 輸出 ======
+    def __len__(self) -> int:
+        return self.cardinality
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(c.nbytes for c in self._containers))
+
+    def to_rows(self) -> np.ndarray:
+        """遞增的 int32 列索引。"""
+        parts = []
+        for k, c in zip(self._keys, self._containers):
+            low = _low_rows(c) if c.dtype == np.uint64 else c
+            parts.append(low.astype(np.int32) + np.int32(k << _CHUNK_BITS))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+    def to_mask(self, n: int) -> np.ndarray:
+        mask = np.zeros(n, dtype=bool)
+        mask[self.to_rows()] = True
+        return mask
+
+    def contains_rows(self, rows: np.ndarray) -> np.ndarray:
+        """rows 中每一列是否在集合內（rows 任意順序）。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.zeros(rows.shape, dtype=bool)
+        high = rows >> _CHUNK_BITS
+        for k, c in zip(self._keys, self._containers):
+            sel = np.flatnonzero(high == k)
+            if sel.size == 0:
+                continue
+            low = (rows[sel] & (_CHUNK_ROWS - 1)).astype(np.uint16)
+            if c.dtype == np.uint64:
+                out[sel] = _bits_of(c, low)
+            else:
+                pos = np.minimum(np.searchsorted(c, low), c.size - 1)
+                out[sel] = c[pos] == low
+        return out
+
+
+class FilterBitmaps:
+    """
+    布林與類別篩選的點陣索引：每個系所、每個核心通識位元、各旗標（通識 / 體育 / 教育學程 / 未滿額 / TBA）各一個 RowBitmap。
+    """
+
+    def __init__(self, n: int, dept_codes: np.ndarray, n_depts: int, gened_mask: np.ndarray, n_core_bits: int, flags: Dict[str, np.ndarray]):
+        self.n = int(n)
+        codes = np.asarray(dept_codes, dtype=np.int64)
+        order = np.argsort(codes, kind="stable")
+        offsets = np.r_[0, np.cumsum(np.bincount(codes, minlength=n_depts))]
+        self.dept = [RowBitmap.from_rows(order[offsets[i]:offsets[i + 1]]) for i in range(n_depts)]
+        gened_mask = np.asarray(gened_mask, dtype=np.uint32)
+        self.gened_core = [RowBitmap.from_mask((gened_mask & np.uint32(1 << b)) != 0) for b in range(n_core_bits)]
+        self.flags = {name: RowBitmap.from_mask(np.asarray(m, dtype=bool)) for name, m in flags.items()}
+
+    def with_flags(self, flags: Dict[str, np.ndarray]) -> "FilterBitmaps":
+        """只重建指定旗標的副本；系所、核心通識與其餘旗標沿用同一批 RowBitmap。"""
+        out = copy.copy(self)
+        out.flags = dict(self.flags)
+        for name, m in flags.items():
+            out.flags[name] = RowBitmap.from_mask(np.asarray(m, dtype=bool))
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(b.nbytes for b in self.dept + self.gened_core + list(self.flags.values())))
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional, Tuple
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from app_constants import COURSE_WATCH_SETTLE_MS
+
+# (檔案大小, 修改時間 ns)
+ExportSignature = Tuple[int, int]
+
+
+def is_course_excel_name(fn: str) -> bool:
+    lf = fn.lower()
+    if not (lf.endswith(".xls") or lf.endswith(".xlsx")):
+        return False
+    if lf.startswith("~$"):
+        return False
+    # Backup left next to the original when an xlsx gets its namespaces patched (app_excel)
+    if lf.endswith(".bak.xlsx"):
+        return False
+    return True
+
+
+def scan_course_inputs(folder: str) -> Dict[str, ExportSignature]:
+    """列出資料夾內的課程 Excel 與其 (大小, 修改時間)。"""
+    out: Dict[str, ExportSignature] = {}
+    try:
+        entries = os.scandir(folder)
+    except OSError:
+        return out
+    with entries:
+        for entry in entries:
+            if not is_course_excel_name(entry.name):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            out[entry.path] = (int(st.st_size), int(st.st_mtime_ns))
+    return out
+
+
+def pick_changed_export(baseline: Dict[str, ExportSignature], current: Dict[str, ExportSignature]) -> Optional[str]:
+    """回傳新增或被取代的課程檔中修改時間最新者；沒有則回傳 None（僅刪除不算）。"""
+    changed = [p for p, sig in current.items() if sig[0] > 0 and baseline.get(p) != sig]
+    if not changed:
+        return None
+    return max(changed, key=lambda p: (current[p][1], os.path.basename(p).casefold()))
+
+
+def _readable(path: str) -> bool:
+    # Writers on Windows keep the file locked until they are done
+    try:
+        with open(path, "rb") as f:
+            f.read(1)
+        return True
+    except OSError:
+        return False
+
+
+class CourseInputWatcher(QObject):
+    """
+    監看 course_inputs：資料夾或課程檔異動後等待寫入穩定（連續兩次掃描相同且可讀取），
+    再以 exportReady(path) 回報新增或被取代的課程檔。
+    """
+
+    exportReady = Signal(str)
+
+    def __init__(self, folder: str, settle_ms: int = COURSE_WATCH_SETTLE_MS, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.folder = os.fspath(folder)
+        self._baseline = scan_course_inputs(self.folder)
+        self._pending: Optional[Dict[str, ExportSignature]] = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(settle_ms))
+        self._timer.timeout.connect(self._check_settled)
+
+        self._fs = QFileSystemWatcher(self)
+        self._fs.directoryChanged.connect(self._on_fs_event)
+        self._fs.fileChanged.connect(self._on_fs_event)
+        if os.path.isdir(self.folder):
+            self._fs.addPath(self.folder)
+        self._sync_watched_files(self._baseline)
+
+    def acknowledge(self) -> None:
+        """以目前資料夾內容為基準（例如程式自己複製檔案進來之後），不觸發載入。"""
+        self._baseline = scan_course_inputs(self.folder)
+        self._pending = None
+        self._sync_watched_files(self._baseline)
+
+    def _sync_watched_files(self, scan: Dict[str, ExportSignature]) -> None:
+        # Replaced files drop out of QFileSystemWatcher, so re-add after every scan
+        watched = set(self._fs.files())
+        missing = [p for p in scan if p not in watched]
+        gone = [p for p in watched if p not in scan]
+        if missing:
+            self._fs.addPaths(missing)
+        if gone:
+            self._fs.removePaths(gone)
+
+    def _on_fs_event(self, _path: str) -> None:
+        if not self._timer.isActive():
+            self._pending = scan_course_inputs(self.folder)
+        self._timer.start()
+
+    def _check_settled(self) -> None:
+        scan = scan_course_inputs(self.folder)
+        self._sync_watched_files(scan)
+        if scan != self._pending:
+            # Still being written: wait another settle interval
+            self._pending = scan
+            self._timer.start()
+            return
+
+        path = pick_changed_export(self._baseline, scan)
+        if path is not None and not _readable(path):
+            self._timer.start()
+            return
+
+        self._pending = None
+        self._baseline = scan
+        if path is not None:
+            self.exportReady.emit(path)
@@ -8,6 +8,7 @@ WORKSPACE_ROOT = Path(__file__).resolve().parent
 USER_DATA_ROOT_DIRNAME = "user_data"
 USER_DATA_STORE_DIRNAME = "user_schedules"
 COURSE_INPUT_DIRNAME = "course_inputs"
+COURSE_SNAPSHOT_DIRNAME = ".snapshot"
 
 
 def runtime_root_path() -> Path:
@@ -48,6 +49,24 @@ REQUIRED_COLUMNS = [
     "選修人數",
 ]
 
+# ====== 分塊載入（低記憶體機器）======
+# 課程檔超過此大小時改用分塊載入（app_ingest），避免原始表與衍生表同時完整存在於記憶體
+COURSE_INGEST_CHUNKED_MIN_BYTES = 8 * 1024 * 1024
+# 載入時回報的工作記憶體上限（MB）；區塊大小會依此自動縮小
+COURSE_INGEST_MEMORY_CEILING_MB = 256
+COURSE_INGEST_CHUNK_ROWS = 2000
+COURSE_INGEST_MIN_CHUNK_ROWS = 200
+# 地點時間 / 中文課程名稱 去重後的值超過此數量時，才分段交給多個行程解析。
+# 實測單行程約 1.6 µs/值；spawn 行程池第一次使用約 1 秒（約等於 60 萬值的單行程解析），
+# 因此行程池尚未啟動時門檻為 COLD，已在執行（先前的大檔載入）時為 PARALLEL
+COURSE_PARSE_PARALLEL_MIN_UNIQUE = 50000
+COURSE_PARSE_COLD_MIN_UNIQUE = 1000000
+COURSE_PARSE_MAX_WORKERS = 8
+
+# ====== course_inputs 監看 ======
+# 資料夾異動後，需連續兩次掃描（間隔此毫秒數）檔案大小與修改時間都不變才視為寫入完成
+COURSE_WATCH_SETTLE_MS = 1500
+
 # ====== 星期 / 節次 ======
 DAYS = ["一", "二", "三", "四", "五", "六", "日"]
 DAY_LABEL = {
@@ -85,6 +104,13 @@ PERIOD_TIME = {
     "D": "21:25 ~ 22:15",
 }
 
+# ====== 搜尋 ======
+# 搜尋結果快取（查詢 -> 列索引陣列）的總位元組上限
+SEARCH_RESULT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# 容錯比對（錯字建議）：每次查詢的時間上限與建議筆數
+FUZZY_TIME_BUDGET_MS = 20
+FUZZY_MAX_SUGGESTIONS = 5
+
 # ====== 特殊篩選 ======
 GENED_DEPT_NAME = "通識"
 SPORT_DEPT_NAME = "普通體育"
@@ -0,0 +1,629 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_bitmap import FilterBitmaps
+from app_constants import GENED_CORE_OPTIONS, GENED_DEPT_NAME
+from app_fuzzy import FuzzyMatcher
+from app_slot_index import SlotBitmapIndex
+from app_text_index import BigramIndex
+from app_utils import masks_to_day_periods, parse_gened_categories_from_course_name, strip_bracket_text_for_timetable
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    if arr.flags.writeable:
+        arr.setflags(write=False)
+    return arr
+
+
+def _object_column(df: pd.DataFrame, col: str, default="") -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), default, dtype=object)
+    return df[col].to_numpy(dtype=object)
+
+
+def _typed_column(df: pd.DataFrame, col: str, dtype, default=0) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), default, dtype=dtype)
+    return df[col].to_numpy(dtype=dtype)
+
+
+def _numeric_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    # Excel cells may hold text; anything non-numeric becomes NaN
+    if col not in df.columns:
+        return np.full(len(df), np.nan, dtype=np.float64)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _object_array(items: List[object]) -> np.ndarray:
+    # Element-wise fill so numpy never tries to broadcast nested sets/tuples into 2-D.
+    arr = np.empty(len(items), dtype=object)
+    for i, v in enumerate(items):
+        arr[i] = v
+    return arr
+
+
+def _alltext_from_columns(cols: Sequence[pd.Series]) -> pd.Series:
+    # Optimized _alltext generation using str.cat (faster than loop +=)
+    # Convert all columns to string, replacing NaN with empty string
+    series_list = [c.fillna("").astype(str) for c in cols]
+    return series_list[0].str.cat(series_list[1:], sep=" ").str.lower()
+
+
+def _sort_key(v):
+    """(0, 數值) 或 (1, 字串)：與結果表 UserRole 相同的分類（數值在前；缺值視為空字串）。"""
+    if isinstance(v, (int, float, np.integer, np.floating)) and v == v:
+        return 0, float(v)
+    try:
+        missing = bool(pd.isna(v))
+    except (TypeError, ValueError):
+        missing = False
+    # UTF-16 code units, the order QString::compare uses
+    return 1, ("" if missing else str(v)).encode("utf-16-be")
+
+
+def sort_ranks(values: np.ndarray) -> np.ndarray:
+    """
+    表格排序用的名次（int32，相同值同名次）：數值依大小在前，字串依 QString 順序在後；
+    純數值欄的缺值（顯示為空字串）排最前。
+    依名次做 stable argsort 即等同逐列比較排序。
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        num = values.astype(np.float64)
+        isnum = ~np.isnan(num)
+        uniq, inv = np.unique(num[isnum], return_inverse=True)
+        # NaN is shown as "", which compares (as a string) before every number
+        ranks = np.zeros(values.shape, dtype=np.int32)
+        ranks[isnum] = inv + 1
+        return ranks
+    keys = [_sort_key(v) for v in values.tolist()]
+    order = {k: i for i, k in enumerate(sorted(set(keys)))}
+    return np.fromiter((order[k] for k in keys), dtype=np.int32, count=len(keys))
+
+
+def _freeze(value):
+    return _readonly(value) if isinstance(value, np.ndarray) else value
+
+
+class _LazyColumn:
+    """第一次使用時才建立的唯讀欄位（或索引）；背景執行緒與 GUI 同時要求時，後到者等待同一次建立完成。"""
+
+    def __init__(self, build: Callable[[], np.ndarray]):
+        self._build = build
+        self._lock = threading.Lock()
+        self._value: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    def preset(self, value: np.ndarray) -> None:
+        with self._lock:
+            if self._value is None:
+                self._value = _freeze(value)
+                self._build = None
+
+    def get(self) -> np.ndarray:
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = _freeze(self._build())
+                    self._build = None
+                value = self._value
+        return value
+
+
+def _same_values(a: np.ndarray, b: np.ndarray, rows: np.ndarray) -> bool:
+    """a、b 在 rows 上的值是否完全相同（NaN 視為相同）。"""
+    if rows.size == 0:
+        return True
+    return pd.Series(a[rows]).equals(pd.Series(b[rows]))
+
+
+def contains_mask(values: np.ndarray, token: str) -> np.ndarray:
+    """values 為字串 object 陣列；回傳每列是否包含 token（不分 regex）。"""
+    return np.fromiter((token in v for v in values), dtype=bool, count=len(values))
+
+
+class DictColumn:
+    """
+    字典編碼欄位：每列一個小整數代碼，字串表（依字典序排序）由整欄共用。
+    等值篩選、子字串篩選與計數都在代碼陣列上完成，子字串只需比對字串表。
+    """
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=False)
+        self.categories = _readonly(np.asarray(uniques, dtype=object))
+        code_dtype = np.int16 if len(self.categories) < np.iinfo(np.int16).max else np.int32
+        self.codes = _readonly(codes.astype(code_dtype, copy=False))
+        # Row values as references into the shared table (no per-row string objects)
+        self.values = _readonly(self.categories[self.codes])
+        self.lc = _readonly(np.array([v.lower() if isinstance(v, str) else "" for v in self.categories], dtype=object))
+        self._index: Dict[str, int] = {v: i for i, v in enumerate(self.categories) if isinstance(v, str)}
+        self._text_index = _LazyColumn(lambda: BigramIndex(self.lc))
+        self._counts = _LazyColumn(lambda: np.bincount(self.codes, minlength=len(self.categories)))
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    def code_of(self, value: str) -> int:
+        """字串表中的代碼；不存在時回傳 -1。"""
+        return self._index.get(value, -1)
+
+    def eq_mask(self, value: str) -> np.ndarray:
+        code = self.code_of(value)
+        if code < 0:
+            return np.zeros(self.codes.shape, dtype=bool)
+        return self.codes == code
+
+    def contains(self, token: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """小寫字串包含 token 的列；rows 指定時只回傳這些列的結果。"""
+        hits = self._text_index.get().contains(token)
+        return hits[self.codes if rows is None else self.codes[rows]]
+
+    def codes_containing(self, token: str) -> np.ndarray:
+        """字串表中小寫包含 token 的代碼（遞增）。"""
+        return np.flatnonzero(self._text_index.get().contains(token))
+
+    def map_categories(self, fn) -> np.ndarray:
+        """對字串表逐一套用 fn，再依代碼展開成每列結果。"""
+        return np.array([fn(v) for v in self.categories])[self.codes]
+
+    def counts(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """各字串的出現次數（facet counts）；mask 指定時只計算被選取的列。"""
+        if mask is None:
+            # Whole-column counts never change for an immutable store; the planner asks for them per query
+            return self._counts.get()
+        return np.bincount(self.codes[mask], minlength=len(self.categories))
+
+
+# 以字典編碼保存的低基數欄位
+DICT_ENCODED_COLUMNS = ("開課代碼", "系所", "教師", "必/選", "全/半")
+
+# 索引 -> 建立它所用的搜尋來源（見 CourseStore._search_sources）；重新載入時來源都沒變就沿用舊索引
+_INDEX_SOURCES = {
+    "cname_lc": ("cname",),
+    "cname_fuzzy": ("cname",),
+    "alltext": ("alltext",),
+    "slots": ("slots", "tba"),
+    "teacher_fuzzy": ("teacher",),
+}
+
+
+class CourseStore:
+    """
+    不可變的欄式課程資料（struct-of-arrays）。
+    由 load_courses_* 產出的 DataFrame 建立一次，之後搜尋、課表渲染、最佳選課與存檔
+    全部共用這份唯讀 NumPy 欄位，不再回頭操作 DataFrame。
+    列順序以 cid 遞增排列，cid -> row 以 searchsorted 查詢。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        if "_cid" not in df.columns:
+            raise ValueError("CourseStore 需要 _cid 欄位。")
+
+        cid = df["_cid"].to_numpy(dtype=np.int64)
+        if cid.size > 1 and np.any(cid[1:] < cid[:-1]):
+            order = np.argsort(cid, kind="mergesort")
+            df = df.iloc[order].reset_index(drop=True)
+            cid = df["_cid"].to_numpy(dtype=np.int64)
+
+        self.n: int = int(len(df))
+        self.cid = _readonly(np.array(cid, dtype=np.int64, copy=True))
+
+        # ---- 字典編碼欄位 ----
+        self.dicts: Dict[str, DictColumn] = {
+            c: DictColumn(df[c] if c in df.columns else np.full(self.n, "", dtype=object)) for c in DICT_ENCODED_COLUMNS
+        }
+        self.code_dict = self.dicts["開課代碼"]
+        self.dept_dict = self.dicts["系所"]
+        self.teacher_dict = self.dicts["教師"]
+
+        # ---- 顯示欄位（原始 Excel 欄位；不含 "_" 開頭的內部欄位）----
+        self.display_columns: List[str] = [c for c in df.columns if not str(c).startswith("_")]
+        self._columns: Dict[str, np.ndarray] = {}
+        for c in self.display_columns:
+            self._columns[c] = self.dicts[c].values if c in self.dicts else _readonly(df[c].to_numpy())
+
+        # ---- 常用欄位（具型別）----
+        self.cid4 = _readonly(_object_column(df, "開課序號"))
+        self.code = self.code_dict.values
+        self.dept = self.dept_dict.values
+        self.cname = _readonly(_object_column(df, "中文課程名稱"))
+        self.teacher = self.teacher_dict.values
+        self.credit = _readonly(_typed_column(df, "學分", np.float64, np.nan))
+
+        # ---- 時段 ----
+        self.mask_lo = _readonly(_typed_column(df, "_mask_lo", np.uint64))
+        self.mask_hi = _readonly(_typed_column(df, "_mask_hi", np.uint64))
+        self.tba = _readonly(_typed_column(df, "_tba", bool, False))
+        # (n, 7) uint16: one period bitmask per weekday, for calendar-shaped filters
+        self.day_periods = _readonly(masks_to_day_periods(self.mask_lo, self.mask_hi))
+        slots_set = [s if isinstance(s, set) else set() for s in _object_column(df, "_slots_set", None)]
+        self.slots_set = _readonly(_object_array(slots_set))
+        if "_slots" in df.columns:
+            slots = [list(s) if isinstance(s, (list, tuple)) else [] for s in df["_slots"].tolist()]
+        else:
+            slots = [sorted(s) for s in slots_set]
+        self.slots = _readonly(_object_array(slots))
+        # (day, period) tuples, pre-split once so render paths never call str.split
+        parsed = [tuple(tuple(x.split("-", 1)) for x in s if isinstance(x, str) and "-" in x) for s in slots]
+        self.parsed_slots = _readonly(_object_array(parsed))
+
+        # ---- 預先計算的篩選欄位 ----
+        self.gened_mask = _readonly(_typed_column(df, "_gened_mask", np.uint32))
+        self.is_teaching = _readonly(_typed_column(df, "_is_teaching", bool, False))
+        self.is_sport = _readonly(_typed_column(df, "_is_sport", bool, False))
+        self.not_full = _readonly(_typed_column(df, "_not_full", bool, False))
+        # 剩餘名額（限修人數 - 選修人數；任一未知為 NaN）
+        self.seats_left = _readonly(_numeric_column(df, "限修人數") - _numeric_column(df, "選修人數"))
+        self.is_gened = _readonly(self.dept_dict.map_categories(lambda d: str(d).strip() == GENED_DEPT_NAME).astype(bool))
+
+        # ---- 次要衍生欄位：第一次使用或背景執行緒建立（開課代碼 / 系所 / 教師改由字典編碼欄位比對）----
+        self._lazy: Dict[str, _LazyColumn] = {
+            "cname_lc": _LazyColumn(self._build_cname_lc),
+            "alltext": _LazyColumn(self._build_alltext),
+            "tt_label": _LazyColumn(self._build_tt_label),
+            "gened_cats": _LazyColumn(self._build_gened_cats),
+            "row_hash": _LazyColumn(self._build_row_hash),
+        }
+        # Bigram indexes over the lower-cased search columns (substring search without full scans)
+        self._indexes: Dict[str, _LazyColumn] = {
+            "cname_lc": _LazyColumn(lambda: BigramIndex(self.cname_lc)),
+            "alltext": _LazyColumn(lambda: BigramIndex(self.alltext)),
+            # One packed row-bitset per day x period bit, for time-selection filters
+            "slots": _LazyColumn(lambda: SlotBitmapIndex(self.mask_lo, self.mask_hi, self.tba)),
+            # Typo-tolerant lookup over the distinct teacher / course-name values
+            "teacher_fuzzy": _LazyColumn(lambda: FuzzyMatcher(self.teacher_dict.lc, self.teacher_dict.codes)),
+            "cname_fuzzy": _LazyColumn(self._build_cname_fuzzy),
+            # Compressed row bitmaps per department / gened core bit / boolean flag
+            "filters": _LazyColumn(self._build_filter_bitmaps),
+        }
+        # Per display column sort ranks for the results table
+        self._sort_ranks: Dict[str, _LazyColumn] = {c: _LazyColumn(lambda c=c: self._build_sort_rank(c)) for c in self.display_columns}
+        self._derive_thread: Optional[threading.Thread] = None
+
+    # ====== 次要衍生欄位 ======
+    @property
+    def cname_lc(self) -> np.ndarray:
+        return self._lazy["cname_lc"].get()
+
+    @property
+    def alltext(self) -> np.ndarray:
+        """所有顯示欄位以空白串接後的小寫全文（全文搜尋用）。"""
+        return self._lazy["alltext"].get()
+
+    @property
+    def tt_label(self) -> np.ndarray:
+        """課表格子文字：去除括號說明的課名 + 換行 + 四位數開課序號。"""
+        return self._lazy["tt_label"].get()
+
+    @property
+    def gened_cats(self) -> np.ndarray:
+        return self._lazy["gened_cats"].get()
+
+    @property
+    def row_hash(self) -> np.ndarray:
+        """每列顯示欄位內容的 64-bit 雜湊（重新載入時比對差異用）。"""
+        return self._lazy["row_hash"].get()
+
+    def text_index(self, name: str) -> BigramIndex:
+        """name 為 "cname_lc" 或 "alltext"：該欄的 bigram 倒排索引（第一次使用或背景執行緒建立）。"""
+        return self._indexes[name].get()
+
+    @property
+    def slot_index(self) -> SlotBitmapIndex:
+        """時段點陣索引（第一次使用或背景執行緒建立）。"""
+        return self._indexes["slots"].get()
+
+    @property
+    def filter_bitmaps(self) -> FilterBitmaps:
+        """系所、核心通識與布林旗標的壓縮點陣索引（第一次使用或背景執行緒建立）。"""
+        return self._indexes["filters"].get()
+
+    def _filter_flags(self) -> Dict[str, np.ndarray]:
+        # Flag names double as search source names (see _search_sources)
+        return {"gened": self.is_gened, "sport": self.is_sport, "teaching": self.is_teaching, "not_full": self.not_full, "tba": self.tba}
+
+    def _build_filter_bitmaps(self) -> FilterBitmaps:
+        return FilterBitmaps(self.n, self.dept_dict.codes, len(self.dept_dict), self.gened_mask, len(GENED_CORE_OPTIONS), self._filter_flags())
+
+    def fuzzy_matcher(self, field: str) -> FuzzyMatcher:
+        """field 為 "teacher" 或 "cname"：該欄相異值的容錯比對器。"""
+        return self._indexes[f"{field}_fuzzy"].get()
+
+    def _build_cname_fuzzy(self) -> FuzzyMatcher:
+        codes, uniques = pd.factorize(self.cname_lc)
+        return FuzzyMatcher(uniques, codes)
+
+    def is_derived(self, name: str) -> bool:
+        return self._lazy[name].ready if name in self._lazy else self._indexes[name].ready
+
+    def start_background_derivation(self) -> None:
+        """在背景執行緒依序建立次要欄位；之後的存取只在欄位尚未完成時才等待。"""
+        if self._derive_thread is not None:
+            return
+
+        def run() -> None:
+            for col in list(self._lazy.values()) + list(self._indexes.values()) + list(self._sort_ranks.values()):
+                try:
+                    col.get()
+                except Exception:
+                    # Leave it to the first foreground access to raise
+                    pass
+
+        self._derive_thread = threading.Thread(target=run, name="CourseStoreDerive", daemon=True)
+        self._derive_thread.start()
+
+    def _build_cname_lc(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        cname = self.cname if rows is None else self.cname[rows]
+        return np.array([v.lower() if isinstance(v, str) else "" for v in cname], dtype=object)
+
+    def _build_alltext(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n = self.n if rows is None else len(rows)
+        if not self.display_columns:
+            return np.full(n, "", dtype=object)
+        cols = [pd.Series(self._columns[c] if rows is None else self._columns[c][rows], copy=False) for c in self.display_columns]
+        return _alltext_from_columns(cols).to_numpy(dtype=object)
+
+    def _build_tt_label(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        cname, cid4 = (self.cname, self.cid4) if rows is None else (self.cname[rows], self.cid4[rows])
+        # D-02: _tt_label = strip(中文課名) + "\n" + cid4
+        return np.array(
+            [f"{strip_bracket_text_for_timetable(str(c).strip())}\n{s}" for c, s in zip(cname, cid4)],
+            dtype=object,
+        )
+
+    def _build_gened_cats(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        cache: Dict[str, List[str]] = {}
+        out: List[List[str]] = []
+        for name in self.cname if rows is None else self.cname[rows]:
+            key = "" if name is None else str(name)
+            res = cache.get(key)
+            if res is None:
+                res = parse_gened_categories_from_course_name(name)
+                cache[key] = res
+            out.append(res)
+        return _object_array(out)
+
+    def _build_row_hash(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n = self.n if rows is None else len(rows)
+        if not self.display_columns:
+            return np.zeros(n, dtype=np.uint64)
+        frame = pd.DataFrame(
+            {c: pd.Series(self._columns[c] if rows is None else self._columns[c][rows], copy=False) for c in self.display_columns}
+        )
+        return pd.util.hash_pandas_object(frame, index=False).to_numpy(dtype=np.uint64)
+
+    # ====== 重新載入：列層級差異 ======
+    def _match_rows(self, old: "CourseStore") -> Tuple[np.ndarray, np.ndarray]:
+        """回傳 (每列在 old 中的列索引或 -1, 該列 cid 與內容是否都相同)。"""
+        if old.n == 0 or self.n == 0:
+            return np.full(self.n, -1, dtype=np.int64), np.zeros(self.n, dtype=bool)
+        # Duplicate cids (the catalog has a few) pair up in order of appearance
+        first = np.searchsorted(self.cid, self.cid, side="left")
+        pos = np.searchsorted(old.cid, self.cid, side="left") + (np.arange(self.n) - first)
+        pos_c = np.minimum(pos, old.n - 1)
+        hit = (pos < old.n) & (old.cid[pos_c] == self.cid)
+        old_rows = np.where(hit, pos_c, -1)
+        if self.display_columns != old.display_columns:
+            return old_rows, np.zeros(self.n, dtype=bool)
+        same = hit & (old.row_hash[pos_c] == self.row_hash)
+        return old_rows, same
+
+    def carry_over_derived(self, old: "CourseStore") -> int:
+        """
+        沿用 old 已建立的次要欄位：cid 與內容都相同的列直接複製，其餘列只重算這些列。
+        回傳沿用的列數。需在 start_background_derivation 之前呼叫。
+        """
+        old_rows, same = self._match_rows(old)
+        reuse_new = np.flatnonzero(same)
+        reuse_old = old_rows[reuse_new]
+        rest = np.flatnonzero(~same)
+        for name, col in self._lazy.items():
+            if name == "row_hash" or col.ready or not old.is_derived(name):
+                continue
+            src = old._lazy[name].get()
+            out = np.empty(self.n, dtype=src.dtype)
+            out[reuse_new] = src[reuse_old]
+            if rest.size:
+                out[rest] = getattr(self, f"_build_{name}")(rest)
+            col.preset(out)
+        return int(reuse_new.size)
+
+    def _search_sources(self) -> Dict[str, Tuple[np.ndarray, ...]]:
+        """搜尋條件讀取的欄位，依來源名稱分組（app_search.query_sources 使用相同名稱）。"""
+        return {
+            "code": (self.code,),
+            "dept": (self.dept,),
+            "teacher": (self.teacher,),
+            "cname": (self.cname,),
+            "gened": (self.is_gened, self.gened_mask),
+            "sport": (self.is_sport,),
+            "teaching": (self.is_teaching,),
+            "not_full": (self.not_full,),
+            "tba": (self.tba,),
+            "slots": (self.mask_lo, self.mask_hi),
+            "credit": (self.credit,),
+            "seats_left": (self.seats_left,),
+        }
+
+    def reload_changes(self, old: "CourseStore") -> Optional[FrozenSet[str]]:
+        """
+        與 old 為同一組列（cid 逐列相同、顯示欄位相同）時，回傳內容有異動的來源：
+        搜尋來源名稱（見 _search_sources；任一顯示欄位異動時另含 "alltext"）與異動的顯示欄位名稱。
+        列結構不同時回傳 None。
+        """
+        if self.n != old.n or self.display_columns != old.display_columns or not np.array_equal(self.cid, old.cid):
+            return None
+        _, same = self._match_rows(old)
+        rows = np.flatnonzero(~same)
+        changed = {c for c in self.display_columns if not _same_values(self._columns[c], old._columns[c], rows)}
+        if changed:
+            changed.add("alltext")
+        theirs = old._search_sources()
+        for name, arrays in self._search_sources().items():
+            if not all(_same_values(a, b, rows) for a, b in zip(arrays, theirs[name])):
+                changed.add(name)
+        return frozenset(changed)
+
+    def carry_over_indexes(self, old: "CourseStore", changes: FrozenSet[str]) -> None:
+        """
+        同一組列的重新載入（changes 為 reload_changes(old) 的結果）：來源未異動的索引與排序名次直接沿用，
+        文字索引只更新異動列，篩選點陣只重建異動的旗標。需在 start_background_derivation 之前呼叫。
+        """
+        _, same = self._match_rows(old)
+        rows = np.flatnonzero(~same)
+        for name, sources in _INDEX_SOURCES.items():
+            if not old._indexes[name].ready:
+                continue
+            if not changes.intersection(sources):
+                self._indexes[name].preset(old._indexes[name].get())
+            elif name in self._lazy and self._lazy[name].ready:
+                # Bigram index over a text column: patch only the changed rows' postings
+                self._indexes[name].preset(old._indexes[name].get().with_rows(self._lazy[name].get(), rows))
+        if old._indexes["filters"].ready and not changes.intersection(("dept", "gened")):
+            flags = self._filter_flags()
+            self._indexes["filters"].preset(old.filter_bitmaps.with_flags({f: m for f, m in flags.items() if f in changes}))
+        for c in self.display_columns:
+            if c in changes:
+                continue
+            if old._sort_ranks[c].ready:
+                self._sort_ranks[c].preset(old._sort_ranks[c].get())
+            d, od = self.dicts.get(c), old.dicts.get(c)
+            if d is not None and od is not None:
+                for src, dst in ((od._text_index, d._text_index), (od._counts, d._counts)):
+                    if src.ready:
+                        dst.preset(src.get())
+
+    # ====== 基本資訊 ======
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def empty(self) -> bool:
+        return self.n == 0
+
+    def has_column(self, name: str) -> bool:
+        return name in self._columns
+
+    def column(self, name: str) -> np.ndarray:
+        """顯示欄位的唯讀陣列（與 store 共用記憶體）。"""
+        return self._columns[name]
+
+    def sort_rank(self, name: str) -> np.ndarray:
+        """顯示欄位的排序名次（int32；見 sort_ranks），每個課程表只建立一次。"""
+        return self._sort_ranks[name].get()
+
+    def _build_sort_rank(self, name: str) -> np.ndarray:
+        if name == "開課序號":
+            # The table sorts this column by the integer course id
+            return np.unique(self.cid, return_inverse=True)[1].astype(np.int32)
+        d = self.dicts.get(name)
+        if d is not None:
+            # Rank the (short) string table once, then expand through the codes
+            return sort_ranks(d.categories)[d.codes]
+        return sort_ranks(self._columns[name])
+
+    # ====== cid -> row ======
+    def rows_of(self, ids: Sequence[int]) -> np.ndarray:
+        """
+        回傳 ids 中存在於課程表的列索引（依 ids 順序；不存在者略過）。
+        同一 cid 對應多列時（課程表中開課序號重複）全部回傳。
+        """
+        ids_arr = np.asarray(ids, dtype=np.int64)
+        if ids_arr.size == 0 or self.n == 0:
+            return np.empty((0,), dtype=np.int64)
+        lo = np.searchsorted(self.cid, ids_arr, side="left")
+        cnt = np.searchsorted(self.cid, ids_arr, side="right") - lo
+        # Expand each [lo, lo + cnt) range in place
+        ends = np.cumsum(cnt)
+        rows = np.repeat(lo - (ends - cnt), cnt) + np.arange(int(ends[-1]))
+        return rows.astype(np.int64, copy=False)
+
+    def row_of(self, cid: int) -> int:
+        if self.n == 0:
+            return -1
+        x = np.int64(int(cid))
+        pos = int(np.searchsorted(self.cid, x, side="left"))
+        if pos < self.n and int(self.cid[pos]) == int(x):
+            return pos
+        return -1
+
+    def name_of(self, cid: int) -> str:
+        r = self.row_of(cid)
+        return str(self.cname[r] or "").strip() if r >= 0 else ""
+
+    def teacher_of(self, cid: int) -> str:
+        r = self.row_of(cid)
+        return str(self.teacher[r] or "").strip() if r >= 0 else ""
+
+    def credit_of(self, cid: int) -> float:
+        r = self.row_of(cid)
+        if r < 0:
+            return 0.0
+        v = float(self.credit[r])
+        return 0.0 if np.isnan(v) else v
+
+    def total_credits(self, ids: Sequence[int]) -> float:
+        rows = self.rows_of(ids)
+        if rows.size == 0:
+            return 0.0
+        return float(np.nansum(self.credit[rows]))
+
+    def occupied_masks(self, ids: Sequence[int]) -> Tuple[np.uint64, np.uint64]:
+        rows = self.rows_of(ids)
+        if rows.size == 0:
+            return np.uint64(0), np.uint64(0)
+        return np.uint64(np.bitwise_or.reduce(self.mask_lo[rows])), np.uint64(np.bitwise_or.reduce(self.mask_hi[rows]))
+
+    def slot_pairs_for_ids(self, ids: Sequence[int]) -> Set[Tuple[str, str]]:
+        out: Set[Tuple[str, str]] = set()
+        for r in self.rows_of(list(ids)):
+            out.update(self.parsed_slots[r])
+        return out
+
+    def row_values(self, row: int, cols: Sequence[str]) -> List[object]:
+        return [self._columns[c][row] for c in cols]
+
+
+@dataclass(frozen=True)
+class CatalogDiff:
+    """兩份課程資料的列層級差異（皆為遞增排序的 cid 陣列）。"""
+
+    added: np.ndarray
+    removed: np.ndarray
+    changed: np.ndarray
+
+    @property
+    def same_rows(self) -> bool:
+        """cid 集合相同（列位置一一對應），只有內容異動。"""
+        return self.added.size == 0 and self.removed.size == 0
+
+    @property
+    def is_empty(self) -> bool:
+        return self.same_rows and self.changed.size == 0
+
+    @property
+    def changed_cids(self) -> np.ndarray:
+        return np.union1d(np.union1d(self.added, self.removed), self.changed)
+
+
+def diff_course_stores(old: CourseStore, new: CourseStore) -> CatalogDiff:
+    """以 cid 與每列內容雜湊比對新舊課程資料。"""
+    old_rows, same = new._match_rows(old)
+    in_old = old_rows >= 0
+    present = np.zeros(old.n, dtype=bool)
+    present[old_rows[in_old]] = True
+    return CatalogDiff(
+        added=new.cid[~in_old].copy(),
+        removed=old.cid[~present].copy(),
+        changed=new.cid[in_old & ~same].copy(),
+    )
@@ -3,22 +3,19 @@ from __future__ import annotations
 import io
 import os
 import zipfile
-from typing import List, Sequence, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
 
-from app_constants import COURSE_SHEET_CANDIDATES, REQUIRED_COLUMNS, TEACHING_NAME_TOKEN, SPORT_DEPT_NAME, GENED_CORE_OPTIONS
-from app_utils import (
-    parse_cid_to_int,
-    parse_time_text,
-    slots_set_to_masks,
-    format_cid4,
-    _slot_sort_key,
-    parse_gened_categories_from_course_name,
-    strip_bracket_text_for_timetable,
-)
+from app_constants import COURSE_SHEET_CANDIDATES, REQUIRED_COLUMNS, TEACHING_NAME_TOKEN, SPORT_DEPT_NAME
+from app_parse_pool import parse_unique_values
+from app_utils import format_cid4
+
+
+# 課程表解析器版本：_build_courses_df_from_raw 的輸出（欄位/型別/衍生規則）改變時必須遞增，
+# 以使 app_snapshot 的既有快照失效。
+COURSE_PARSER_VERSION = 5
 
 
 class ExcelFormatError(RuntimeError):
@@ -62,7 +59,14 @@ def _patch_xlsx_namespaces_inplace(xlsx_path: str) -> bool:
     return True
 
 
-def ensure_excel_readable(excel_path: str) -> str:
+_XLSX_EXTS = (".xlsx", ".xlsm", ".xltx", ".xltm")
+
+
+def open_course_workbook(excel_path: str) -> pd.ExcelFile:
+    """
+    檢查可讀性並開啟 workbook（整個載入流程只開啟這一次）。
+    xlsx 若因 strict OOXML 命名空間而無法讀取，會就地修補後重試。
+    """
     if not os.path.exists(excel_path):
         raise FileNotFoundError(f"找不到檔案：{excel_path}")
 
@@ -70,40 +74,48 @@ def ensure_excel_readable(excel_path: str) -> str:
 
     if ext == ".xls":
         try:
-            pd.ExcelFile(excel_path)
-            return excel_path
+            xf = pd.ExcelFile(excel_path)
         except Exception as e:
             raise ExcelFormatError(
                 "讀取 .xls 需要安裝 xlrd。\n"
                 "請執行：conda install -c conda-forge xlrd\n\n"
                 f"原始錯誤：{e}"
             ) from e
-
-    if ext in (".xlsx", ".xlsm", ".xltx", ".xltm"):
+    elif ext in _XLSX_EXTS:
         try:
-            # H-02: Use read_only=True for lighter memory usage during check
-            wb = load_workbook(excel_path, read_only=True, data_only=True)
-            try:
-                if not wb.sheetnames:
-                    raise ExcelFormatError("Workbook 沒有任何工作表。")
-                return excel_path
-            finally:
-                wb.close()
+            # H-02: pandas' openpyxl reader opens read_only=True for lighter memory usage
+            xf = pd.ExcelFile(excel_path, engine="openpyxl")
+            if not xf.sheet_names:
+                xf.close()
+                raise ExcelFormatError("Workbook 沒有任何工作表。")
+        except ExcelFormatError:
+            raise
         except Exception:
             patched = _patch_xlsx_namespaces_inplace(excel_path)
             if not patched:
                 raise
-            wb2 = load_workbook(excel_path, data_only=True)
-            if not wb2.sheetnames:
+            xf = pd.ExcelFile(excel_path, engine="openpyxl")
+            if not xf.sheet_names:
+                xf.close()
                 raise ExcelFormatError("已嘗試修補 Excel，但仍讀不到工作表。")
-            return excel_path
+    else:
+        raise ExcelFormatError(f"不支援的 Excel 副檔名：{ext}（僅支援 .xls / .xlsx）")
+
+    if not xf.sheet_names:
+        xf.close()
+        raise ExcelFormatError("Workbook 沒有任何工作表。")
+    return xf
+
 
-    raise ExcelFormatError(f"不支援的 Excel 副檔名：{ext}（僅支援 .xls / .xlsx）")
+def ensure_excel_readable(excel_path: str) -> str:
+    xf = open_course_workbook(excel_path)
+    xf.close()
+    return excel_path
 
 
 def get_sheetnames(excel_path: str) -> List[str]:
-    xls = pd.ExcelFile(excel_path)
-    return list(xls.sheet_names)
+    with pd.ExcelFile(excel_path) as xls:
+        return list(xls.sheet_names)
 
 
 def _pick_course_sheet(sheetnames: Sequence[str]) -> str:
@@ -113,17 +125,42 @@ def _pick_course_sheet(sheetnames: Sequence[str]) -> str:
     return sheetnames[0]
 
 
-def _build_courses_df_from_raw(raw: pd.DataFrame) -> pd.DataFrame:
+def _add_parsed_columns(df: pd.DataFrame) -> None:
+    """由地點時間與課名加上節次 / TBA / 遮罩 / 通識核心欄位（就地）。"""
+    # Parse each unique time text / course name once (sharded across processes for large files);
+    # masks / TBA / gened bits come back as arrays indexed by factorize code
+    time_codes, unique_times = pd.factorize(df["地點時間"])
+    name_codes, unique_names = pd.factorize(df["中文課程名稱"])
+    compiled, name_gened = parse_unique_values(list(unique_times), list(unique_names))
+    slot_lists = [compiled.slot_names(i) for i in range(len(unique_times))]
+    slot_sets = [set(x) for x in slot_lists]
+
+    df["_slots_set"] = [slot_sets[c] for c in time_codes]
+    df["_slots"] = [list(slot_lists[c]) for c in time_codes]
+    df["_tba"] = compiled.tba[time_codes]
+    df["_mask_lo"] = compiled.mask_lo[time_codes]
+    df["_mask_hi"] = compiled.mask_hi[time_codes]
+
+    # _tt_label / _alltext / _cname_lc / gened categories are derived lazily by CourseStore
+    # (in a background thread after load); only the filter columns are built here.
+    # B-04: Precompute gened core mask (uint32), one bit per GENED_CORE_OPTIONS entry
+    df["_gened_mask"] = name_gened[name_codes]
+
+
+def _derive_course_columns(raw: pd.DataFrame, parse_values: bool = True) -> pd.DataFrame:
+    """
+    由原始工作表（或其中一段連續列）產生含衍生欄位的課程表；不排序，可逐塊呼叫。
+    parse_values 為 False 時不解析地點時間 / 課名，由呼叫端在全部列到齊後以 _add_parsed_columns 一次補上。
+    """
     missing = [c for c in REQUIRED_COLUMNS if c not in raw.columns]
     if missing:
         raise ExcelFormatError("Excel 欄位不足，缺少：" + ", ".join(missing))
 
-    df = raw.copy()
-
     # Vectorized version of parse_cid_to_int for performance
-    cid_series = pd.to_numeric(df["開課序號"].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
+    cid_series = pd.to_numeric(raw["開課序號"].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
 
-    df = df[cid_series.notna()].copy()
+    # Boolean indexing already yields a fresh frame; no separate raw.copy() needed
+    df = raw[cid_series.notna()].copy()
     df["_cid"] = cid_series.loc[df.index].astype(int)
 
     # Vectorized version of format_cid4 for performance
@@ -141,51 +178,6 @@ def _build_courses_df_from_raw(raw: pd.DataFrame) -> pd.DataFrame:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # Vectorize time parsing for performance by parsing unique values only
-    unique_times = df["地點時間"].unique()
-    time_map = {t: parse_time_text(t) for t in unique_times}
-    parsed_results = df["地點時間"].map(time_map)
-
-    # Assign parsed results back to the DataFrame
-    df["_slots_set"] = [res.slots for res in parsed_results]
-    df["_slots"] = [sorted(res.slots, key=_slot_sort_key) for res in parsed_results]
-    df["_tba"] = [res.tba for res in parsed_results]
-
-    masks = [slots_set_to_masks(slots) for slots in df["_slots_set"]]
-    df["_mask_lo"] = [np.uint64(t[0]) for t in masks]
-    df["_mask_hi"] = [np.uint64(t[1]) for t in masks]
-
-    # Precompute timetable label (D-02)
-    # _tt_label = strip(中文課名) + "\n" + cid4
-    tt_labels = []
-    for cname, cid_str in zip(df["中文課程名稱"], df["開課序號"]):
-        tt_labels.append(f"{strip_bracket_text_for_timetable(str(cname).strip())}\n{cid_str}")
-    df["_tt_label"] = tt_labels
-
-    # Cache gened parsing to reduce repeated regex work
-    gened_cache = {}
-    gened_results = []
-    for name in df["中文課程名稱"]:
-        key = "" if name is None else str(name)
-        res = gened_cache.get(key)
-        if res is None:
-            res = parse_gened_categories_from_course_name(name)
-            gened_cache[key] = res
-        gened_results.append(res)
-    df["_gened_cats"] = gened_results
-
-    # B-04: Precompute gened core mask (uint32)
-    # Map each core option to a bit position
-    core_map = {name: (1 << i) for i, name in enumerate(GENED_CORE_OPTIONS)}
-    gened_masks = []
-    for cats in gened_results:
-        mask = 0
-        for c in cats:
-            if c in core_map:
-                mask |= core_map[c]
-        gened_masks.append(mask)
-    df["_gened_mask"] = np.array(gened_masks, dtype=np.uint32)
-
     # Precompute boolean fields for search (B-05)
     if "中文課程名稱" in df.columns:
         df["_is_teaching"] = df["中文課程名稱"].astype(str).str.contains(TEACHING_NAME_TOKEN, na=False)
@@ -202,62 +194,78 @@ def _build_courses_df_from_raw(raw: pd.DataFrame) -> pd.DataFrame:
     else:
         df["_not_full"] = False
 
-    # Precompute lowercased fields for faster search (kept as internal columns)
-    if "開課代碼" in df.columns:
-        df["_code_lc"] = df["開課代碼"].str.lower()
-    if "中文課程名稱" in df.columns:
-        df["_cname_lc"] = df["中文課程名稱"].str.lower()
-    if "教師" in df.columns:
-        df["_teacher_lc"] = df["教師"].str.lower()
-    if "系所" in df.columns:
-        df["_dept_lc"] = df["系所"].str.lower()
-
-    display_cols = [c for c in df.columns if not str(c).startswith("_")]
-    
-    # Optimized _alltext generation using str.cat (faster than loop +=)
-    if display_cols:
-        # Convert all columns to string, replacing NaN with empty string
-        series_list = [df[c].fillna("").astype(str) for c in display_cols]
-        df["_alltext"] = series_list[0].str.cat(series_list[1:], sep=" ").str.lower()
-    else:
-        df["_alltext"] = ""
+    if parse_values:
+        _add_parsed_columns(df)
+    return df
+
+
+def _build_courses_df_from_raw(raw: pd.DataFrame) -> pd.DataFrame:
+    df = _derive_course_columns(raw)
 
     # D-03: Sort by _cid to enable O(k log n) lookup in subset operations
     # This ensures the dataframe is physically sorted by course ID
     return df.sort_values("_cid", kind="mergesort").reset_index(drop=True)
 
 
-def load_courses_auto(excel_path: str) -> Tuple[pd.DataFrame, str]:
-    sheetnames = get_sheetnames(excel_path)
-    if not sheetnames:
-        raise ExcelFormatError("Workbook 沒有任何工作表。")
+def _count_cid_values(col: pd.Series) -> int:
+    # Vectorized equivalent of col.apply(parse_cid_to_int).notna().sum():
+    # a value yields a cid iff its string form contains at least one digit.
+    col = col.dropna()
+    if col.empty:
+        return 0
+    return int(col.astype(str).str.contains(r"\d", regex=True).sum())
 
-    best_sheet = ""
-    best_count = -1
-    best_raw = None
 
-    preferred = _pick_course_sheet(sheetnames)
-    ordered = [preferred] + [s for s in sheetnames if s != preferred]
+def _score_course_sheet(xf: pd.ExcelFile, sheet: str) -> int:
+    """整張工作表可解析的開課序號筆數（只讀開課序號一欄）。"""
+    ids = xf.parse(sheet_name=sheet, usecols=["開課序號"])
+    return _count_cid_values(ids["開課序號"])
 
+
+def _pick_best_course_sheet(xf: pd.ExcelFile, ordered: Sequence[str]) -> Tuple[str, Optional[pd.DataFrame]]:
+    """
+    依序只讀表頭挑出含必要欄位的工作表；多於一張時以開課序號欄評分（與分塊載入的挑選規則相同），
+    最後只完整讀取勝出的那一張。沒有合格工作表時回傳 ("", None)。
+    """
+    # H-01: Read header only first to check columns
+    candidates: List[str] = []
     for s in ordered:
         try:
-            # H-01: Read header only first to check columns
-            cols = pd.read_excel(excel_path, sheet_name=s, nrows=0).columns
-            if any(c not in cols for c in REQUIRED_COLUMNS):
-                continue
-            
-            raw = pd.read_excel(excel_path, sheet_name=s)
-            if any(c not in raw.columns for c in REQUIRED_COLUMNS):
+            cols = xf.parse(sheet_name=s, nrows=0).columns
+        except Exception:
+            continue
+        if all(c in cols for c in REQUIRED_COLUMNS):
+            candidates.append(s)
+    if not candidates:
+        return "", None
+
+    best_sheet = candidates[0]
+    if len(candidates) > 1:
+        best_count = -1
+        # Ties keep the earlier (preferred) sheet, matching the previous sequential scan
+        for s in candidates:
+            try:
+                cnt = _score_course_sheet(xf, s)
+            except Exception:
                 continue
-            cnt = raw["開課序號"].apply(parse_cid_to_int).notna().sum()
             if cnt > best_count:
-                best_count = int(cnt)
+                best_count = cnt
                 best_sheet = s
-                best_raw = raw
-        except Exception:
-            continue
+    return best_sheet, xf.parse(sheet_name=best_sheet)
+
+
+def load_courses_auto(excel_path: str) -> Tuple[pd.DataFrame, str]:
+    with open_course_workbook(excel_path) as xf:
+        sheetnames = list(xf.sheet_names)
+        if not sheetnames:
+            raise ExcelFormatError("Workbook 沒有任何工作表。")
+
+        preferred = _pick_course_sheet(sheetnames)
+        ordered = [preferred] + [s for s in sheetnames if s != preferred]
+
+        best_sheet, best_raw = _pick_best_course_sheet(xf, ordered)
 
-    if best_raw is None:
+    if best_raw is None or any(c not in best_raw.columns for c in REQUIRED_COLUMNS):
         msg = "找不到包含必要欄位的工作表。\n\n"
         msg += "工作表清單：\n" + "\n".join([f"- {s}" for s in sheetnames])
         raise ExcelFormatError(msg)
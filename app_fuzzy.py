@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app_constants import FUZZY_MAX_SUGGESTIONS, FUZZY_TIME_BUDGET_MS
+from app_text_index import BigramIndex
+
+
+def max_edits_for(token: str) -> int:
+    """容許的錯字數：單字不容錯，短字串 1 個，較長的 2 個。"""
+    if len(token) <= 1:
+        return 0
+    return 1 if len(token) <= 4 else 2
+
+
+def bounded_substring_distance(pattern: str, text: str, max_dist: int) -> int:
+    """
+    pattern 與 text 中「任一子字串」的最小編輯距離（Sellers 演算法）；
+    超過 max_dist 時回傳 max_dist + 1。
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    # prev[i]: distance between pattern[:i] and the best substring ending at the current text position
+    prev = list(range(m + 1))
+    best = prev[m]
+    for ch in text:
+        cur = [0] * (m + 1)
+        for i in range(1, m + 1):
+            cost = 0 if pattern[i - 1] == ch else 1
+            cur[i] = min(prev[i - 1] + cost, prev[i] + 1, cur[i - 1] + 1)
+        if cur[m] < best:
+            best = cur[m]
+            if best == 0:
+                return 0
+        prev = cur
+    return best if best <= max_dist else max_dist + 1
+
+
+@dataclass(frozen=True)
+class FuzzySuggestion:
+    value: str
+    distance: int
+    rows: np.ndarray  # 含此值的列（遞增）
+
+
+class FuzzyMatcher:
+    """
+    對一欄的相異值做容錯比對：以單字元倒排索引挑出候選（共同字元數不足者不可能在容許距離內），
+    只對候選計算有上限的編輯距離，並受每次查詢的時間預算限制。
+    """
+
+    def __init__(self, values: Sequence[str], codes: np.ndarray):
+        self.values = np.asarray(values, dtype=object)
+        self.index = BigramIndex(self.values)
+        # rows grouped by value id (CSR), so a suggestion maps straight back to its rows
+        codes = np.asarray(codes, dtype=np.int64)
+        self._row_order = np.argsort(codes, kind="stable").astype(np.int32)
+        self._row_offsets = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(self.values)))].astype(np.int64)
+        self._lens = np.fromiter((len(v) for v in self.values), dtype=np.int64, count=len(self.values))
+
+    def rows_of(self, value_id: int) -> np.ndarray:
+        return self._row_order[self._row_offsets[value_id]:self._row_offsets[value_id + 1]]
+
+    def suggest(
+        self,
+        token: str,
+        limit: int = FUZZY_MAX_SUGGESTIONS,
+        max_dist: Optional[int] = None,
+        budget_ms: float = FUZZY_TIME_BUDGET_MS,
+    ) -> List[FuzzySuggestion]:
+        """依（距離、長度差、列數）排序的建議；時間預算用完時只回傳已比對過的候選。"""
+        token = token.strip().lower()
+        if not token or not len(self.values):
+            return []
+        k = max_edits_for(token) if max_dist is None else int(max_dist)
+        deadline = time.perf_counter() + budget_ms / 1000.0
+
+        chars = set(token)
+        postings = [self.index.lookup(ch) for ch in chars]
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.values))
+        # Each edit loses at most one distinct query character; the text must be long enough to hold the match
+        ok = (shared >= max(1, len(chars) - k)) & (self._lens >= len(token) - k)
+        cand = np.flatnonzero(ok)
+        # Most shared characters first, so a cut-off by the budget drops the least likely candidates
+        cand = cand[np.argsort(-shared[cand], kind="stable")]
+
+        found = []
+        for j, vid in enumerate(cand.tolist()):
+            if j % 32 == 0 and time.perf_counter() > deadline:
+                break
+            d = bounded_substring_distance(token, self.values[vid], k)
+            if d <= k:
+                found.append((d, abs(int(self._lens[vid]) - len(token)), -int(self._row_offsets[vid + 1] - self._row_offsets[vid]), vid))
+        found.sort()
+        return [FuzzySuggestion(self.values[vid], d, self.rows_of(vid)) for d, _, _, vid in found[:limit]]
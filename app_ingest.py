@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass
+from datetime import time as dt_time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from app_constants import (
+    COURSE_INGEST_CHUNK_ROWS,
+    COURSE_INGEST_MEMORY_CEILING_MB,
+    COURSE_INGEST_MIN_CHUNK_ROWS,
+    REQUIRED_COLUMNS,
+)
+from app_excel import (
+    ExcelFormatError,
+    _add_parsed_columns,
+    _derive_course_columns,
+    _patch_xlsx_namespaces_inplace,
+    _pick_course_sheet,
+)
+
+_MB = 1024 * 1024
+
+# 單一區塊（原始列 + 衍生欄位）最多佔記憶體上限的比例；其餘留給已累積的輸出欄位
+_BLOCK_BUDGET_FRACTION = 0.125
+
+
+@dataclass(frozen=True)
+class IngestProgress:
+    rows_read: int
+    rows_total: int  # 由工作表維度估計；未知時為 0
+    est_bytes: int  # 目前估計的工作記憶體（已累積輸出 + 當前區塊）
+    peak_bytes: int
+    ceiling_bytes: int
+
+    @property
+    def over_ceiling(self) -> bool:
+        return self.peak_bytes > self.ceiling_bytes > 0
+
+
+# ====== 逐列讀取（儲存格轉換規則與 pandas.read_excel 相同）======
+class _XlsRowSource:
+    def __init__(self, path: str):
+        try:
+            import xlrd
+        except ImportError as e:
+            raise ExcelFormatError(
+                "讀取 .xls 需要安裝 xlrd。\n"
+                "請執行：conda install -c conda-forge xlrd\n\n"
+                f"原始錯誤：{e}"
+            ) from e
+        # on_demand: only the sheets we actually touch are decoded
+        self._xlrd = xlrd
+        self.book = xlrd.open_workbook(path, on_demand=True)
+        self.sheet_names: List[str] = list(self.book.sheet_names())
+
+    def close(self) -> None:
+        self.book.release_resources()
+
+    def _convert(self, value, typ):
+        x = self._xlrd
+        if typ == x.XL_CELL_DATE:
+            epoch1904 = self.book.datemode
+            try:
+                value = x.xldate.xldate_as_datetime(value, epoch1904)
+            except OverflowError:
+                return value
+            year = value.timetuple()[0:3]
+            if (not epoch1904 and year == (1899, 12, 31)) or (epoch1904 and year == (1904, 1, 1)):
+                value = dt_time(value.hour, value.minute, value.second, value.microsecond)
+        elif typ == x.XL_CELL_ERROR:
+            value = np.nan
+        elif typ == x.XL_CELL_BOOLEAN:
+            value = bool(value)
+        elif typ == x.XL_CELL_NUMBER:
+            if math.isfinite(value):
+                iv = int(value)
+                if iv == value:
+                    value = iv
+        return value
+
+    def _row(self, sh, i: int) -> List[object]:
+        return [self._convert(v, t) for v, t in zip(sh.row_values(i), sh.row_types(i))]
+
+    def header(self, sheet: str) -> List[object]:
+        sh = self.book.sheet_by_name(sheet)
+        return self._row(sh, 0) if sh.nrows else []
+
+    def row_count_hint(self, sheet: str) -> int:
+        return max(0, self.book.sheet_by_name(sheet).nrows - 1)
+
+    def column_values(self, sheet: str, col: int) -> Iterator[object]:
+        sh = self.book.sheet_by_name(sheet)
+        for i in range(1, sh.nrows):
+            yield self._convert(sh.cell_value(i, col), sh.cell_type(i, col))
+
+    def iter_rows(self, sheet: str) -> Iterator[List[object]]:
+        sh = self.book.sheet_by_name(sheet)
+        for i in range(1, sh.nrows):
+            yield self._row(sh, i)
+        # The decoded sheet is no longer needed once streamed
+        self.book.unload_sheet(sheet)
+
+
+class _XlsxRowSource:
+    def __init__(self, path: str):
+        from openpyxl import load_workbook
+
+        try:
+            self.book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        except Exception:
+            if not _patch_xlsx_namespaces_inplace(path):
+                raise
+            self.book = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+        self.sheet_names: List[str] = list(self.book.sheetnames)
+
+    def close(self) -> None:
+        self.book.close()
+
+    @staticmethod
+    def _convert(cell):
+        if cell.value is None:
+            return ""
+        if cell.data_type == "e":
+            return np.nan
+        if cell.data_type == "n":
+            iv = int(cell.value)
+            if iv == cell.value:
+                return iv
+            return float(cell.value)
+        return cell.value
+
+    def header(self, sheet: str) -> List[object]:
+        for row in self.book[sheet].iter_rows(min_row=1, max_row=1):
+            out = [self._convert(c) for c in row]
+            while out and out[-1] == "":
+                out.pop()
+            return out
+        return []
+
+    def row_count_hint(self, sheet: str) -> int:
+        # Declared dimension only; may be missing or stale
+        n = self.book[sheet].max_row
+        return max(0, int(n) - 1) if n else 0
+
+    def column_values(self, sheet: str, col: int) -> Iterator[object]:
+        for row in self.book[sheet].iter_rows(min_row=2, min_col=col + 1, max_col=col + 1):
+            yield self._convert(row[0]) if row else ""
+
+    def iter_rows(self, sheet: str) -> Iterator[List[object]]:
+        ws = self.book[sheet]
+        ws.reset_dimensions()
+        for row in ws.iter_rows(min_row=2):
+            yield [self._convert(c) for c in row]
+
+
+def _open_row_source(path: str):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到檔案：{path}")
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xls":
+        return _XlsRowSource(path)
+    if ext in (".xlsx", ".xlsm", ".xltx", ".xltm"):
+        return _XlsxRowSource(path)
+    raise ExcelFormatError(f"不支援的 Excel 副檔名：{ext}（僅支援 .xls / .xlsx）")
+
+
+def _has_cid(v) -> bool:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return False
+    return any(ch.isdigit() for ch in str(v))
+
+
+def _pick_sheet_streaming(src, sheetnames: Sequence[str]) -> Tuple[str, List[object]]:
+    """只讀表頭與開課序號欄挑選課程工作表；同分時保留偏好順序較前者。"""
+    preferred = _pick_course_sheet(sheetnames)
+    ordered = [preferred] + [s for s in sheetnames if s != preferred]
+
+    candidates: List[Tuple[str, List[object]]] = []
+    for s in ordered:
+        try:
+            header = src.header(s)
+        except Exception:
+            continue
+        if all(c in header for c in REQUIRED_COLUMNS):
+            candidates.append((s, header))
+
+    if len(candidates) <= 1:
+        return candidates[0] if candidates else ("", [])
+
+    best, best_count = candidates[0], -1
+    for s, header in candidates:
+        col = header.index("開課序號")
+        cnt = sum(1 for v in src.column_values(s, col) if _has_cid(v))
+        if cnt > best_count:
+            best, best_count = (s, header), cnt
+    return best
+
+
+# ====== 欄式輸出緩衝 ======
+class _ColumnSink:
+    """預先配置的欄位陣列；逐塊寫入衍生結果，最後一次組成 DataFrame。"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self.size = 0
+        self.columns: List[str] = []
+        self.bufs: Dict[str, np.ndarray] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(b.nbytes for b in self.bufs.values()))
+
+    def _reserve(self, extra: int) -> None:
+        need = self.size + extra
+        if need <= self.capacity:
+            return
+        cap = max(need, int(self.capacity * 1.5))
+        for c, b in self.bufs.items():
+            nb = np.empty(cap, dtype=b.dtype)
+            nb[: self.size] = b[: self.size]
+            self.bufs[c] = nb
+        self.capacity = cap
+
+    @staticmethod
+    def _merge_dtype(a: np.dtype, b: np.dtype) -> np.dtype:
+        if a == b:
+            return a
+        if a.kind in "iuf" and b.kind in "iuf":
+            return np.result_type(a, b)
+        return np.dtype(object)
+
+    def append(self, block: pd.DataFrame) -> None:
+        k = len(block)
+        if not self.columns:
+            self.columns = [str(c) for c in block.columns]
+        if k == 0:
+            return
+        self._reserve(k)
+        for c in self.columns:
+            vals = block[c].to_numpy()
+            if vals.dtype.kind not in "biuf":
+                vals = block[c].to_numpy(dtype=object)
+            buf = self.bufs.get(c)
+            if buf is None:
+                buf = np.empty(self.capacity, dtype=vals.dtype)
+                self.bufs[c] = buf
+            elif buf.dtype != vals.dtype:
+                dt = self._merge_dtype(buf.dtype, vals.dtype)
+                if dt != buf.dtype:
+                    buf = buf.astype(dt)
+                    self.bufs[c] = buf
+            buf[self.size : self.size + k] = vals
+        self.size += k
+
+    def finish(self) -> pd.DataFrame:
+        """依 _cid 排序後組成 DataFrame；一次只重排一個欄位，避免整表複本。"""
+        n = self.size
+        cid = self.bufs["_cid"][:n] if "_cid" in self.bufs else np.empty(0, dtype=np.int64)
+        order = None
+        if n > 1 and np.any(cid[1:] < cid[:-1]):
+            order = np.argsort(cid, kind="mergesort")
+
+        data: Dict[str, object] = {}
+        for c in self.columns:
+            buf = self.bufs.pop(c)[:n]
+            col = buf[order] if order is not None else buf.copy()
+            del buf
+            data[c] = col
+        return pd.DataFrame(data, columns=self.columns, copy=False)
+
+
+# ====== 分塊載入 ======
+def load_courses_chunked(
+    excel_path: str,
+    chunk_rows: Optional[int] = None,
+    memory_ceiling_mb: Optional[float] = None,
+    progress: Optional[Callable[[IngestProgress], None]] = None,
+) -> Tuple[pd.DataFrame, str]:
+    """
+    低記憶體版本的 load_courses_auto：逐塊讀取原始列、逐塊計算衍生欄位，寫入預先配置的欄位陣列；
+    地點時間 / 課名在全部列到齊後整檔去重解析一次。
+    任何時刻只有「一個區塊的原始列與衍生結果」加上累積的輸出欄位在記憶體中。
+    progress 會收到每個區塊後的估計工作記憶體與上限（只回報，不會中止載入）。
+    """
+    chunk_max = int(chunk_rows or COURSE_INGEST_CHUNK_ROWS)
+    ceiling = int((COURSE_INGEST_MEMORY_CEILING_MB if memory_ceiling_mb is None else memory_ceiling_mb) * _MB)
+
+    src = _open_row_source(excel_path)
+    try:
+        sheetnames = list(src.sheet_names)
+        if not sheetnames:
+            raise ExcelFormatError("Workbook 沒有任何工作表。")
+
+        sheet, header = _pick_sheet_streaming(src, sheetnames)
+        if not sheet:
+            msg = "找不到包含必要欄位的工作表。\n\n"
+            msg += "工作表清單：\n" + "\n".join([f"- {s}" for s in sheetnames])
+            raise ExcelFormatError(msg)
+
+        width = len(header)
+        total = src.row_count_hint(sheet)
+        sink = _ColumnSink(total or chunk_max)
+        retained = 0
+        peak = 0
+        read = 0
+        chunk = chunk_max
+        rows_iter = src.iter_rows(sheet)
+
+        while True:
+            rows: List[List[object]] = []
+            for row in rows_iter:
+                if len(row) < width:
+                    row = row + [""] * (width - len(row))
+                elif len(row) > width:
+                    row = row[:width]
+                rows.append(row)
+                if len(rows) >= chunk:
+                    break
+            if not rows:
+                break
+            k = len(rows)
+            read += k
+
+            # Same cell -> dtype/NA rules as read_excel, applied to this block only
+            raw = TextParser([header] + rows, header=0, skip_blank_lines=False).read()
+            del rows
+            raw_bytes = int(raw.memory_usage(deep=True).sum())
+            # Time texts / course names are parsed once for the whole file after the last block
+            block = _derive_course_columns(raw, parse_values=False)
+            del raw
+            block_bytes = int(block.memory_usage(deep=True, index=False).sum())
+
+            est = retained + raw_bytes + block_bytes
+            peak = max(peak, est)
+            sink.append(block)
+            del block
+            retained += block_bytes
+
+            if progress is not None:
+                progress(IngestProgress(read, max(total, read), est, peak, ceiling))
+
+            # Shrink (or regrow) the next block so one block stays within its share of the ceiling
+            per_row = (raw_bytes + block_bytes) / k
+            if ceiling > 0 and per_row > 0:
+                fit = int(ceiling * _BLOCK_BUDGET_FRACTION / per_row)
+                chunk = max(min(COURSE_INGEST_MIN_CHUNK_ROWS, chunk_max), min(chunk_max, fit))
+
+        if not sink.columns:
+            # Header-only sheet: derive on an empty frame to get the column layout
+            sink.append(_derive_course_columns(TextParser([header], header=0).read(), parse_values=False))
+    finally:
+        src.close()
+
+    df = sink.finish()
+    # One deduplicated parse over the whole file (large enough to use the parse pool)
+    _add_parsed_columns(df)
+    return df, sheet
@@ -6,6 +6,7 @@ r"""專案架構與環境:
 
 from __future__ import annotations
 
+import multiprocessing
 import os
 import sys
 import traceback
@@ -18,6 +19,7 @@ from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QApplication, QMessageBox
 
 from app_mainwindow import MainWindow
+from app_parse_pool import shutdown_parse_pool
 
 
 def main() -> int:
@@ -41,7 +43,11 @@ def main() -> int:
         if smoke_test:
             QTimer.singleShot(400, app.quit)
 
-        return app.exec()
+        try:
+            return app.exec()
+        finally:
+            # The ingest process pool is kept alive across reloads; stop its workers on exit
+            shutdown_parse_pool()
 
     except Exception:
         # 確保有 QApplication 實例以顯示錯誤訊息
@@ -53,4 +59,6 @@ def main() -> int:
         return 1
 
 if __name__ == "__main__":
+    # Needed for the ingest process pool (app_parse_pool) in the packaged exe
+    multiprocessing.freeze_support()
     sys.exit(main())
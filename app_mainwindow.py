@@ -1,14 +1,14 @@
 from __future__ import annotations
 
+import html
 import os
 import shutil
 import sys
 import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
 
 import numpy as np
-import pandas as pd
 
 from PySide6.QtCore import (
     Qt,
@@ -16,7 +16,6 @@ from PySide6.QtCore import (
     QPoint,
     QSignalBlocker,
     QTimer,
-    QSortFilterProxyModel,
     QThreadPool,
 )
 from PySide6.QtGui import QAction, QBrush, QColor, QFontMetrics, QPainter, QPageLayout, QPageSize
@@ -33,9 +32,11 @@ from PySide6.QtWidgets import (
     QGroupBox,
     QHBoxLayout,
     QHeaderView,
+    QInputDialog,
     QLabel,
     QLineEdit,
     QMainWindow,
+    QMenu,
     QMessageBox,
     QPushButton,
     QProgressBar,
@@ -49,17 +50,20 @@ from PySide6.QtWidgets import (
 )
 
 from app_constants import (
+    DAYS,
     DAY_LABEL,
     GENED_CORE_OPTIONS,
-    GENED_DEPT_NAME,
     PERIODS,
     PERIOD_TIME,
-    SPORT_DEPT_NAME,
-    TEACHING_NAME_TOKEN,
     course_input_dir_path,
 )
-from app_excel import ensure_excel_readable, load_courses_auto
-from app_timetable_logic import build_timetable_matrix_per_day_lanes_sorted, darken, occupied_masks_sorted, occupied_masks_from_arrays
+from app_catalog_watch import CourseInputWatcher, is_course_excel_name
+from app_course_store import CatalogDiff, CourseStore
+from app_ingest import IngestProgress
+from app_saved_search import SavedSearch, SavedSearchReport, delete_saved_search, list_saved_searches, put_saved_search, saved_query
+from app_search import DEPT_ALL, GENED_CORE_ALL, SPECIAL_GENED, SPECIAL_SPORT, SPECIAL_TEACHING, QuerySuggestion, SearchEngine, SearchQuery, SearchResult
+from app_snapshot import load_courses_cached
+from app_timetable_logic import build_timetable_matrix_per_day_lanes_sorted, darken
 from app_user_data import (
     best_schedule_dir_path,
     list_all_users,
@@ -79,6 +83,7 @@ from app_utils import (
     format_cid4,
 )
 from app_widgets import (
+    CheckableComboBox,
     FavoritesTableWidget,
     FloatSortItem,
     IntSortItem,
@@ -87,20 +92,11 @@ from app_widgets import (
     TimetableWidget,
     TTTimeSelectDelegate,
 )
-from app_workers import BestScheduleWorker, SaveWorker
+from app_workers import BestScheduleWorker, CatalogLoadResult, CatalogLoadWorker, SavedSearchWorker, SaveWorker, SearchWorker
 
 FAV_CID_ROLE = Qt.UserRole + 1
 
 
-def _is_excel_file_name(fn: str) -> bool:
-    lf = fn.lower()
-    if not (lf.endswith(".xls") or lf.endswith(".xlsx")):
-        return False
-    if lf.startswith("~$"):
-        return False
-    return True
-
-
 def find_lex_last_excel(search_dirs: Sequence[str]) -> Optional[str]:
     candidates: List[str] = []
     for d in search_dirs:
@@ -108,7 +104,7 @@ def find_lex_last_excel(search_dirs: Sequence[str]) -> Optional[str]:
             continue
         try:
             for fn in os.listdir(d):
-                if not _is_excel_file_name(fn):
+                if not is_course_excel_name(fn):
                     continue
                 p = os.path.join(d, fn)
                 if os.path.isfile(p):
@@ -132,9 +128,8 @@ class MainWindow(QMainWindow):
 
         self.excel_path: str = ""
         self.course_sheet_name: str = ""
-        self.courses_df: Optional[pd.DataFrame] = None
+        self.course_store: Optional[CourseStore] = None
         self.display_columns: List[str] = []
-        self.filtered_df: pd.DataFrame = pd.DataFrame()
 
         self.username: str = ""
         self.user_dir_path: str = ""
@@ -156,9 +151,6 @@ class MainWindow(QMainWindow):
         self._locked_sorted_dirty = True
 
         # B-01: Cache for occupied masks
-        self._occ_lo = np.uint64(0)
-        self._occ_hi = np.uint64(0)
-        self._occ_cache_key: Optional[int] = None
 
         self._sel_lo = np.uint64(0)
         self._sel_hi = np.uint64(0)
@@ -217,30 +209,32 @@ class MainWindow(QMainWindow):
         self._brush_cache_base: List[QBrush] = []
         self._brush_cache_darker: List[QBrush] = []
 
-        self._cid_sorted: Optional[np.ndarray] = None
         self._splitter_state_backup: Optional[Dict[str, List[int]]] = None
-        self._name_sorted: Optional[np.ndarray] = None
-        self._teacher_sorted: Optional[np.ndarray] = None
-        self._credit_sorted: Optional[np.ndarray] = None
-        self._all_depts: Set[str] = set()
-        self._cid_arr: Optional[np.ndarray] = None
-        self._mask_lo_arr: Optional[np.ndarray] = None
-        self._mask_hi_arr: Optional[np.ndarray] = None
-        self._tba_arr: Optional[np.ndarray] = None
-        self._dept_arr: Optional[np.ndarray] = None
-        self._is_teaching_arr: Optional[np.ndarray] = None
-        self._is_sport_arr: Optional[np.ndarray] = None
-        self._not_full_arr: Optional[np.ndarray] = None
-        self._gened_mask_arr: Optional[np.ndarray] = None
-        self._slots_by_cid: Dict[int, Set[str]] = {}
-        self._parsed_slots_by_cid: Dict[int, List[Tuple[str, str]]] = {}
 
         self._search_timer = QTimer(self)
-        self._last_search_signature: Optional[Tuple] = None # B-07: Search signature cache
+        self._last_search_signature: Optional[SearchQuery] = None # B-07: Search signature cache
+        self._search_engine: Optional[SearchEngine] = None
+        # Store the engine answers for; differs from engine.store while a rebind is still queued on the search thread
+        self._search_engine_store: Optional[CourseStore] = None
+        self._course_watcher: Optional[CourseInputWatcher] = None
+        self._catalog_load_token = 0
+        self._catalog_load_inflight = False
+        self._catalog_load_interactive = False
+        self._catalog_load_pending: Optional[Tuple[str, bool]] = None
         self._search_timer.setSingleShot(True)
         self._search_timer.timeout.connect(self._do_search_now)
 
         self.threadpool = QThreadPool.globalInstance()
+        # Searches get their own single thread so a running best-schedule search cannot hold them up
+        self._search_pool = QThreadPool(self)
+        self._search_pool.setMaxThreadCount(1)
+        self._search_generation = 0
+        # 儲存搜尋時的基準結果在搜尋執行緒上計算：token -> (使用者資料夾, 使用者, 名稱, 查詢)
+        self._pending_saved_searches: Dict[int, Tuple[str, str, str, SearchQuery]] = {}
+        self._pending_saved_token = 0
+        # 已存搜尋：每次課程資料載入後背景評估一次，保留最近一次的新符合結果
+        self._saved_search_token = 0
+        self._saved_search_reports: List[SavedSearchReport] = []
         self._autosave_timer = QTimer(self)
         self._autosave_timer.setSingleShot(True)
         self._autosave_timer.timeout.connect(self._autosave_now)
@@ -506,11 +500,19 @@ class MainWindow(QMainWindow):
         form.addRow("教師", self.ed_teacher)
 
         self.ed_full = QLineEdit()
-        self.ed_full.setPlaceholderText("例如：A B（空白分隔多關鍵字；需全部命中）")
+        self.ed_full.setPlaceholderText("例如：A B、teacher:王、credit>=2、-day:五（空白分隔；需全部命中）")
+        self.ed_full.setToolTip(
+            "空白分隔的關鍵字需全部命中，也可指定欄位：\n"
+            "teacher:王　dept:資工　code:csu　name:程式（只比對該欄）\n"
+            "day:五　period:A-D（該日 / 該節次有課）\n"
+            "credit>=2　seats>0（學分 / 剩餘名額，支援 > >= < <= = !=）\n"
+            "開頭加 - 表示排除，例如 -王、-day:五"
+        )
         form.addRow("全面搜尋", self.ed_full)
 
-        self.cb_dept = QComboBox()
+        self.cb_dept = CheckableComboBox(DEPT_ALL)
         self._configure_combo_searchable(self.cb_dept, "輸入系所關鍵字搜尋")
+        self.cb_dept.setToolTip("可勾選多個系所（以「、」分隔，符合任一即可），也可直接輸入系所關鍵字")
         form.addRow("系所", self.cb_dept)
 
         self.ck_gened = QCheckBox("通識課程")
@@ -551,9 +553,10 @@ class MainWindow(QMainWindow):
         form.addRow("選項", opt_container)
 
         self.lbl_gened_core_disabled = QLabel("未選擇通識課程")
-        self.cb_gened_core = QComboBox()
+        self.cb_gened_core = CheckableComboBox(GENED_CORE_ALL, read_only=True)
         self.cb_gened_core.addItems(GENED_CORE_OPTIONS)
-        self.cb_gened_core.setCurrentText("所有通識")
+        self.cb_gened_core.setCurrentText(GENED_CORE_ALL)
+        self.cb_gened_core.setToolTip("可勾選多個核心通識領域（符合任一即可）")
 
         self.stk_gened_core = QStackedWidget()
         self.stk_gened_core.addWidget(self.lbl_gened_core_disabled)
@@ -567,6 +570,32 @@ class MainWindow(QMainWindow):
         self.cb_match_mode.setCurrentIndex(1)
         form.addRow("時間匹配", self.cb_match_mode)
 
+        # 每日節次條件（不必拖曳大範圍時段）
+        free_days_widget = QWidget()
+        free_days_row = QHBoxLayout(free_days_widget)
+        free_days_row.setContentsMargins(0, 0, 0, 0)
+        self.ck_free_days = [QCheckBox(d) for d in DAYS]
+        for ck in self.ck_free_days:
+            free_days_row.addWidget(ck)
+        free_days_row.addStretch(1)
+        form.addRow("整天空堂", free_days_widget)
+
+        self.cb_start_period = QComboBox()
+        self.cb_start_period.addItems(["最早不限"] + [f"第 {p} 節起" for p in PERIODS])
+        self.cb_end_period = QComboBox()
+        self.cb_end_period.addItems(["最晚不限"] + [f"第 {p} 節前結束" for p in PERIODS])
+        self.cb_max_daily = QComboBox()
+        self.cb_max_daily.addItems(["每日節數不限"] + [f"每日最多 {k} 節" for k in range(1, 11)])
+
+        period_widget = QWidget()
+        period_row = QHBoxLayout(period_widget)
+        period_row.setContentsMargins(0, 0, 0, 0)
+        period_row.addWidget(self.cb_start_period)
+        period_row.addWidget(self.cb_end_period)
+        period_row.addWidget(self.cb_max_daily)
+        period_row.addStretch(1)
+        form.addRow("節次條件", period_widget)
+
         btn_row_widget = QWidget()
         btn_row = QHBoxLayout(btn_row_widget)
         btn_row.setContentsMargins(0, 0, 0, 0)
@@ -581,6 +610,23 @@ class MainWindow(QMainWindow):
         btn_row.addStretch(1)
         form.addRow("操作", btn_row_widget)
 
+        saved_widget = QWidget()
+        saved_row = QHBoxLayout(saved_widget)
+        saved_row.setContentsMargins(0, 0, 0, 0)
+        self.btn_save_search = QPushButton("儲存目前搜尋…")
+        self.btn_save_search.setToolTip("以目前的搜尋條件建立已存搜尋；每次重新載入課程資料後會自動檢查是否有新符合的課程")
+        self.btn_save_search.clicked.connect(self.on_save_search)
+        self.btn_saved_searches = QPushButton("已存搜尋")
+        self.menu_saved_searches = QMenu(self.btn_saved_searches)
+        self.menu_saved_searches.aboutToShow.connect(self._rebuild_saved_search_menu)
+        self.btn_saved_searches.setMenu(self.menu_saved_searches)
+        self.lbl_saved_alert = QLabel("")
+        self.lbl_saved_alert.setWordWrap(True)
+        saved_row.addWidget(self.btn_save_search)
+        saved_row.addWidget(self.btn_saved_searches)
+        saved_row.addWidget(self.lbl_saved_alert, 1)
+        form.addRow("已存搜尋", saved_widget)
+
         vbox.addWidget(form_widget)
         vbox.addStretch(1)
 
@@ -690,18 +736,23 @@ class MainWindow(QMainWindow):
         lb_layout.addWidget(self.gb_results, 1)
         res_layout = QVBoxLayout(self.gb_results)
 
+        # 查無結果時的錯字建議（點選即套用）
+        self.lbl_suggest = QLabel("")
+        self.lbl_suggest.setWordWrap(True)
+        self.lbl_suggest.setTextFormat(Qt.RichText)
+        self.lbl_suggest.setVisible(False)
+        self.lbl_suggest.linkActivated.connect(self._apply_search_suggestion)
+        res_layout.addWidget(self.lbl_suggest)
+        self._search_suggestions: Tuple[QuerySuggestion, ...] = ()
+
         self.results_frozen = ResultsFrozenView()
         res_layout.addWidget(self.results_frozen, 1)
 
-        self.model_results = ResultsModel(pd.DataFrame(), self.favorites_ids)
+        self.model_results = ResultsModel(None, self.favorites_ids)
         self.model_results.favoriteToggled.connect(self.on_result_favorite_toggled)
 
-        self.proxy_results = QSortFilterProxyModel(self)
-        self.proxy_results.setSourceModel(self.model_results)
-        self.proxy_results.setSortRole(Qt.UserRole)
-        self.proxy_results.setDynamicSortFilter(True)
-
-        self.results_frozen.setModel(self.proxy_results)
+        # The model sorts itself from per-column rank arrays (no proxy in between)
+        self.results_frozen.setModel(self.model_results)
 
         # signals
         self.ed_serial.textChanged.connect(lambda: self.schedule_search(80))
@@ -720,6 +771,11 @@ class MainWindow(QMainWindow):
         self.ck_show_tba.stateChanged.connect(lambda _v: self.schedule_search(0))
 
         self.cb_match_mode.currentIndexChanged.connect(lambda _v: self.schedule_search(0))
+        for ck in self.ck_free_days:
+            ck.stateChanged.connect(lambda _v: self.schedule_search(0))
+        self.cb_start_period.currentIndexChanged.connect(lambda _v: self.schedule_search(0))
+        self.cb_end_period.currentIndexChanged.connect(lambda _v: self.schedule_search(0))
+        self.cb_max_daily.currentIndexChanged.connect(lambda _v: self.schedule_search(0))
         self.cb_gened_core.currentTextChanged.connect(lambda _v: self.schedule_search(0))
 
         self.ck_gened.toggled.connect(self.on_special_option_toggled)
@@ -832,6 +888,8 @@ class MainWindow(QMainWindow):
 
     # ====== Excel 載入：自動找字典序最後的 xls/xlsx ======
     def _try_autoload_default_excel(self) -> None:
+        # New or replaced exports dropped into course_inputs are picked up automatically
+        self._start_course_input_watcher()
         try:
             input_dir = course_input_dir_path()
         except Exception:
@@ -905,83 +963,245 @@ class MainWindow(QMainWindow):
         if not self.excel_path or not os.path.exists(self.excel_path):
             return
         try:
-            self._load_excel(self.excel_path)
+            self._start_catalog_load(self.excel_path, interactive=True)
         except Exception as e:
             QMessageBox.critical(self, "重新載入失敗", f"重新載入失敗：\n{e}")
 
-    # ====== 資料索引 ======
-    def _build_course_binary_index(self) -> None:
-        if self.courses_df is None or self.courses_df.empty:
-            self._cid_sorted = None
-            self._name_sorted = None
-            self._teacher_sorted = None
-            self._credit_sorted = None
-            self._cid_arr = None
-            self._mask_lo_arr = None
-            self._mask_hi_arr = None
-            self._tba_arr = None
-            self._dept_arr = None
-            self._is_teaching_arr = None
-            self._is_sport_arr = None
-            self._not_full_arr = None
-            self._gened_mask_arr = None
-            self._slots_by_cid = {}
-            self._parsed_slots_by_cid = {}
-            self._last_search_signature = None
-            return
-
-        cids = self.courses_df["_cid"].to_numpy(dtype=np.int64, copy=True)
-        order = np.argsort(cids, kind="mergesort")
-        self._cid_sorted = cids[order]
-        self._name_sorted = self.courses_df["中文課程名稱"].to_numpy(dtype=object, copy=False)[order]
-        self._teacher_sorted = self.courses_df["教師"].to_numpy(dtype=object, copy=False)[order]
-        self._credit_sorted = self.courses_df["學分"].to_numpy(dtype=float, copy=False)[order]
-
-        self._cid_arr = self.courses_df["_cid"].to_numpy(dtype=np.int64, copy=False)
-        self._mask_lo_arr = self.courses_df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-        self._mask_hi_arr = self.courses_df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
-        self._tba_arr = self.courses_df["_tba"].to_numpy(dtype=bool, copy=False)
-        if "_is_teaching" in self.courses_df.columns:
-            self._is_teaching_arr = self.courses_df["_is_teaching"].to_numpy(dtype=bool, copy=False)
-        if "_is_sport" in self.courses_df.columns:
-            self._is_sport_arr = self.courses_df["_is_sport"].to_numpy(dtype=bool, copy=False)
-        if "_not_full" in self.courses_df.columns:
-            self._not_full_arr = self.courses_df["_not_full"].to_numpy(dtype=bool, copy=False)
-        if "_gened_mask" in self.courses_df.columns:
-            self._gened_mask_arr = self.courses_df["_gened_mask"].to_numpy(dtype=np.uint32, copy=False)
-        if "系所" in self.courses_df.columns:
-            self._dept_arr = self.courses_df["系所"].to_numpy(dtype=object, copy=False)
-        else:
-            self._dept_arr = None
-            
-        self._slots_by_cid = {}
-        self._parsed_slots_by_cid = {}
-        for cid, slots in zip(self.courses_df["_cid"].tolist(), self.courses_df["_slots_set"].tolist()):
-            try:
-                cid_i = int(cid)
-            except Exception:
-                continue
-            if isinstance(slots, set):
-                self._slots_by_cid[cid_i] = slots
-                parsed = []
-                for s in slots:
-                    if isinstance(s, str) and "-" in s:
-                        parts = s.split("-", 1)
-                        if len(parts) == 2:
-                            parsed.append((parts[0], parts[1]))
-                self._parsed_slots_by_cid[cid_i] = parsed
+    def _apply_catalog_reload(
+        self, path: str, sheet: str, new: CourseStore, diff: CatalogDiff, changes: Optional[FrozenSet[str]] = None
+    ) -> np.ndarray:
+        """把已建立好的新 store 換上（整個過程在 GUI 執行緒的單一呼叫內完成）。"""
+        old = self.course_store
+        changed = diff.changed_cids
 
-    def _load_excel(self, path: str) -> None:
-        ensure_excel_readable(path)
-        df, sheet = load_courses_auto(path)
+        if diff.is_empty:
+            self.excel_path = path
+            self._set_catalog_label("重新載入：無變更")
+            return changed
+
+        new.start_background_derivation()
+
+        if not diff.same_rows or new.display_columns != old.display_columns:
+            self._install_course_store(new, path, sheet)
+            self._set_catalog_label(
+                f"重新載入：新增 {diff.added.size}、移除 {diff.removed.size}、異動 {diff.changed.size} 筆"
+            )
+            return changed
 
         self.excel_path = path
-        self.courses_df = df
+        self.course_store = new
         self.course_sheet_name = sheet
+        changed_rows = new.rows_of(changed)
+
+        engine = self._search_engine
+        if engine is not None and self._search_engine_store is old and changes is not None:
+            # Keep the engine: the rebind runs on the (single) search thread, queued behind any running search,
+            # and drops only cached results that depend on changed columns. Results computed on the old
+            # store before the rebind are dropped by the generation bump.
+            self._search_generation += 1
+            self._search_pool.start(lambda: engine.rebind(new, changes))
+            self._search_engine_store = new
+
+        if not np.array_equal(new.dept_dict.categories, old.dept_dict.categories):
+            self._populate_dept_combo(new)
+
+        refreshed = self.model_results.replace_store_rows(new, changed_rows)
+        inc_sorted = self._get_included_sorted()
+        if np.intersect1d(changed, inc_sorted).size:
+            self._refresh_timetable()
+        if np.intersect1d(changed, self._get_favorites_sorted()).size:
+            self._refresh_favorites_table()
+
+        # Flags such as "not full" may have flipped, so the filter has to run again (a cache hit when the
+        # query does not read a changed column); an unchanged result set leaves the view (and its sort) untouched.
+        self._last_search_signature = None
+        self.schedule_search(0)
+        self._set_catalog_label(f"重新載入：異動 {diff.changed.size} 筆（目前列表中 {refreshed} 筆）")
+        self._start_saved_search_refresh()
+        return changed
+
+    # ====== 背景載入 / course_inputs 監看 ======
+    def _start_course_input_watcher(self) -> None:
+        if self._course_watcher is not None:
+            return
+        try:
+            folder = course_input_dir_path()
+        except Exception:
+            return
+        self._course_watcher = CourseInputWatcher(os.fspath(folder), parent=self)
+        self._course_watcher.exportReady.connect(self._on_course_export_ready)
+
+    def _on_course_export_ready(self, path: str) -> None:
+        self._start_catalog_load(path, interactive=False)
+
+    def _start_catalog_load(self, path: str, interactive: bool) -> None:
+        """在背景讀取課程檔；同時只跑一個，期間的新要求只保留最後一個。"""
+        if self._catalog_load_inflight:
+            self._catalog_load_pending = (path, interactive)
+            return
+        self._catalog_load_inflight = True
+        self._catalog_load_interactive = interactive
+        self._catalog_load_token += 1
+        self.lbl_excel.setText(f"課程 Excel：背景載入中… {path}")
+
+        worker = CatalogLoadWorker(self._catalog_load_token, path, self.course_store)
+        worker.progress.connect(self._show_ingest_progress)
+        worker.finished.connect(self._on_catalog_load_finished)
+        self.threadpool.start(worker)
+
+    def _on_catalog_load_finished(self, token: int, ok: bool, result: Optional[CatalogLoadResult], msg: str) -> None:
+        self._catalog_load_inflight = False
+        interactive = self._catalog_load_interactive
+        pending, self._catalog_load_pending = self._catalog_load_pending, None
+
+        # A synchronous load (open dialog) or a queued request supersedes this result
+        if token == self._catalog_load_token and pending is None:
+            if not ok or result is None:
+                self._set_catalog_label(f"載入失敗：{msg}")
+                if interactive:
+                    QMessageBox.critical(self, "重新載入失敗", f"重新載入失敗：\n{msg}")
+            elif result.diff is None or self.course_store is None:
+                result.store.start_background_derivation()
+                self._install_course_store(result.store, result.path, result.sheet)
+            else:
+                self._apply_catalog_reload(result.path, result.sheet, result.store, result.diff, result.changes)
 
-        self._build_course_binary_index()
+        if pending is not None:
+            self._start_catalog_load(*pending)
 
-        base_display = [c for c in df.columns if not str(c).startswith("_")]
+    # ====== 已存搜尋 ======
+    def _start_saved_search_refresh(self) -> None:
+        """課程資料換上後，在背景一次評估所有使用者的已存搜尋。"""
+        if self.course_store is None or not self.excel_path:
+            return
+        self._saved_search_token += 1
+        worker = SavedSearchWorker(self._saved_search_token, self.excel_path, self.course_store)
+        worker.finished.connect(self._on_saved_searches_refreshed)
+        self.threadpool.start(worker)
+
+    def _on_saved_searches_refreshed(self, token: int, reports: List[SavedSearchReport], msg: str) -> None:
+        if token != self._saved_search_token:
+            return
+        if msg:
+            self.lbl_saved_alert.setText(f"已存搜尋檢查失敗：{msg}")
+            return
+        self._saved_search_reports = list(reports)
+        self._show_saved_search_alert()
+
+    def _show_saved_search_alert(self) -> None:
+        mine = [r for r in self._saved_search_reports if r.user == self.username]
+        if not mine:
+            self.lbl_saved_alert.setText("")
+            self.lbl_saved_alert.setToolTip("")
+            return
+        self.lbl_saved_alert.setText("有新符合課程：" + "、".join(f"{r.name}（+{len(r.new_cids)}）" for r in mine))
+        self.lbl_saved_alert.setToolTip(
+            "\n".join(f"{r.name}：{' '.join(format_cid4(c) for c in r.new_cids)}（共 {r.total} 筆）" for r in mine)
+        )
+
+    def on_save_search(self) -> None:
+        if self.course_store is None:
+            return
+        if not self.username or not self.user_dir_path:
+            QMessageBox.information(self, "需要使用者", "請先登入使用者，已存搜尋會保存在使用者資料夾中。")
+            return
+        name, ok = QInputDialog.getText(self, "儲存目前搜尋", "搜尋名稱：")
+        name = (name or "").strip()
+        if not ok or not name:
+            return
+        existing = {s.name for s in list_saved_searches(self.user_dir_path)}
+        if name in existing:
+            if QMessageBox.question(self, "名稱已存在", f"已有名為「{name}」的搜尋，要取代嗎？") != QMessageBox.Yes:
+                return
+        q = saved_query(self._build_search_query())
+        # Current matches are the baseline: later reloads only report courses that are new.
+        # They are computed on the search thread, queued behind any running search (usually a cache hit)
+        self._pending_saved_token += 1
+        token = self._pending_saved_token
+        self._pending_saved_searches[token] = (self.user_dir_path, self.username, name, q)
+        worker = SearchWorker(token, self._get_search_engine(), q, lambda: token)
+        worker.finished.connect(self._on_saved_search_baseline)
+        self._search_pool.start(worker)
+
+    def _on_saved_search_baseline(self, token: int, engine: SearchEngine, result: Optional[SearchResult], msg: str) -> None:
+        pending = self._pending_saved_searches.pop(token, None)
+        if pending is None:
+            return
+        user_dir_path, username, name, q = pending
+        if result is None:
+            self.lbl_saved_alert.setText(f"儲存搜尋「{name}」失敗：{msg}" if msg else "")
+            return
+        cids = np.unique(engine.store.cid[result.rows]).astype(np.int64)
+        put_saved_search(user_dir_path, SavedSearch(name, q, tuple(cids.tolist()), time.strftime("%Y-%m-%d %H:%M:%S")))
+        self._saved_search_reports = [r for r in self._saved_search_reports if not (r.user == username and r.name == name)]
+        self._show_saved_search_alert()
+        self.lbl_saved_alert.setText(f"已儲存搜尋「{name}」（目前 {cids.size} 筆）")
+
+    def _rebuild_saved_search_menu(self) -> None:
+        menu = self.menu_saved_searches
+        menu.clear()
+        searches = list_saved_searches(self.user_dir_path) if self.username and self.user_dir_path else []
+        if not searches:
+            act = menu.addAction("（尚無已存搜尋）" if self.username else "（請先登入使用者）")
+            act.setEnabled(False)
+            return
+        new_counts = {r.name: len(r.new_cids) for r in self._saved_search_reports if r.user == self.username}
+        for s in searches:
+            title = f"{s.name}（新 {new_counts[s.name]}）" if s.name in new_counts else s.name
+            sub = menu.addMenu(title)
+            sub.addAction("套用", lambda s=s: self._apply_saved_search(s))
+            sub.addAction("刪除", lambda s=s: self._delete_saved_search(s))
+
+    def _apply_saved_search(self, s: SavedSearch) -> None:
+        self._apply_search_query(s.query)
+        self._saved_search_reports = [r for r in self._saved_search_reports if not (r.user == self.username and r.name == s.name)]
+        self._show_saved_search_alert()
+
+    def _delete_saved_search(self, s: SavedSearch) -> None:
+        if QMessageBox.question(self, "刪除已存搜尋", f"確定要刪除「{s.name}」？") != QMessageBox.Yes:
+            return
+        delete_saved_search(self.user_dir_path, s.name)
+        self._saved_search_reports = [r for r in self._saved_search_reports if not (r.user == self.username and r.name == s.name)]
+        self._show_saved_search_alert()
+
+    def _set_catalog_label(self, note: str = "") -> None:
+        n = len(self.course_store) if self.course_store is not None else 0
+        extra = f"；{note}" if note else ""
+        self.lbl_excel.setText(f"課程 Excel：{self.excel_path}（課程工作表：{self.course_sheet_name}；課程筆數：{n}{extra}）")
+
+    def _on_ingest_progress(self, p: IngestProgress) -> None:
+        # Synchronous load: repaint the label only; pumping the event loop here would let timers,
+        # watcher signals and queued search results re-enter the window mid-load
+        self._show_ingest_progress(p)
+        self.lbl_excel.repaint()
+
+    def _show_ingest_progress(self, p: IngestProgress) -> None:
+        total = f"/{p.rows_total}" if p.rows_total else ""
+        warn = "（超過上限）" if p.over_ceiling else ""
+        self.lbl_excel.setText(
+            f"課程 Excel：分塊載入中… {p.rows_read}{total} 列；"
+            f"估計記憶體 {p.est_bytes / 2**20:.1f} MB / 上限 {p.ceiling_bytes / 2**20:.0f} MB{warn}"
+        )
+
+    def _load_excel(self, path: str) -> None:
+        df, sheet = load_courses_cached(path, progress=self._on_ingest_progress)
+        store = CourseStore(df)
+        del df
+        # Search/label columns are built off the GUI thread; accessors wait only if used first
+        store.start_background_derivation()
+        # Any background load still running was started against the previous catalog
+        self._catalog_load_token += 1
+        self._install_course_store(store, path, sheet)
+        if self._course_watcher is not None:
+            self._course_watcher.acknowledge()
+
+    def _install_course_store(self, store: CourseStore, path: str, sheet: str) -> None:
+        self.excel_path = path
+        self.course_store = store
+        self.course_sheet_name = sheet
+        self._last_search_signature = None
+
+        base_display = list(store.display_columns)
         preferred = ["開課序號", "開課代碼", "中文課程名稱", "教師"]
         ordered = [c for c in preferred if c in base_display]
         for c in base_display:
@@ -989,34 +1209,34 @@ class MainWindow(QMainWindow):
                 ordered.append(c)
         self.display_columns = ordered
 
-        n = len(df)
-        self.lbl_excel.setText(f"課程 Excel：{self.excel_path}（課程工作表：{self.course_sheet_name}；課程筆數：{n}）")
-
-        self.cb_dept.blockSignals(True)
-        self.cb_dept.clear()
-        self.cb_dept.addItem("(全部)")
-        if "系所" in df.columns:
-            self._all_depts = set(df["系所"].dropna().astype(str).unique().tolist())
-            for d in sorted(self._all_depts):
-                self.cb_dept.addItem(str(d))
-        else:
-            self._all_depts = set()
-        self.cb_dept.blockSignals(False)
-
-        if self.cb_dept.completer() is not None:
-            self.cb_dept.completer().setModel(self.cb_dept.model())
-
+        self._set_catalog_label()
+        self._populate_dept_combo(store)
         self._refresh_user_selector()
+        self._start_saved_search_refresh()
 
-        self.filtered_df = df.loc[:, self.display_columns]
-        self.model_results.set_data_view(df, None, self.display_columns)
+        self.model_results.set_data_view(store, None, self.display_columns)
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
 
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.schedule_search(0)
 
+    def _populate_dept_combo(self, store: CourseStore) -> None:
+        self.cb_dept.blockSignals(True)
+        self.cb_dept.clear()
+        self.cb_dept.addItem(DEPT_ALL)
+        if store.has_column("系所"):
+            # The string table is already sorted and unique; counts come from the integer codes
+            dept_counts = store.dept_dict.counts()
+            for d, cnt in zip(store.dept_dict.categories, dept_counts):
+                if isinstance(d, str) and d:
+                    self.cb_dept.addItem(d)
+                    self.cb_dept.setItemData(self.cb_dept.count() - 1, f"{d}：{int(cnt)} 門課程", Qt.ToolTipRole)
+        self.cb_dept.blockSignals(False)
+
+        if self.cb_dept.completer() is not None:
+            self.cb_dept.completer().setModel(self.cb_dept.model())
+
     def _refresh_user_selector(self, prefer_select: Optional[str] = None) -> None:
         if not self.excel_path:
             return
@@ -1118,7 +1338,7 @@ class MainWindow(QMainWindow):
                 self._tt_first_lane_col[int(di)] = c
 
     def schedule_search(self, delay_ms: int = 60) -> None:
-        if self.courses_df is None:
+        if self.course_store is None:
             return
         delay_ms = int(max(0, delay_ms))
         if delay_ms == 0:
@@ -1409,6 +1629,11 @@ class MainWindow(QMainWindow):
         _blk(self.ck_exclude_selected)
         _blk(self.ck_show_tba)
         _blk(self.cb_gened_core)
+        for ck in self.ck_free_days:
+            _blk(ck)
+        _blk(self.cb_start_period)
+        _blk(self.cb_end_period)
+        _blk(self.cb_max_daily)
 
         self.ed_serial.clear()
         self.ed_course_code.clear()
@@ -1430,14 +1655,63 @@ class MainWindow(QMainWindow):
         self.ck_show_tba.setChecked(False)
 
         self.cb_match_mode.setCurrentIndex(1)
-        self.cb_gened_core.setCurrentText("所有通識")
+        for ck in self.ck_free_days:
+            ck.setChecked(False)
+        self.cb_start_period.setCurrentIndex(0)
+        self.cb_end_period.setCurrentIndex(0)
+        self.cb_max_daily.setCurrentIndex(0)
+        self.cb_gened_core.setCurrentText(GENED_CORE_ALL)
         self.stk_gened_core.setCurrentIndex(0)
 
         for obj, prev in blockers:
             obj.blockSignals(prev)
 
+        # Drop any header sort: results go back to the search engine's relevance order
+        self.results_frozen.main_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model_results.sort(-1)
+
         self.on_clear_time_selection()
 
+    def _apply_search_query(self, q: SearchQuery) -> None:
+        """把查詢條件填回搜尋面板（已存搜尋的「套用」）。"""
+        self.on_clear_all_conditions()
+
+        widgets = [
+            self.ed_serial, self.ed_course_code, self.ed_cname, self.ed_teacher, self.ed_full, self.cb_dept,
+            self.cb_match_mode, self.ck_gened, self.ck_sport, self.ck_teaching, self.ck_not_full, self.ck_show_tba,
+            self.cb_gened_core, self.cb_start_period, self.cb_end_period, self.cb_max_daily, *self.ck_free_days,
+        ]
+        blockers = [(w, w.blockSignals(True)) for w in widgets]
+
+        self.ed_serial.setText(q.serial)
+        self.ed_course_code.setText(q.code)
+        self.ed_cname.setText(q.cname)
+        self.ed_teacher.setText(q.teacher)
+        self.ed_full.setText(q.full)
+        if q.dept:
+            self.cb_dept.setEditText(q.dept)
+        self.ck_gened.setChecked(q.special == SPECIAL_GENED)
+        self.ck_sport.setChecked(q.special == SPECIAL_SPORT)
+        self.ck_teaching.setChecked(q.special == SPECIAL_TEACHING)
+        self.cb_gened_core.setEditText(q.gened_core or GENED_CORE_ALL)
+        self.stk_gened_core.setCurrentIndex(1 if q.special == SPECIAL_GENED else 0)
+        self.ck_not_full.setChecked(q.not_full)
+        self.ck_show_tba.setChecked(q.show_tba)
+        self.cb_match_mode.setCurrentIndex(q.match_mode)
+        for d, ck in enumerate(self.ck_free_days):
+            ck.setChecked(d in q.free_days)
+        self.cb_start_period.setCurrentIndex(q.start_period + 1)
+        self.cb_end_period.setCurrentIndex(q.end_period + 1)
+        self.cb_max_daily.setCurrentIndex(q.max_daily)
+
+        for w, prev in blockers:
+            w.blockSignals(prev)
+
+        self._sel_lo = np.uint64(q.sel_lo)
+        self._sel_hi = np.uint64(q.sel_hi)
+        self.tbl_tt.viewport().update()
+        self.schedule_search(0)
+
     def on_special_option_toggled(self, checked: bool) -> None:
         sender = self.sender()
         if not isinstance(sender, QCheckBox):
@@ -1522,7 +1796,7 @@ class MainWindow(QMainWindow):
             self._fav_seq_next += 1
 
     def on_login(self) -> None:
-        if self.courses_df is None:
+        if self.course_store is None:
             QMessageBox.warning(self, "尚未載入", "請先載入課程 Excel。")
             return
 
@@ -1563,7 +1837,7 @@ class MainWindow(QMainWindow):
                 self._get_included_sorted(),
                 self._get_locked_sorted(),
                 self.fav_seq,
-                self.courses_df,
+                self.course_store,
             )
         except Exception as e:
             QMessageBox.critical(self, "建立使用者檔案失敗", f"無法建立本次登入檔案：\n{self.session_file_path}\n\n錯誤：{e}")
@@ -1587,12 +1861,12 @@ class MainWindow(QMainWindow):
 
         self.lbl_user.setText(f"使用者：{self.username}")
         self._set_user_file_label()
+        self._show_saved_search_alert()
         self._refresh_history_list()
 
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
         self.schedule_search(0)
 
     def _set_readonly(self, readonly: bool) -> None:
@@ -1630,40 +1904,19 @@ class MainWindow(QMainWindow):
         return out
 
     def _course_name_by_id(self, cid: int) -> str:
-        if self._cid_sorted is None or self._name_sorted is None:
+        if self.course_store is None:
             return ""
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            return str(self._name_sorted[pos] or "").strip()
-        return ""
+        return self.course_store.name_of(cid)
 
     def _teacher_by_id(self, cid: int) -> str:
-        if self._cid_sorted is None or self._teacher_sorted is None:
+        if self.course_store is None:
             return ""
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            return str(self._teacher_sorted[pos] or "").strip()
-        return ""
+        return self.course_store.teacher_of(cid)
 
     def _credit_by_id(self, cid: int) -> float:
-        if self._cid_sorted is None or self._credit_sorted is None:
+        if self.course_store is None:
             return 0.0
-        x = np.int64(int(cid))
-        pos = int(np.searchsorted(self._cid_sorted, x, side="left"))
-        if 0 <= pos < self._cid_sorted.size and int(self._cid_sorted[pos]) == int(x):
-            v = self._credit_sorted[pos]
-            try:
-                if np.isnan(v):
-                    return 0.0
-            except Exception:
-                pass
-            try:
-                return float(v)
-            except Exception:
-                return 0.0
-        return 0.0
+        return self.course_store.credit_of(cid)
 
     def _refresh_favorites_table(self) -> None:
         # Before clearing, save the vertical scroll position
@@ -1924,7 +2177,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
         self.schedule_autosave(250)
         self.schedule_search(0)
 
@@ -2008,7 +2260,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
 
         self.schedule_autosave(250)
         self.schedule_search(0)
@@ -2150,7 +2401,6 @@ class MainWindow(QMainWindow):
             
             self._refresh_favorites_table()
             self.model_results.notify_favorites_changed()
-            self.proxy_results.invalidate()
             self.schedule_autosave(250)
             self.schedule_search(0)
         finally:
@@ -2196,7 +2446,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
 
         self.schedule_autosave(250)
         self.schedule_search(0)
@@ -2227,7 +2476,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
 
         self.schedule_autosave(250)
         self.schedule_search(0)
@@ -2271,7 +2519,6 @@ class MainWindow(QMainWindow):
             self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
 
         self.schedule_autosave(250)
         self.schedule_search(0)
@@ -2281,7 +2528,7 @@ class MainWindow(QMainWindow):
             return
         if not self.username or not self.session_file_path:
             return
-        if self.courses_df is None:
+        if self.course_store is None:
             return
 
         self.included_ids |= self.locked_ids
@@ -2303,7 +2550,7 @@ class MainWindow(QMainWindow):
             return
         if not self._save_pending:
             return
-        if self.courses_df is None or not self.username or not self.session_file_path:
+        if self.course_store is None or not self.username or not self.session_file_path:
             return
         if self._save_inflight:
             return
@@ -2329,7 +2576,7 @@ class MainWindow(QMainWindow):
             included_sorted,
             locked_sorted,
             seq,
-            self.courses_df,
+            self.course_store,
         )
         worker.finished.connect(self._on_save_finished)
         self.threadpool.start(worker)
@@ -2442,7 +2689,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
         self.schedule_search(0)
         self._update_history_highlights()
         return True
@@ -2547,7 +2793,7 @@ class MainWindow(QMainWindow):
         self._close_history_panel()
 
     def on_start_best_schedule(self) -> None:
-        if self.courses_df is None:
+        if self.course_store is None:
             QMessageBox.warning(self, "尚未載入", "請先載入課程 Excel。")
             return
         if not self.username or not self.session_file_path:
@@ -2593,7 +2839,7 @@ class MainWindow(QMainWindow):
             self.locked_ids,
             self.included_ids,
             self.fav_seq,
-            self.courses_df,
+            self.course_store,
         )
         self._best_worker = worker
         worker.progress.connect(self._on_best_schedule_progress)
@@ -2690,7 +2936,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
         self.schedule_search(0)
         self._update_history_highlights()
 
@@ -2817,7 +3062,7 @@ class MainWindow(QMainWindow):
         if not self.session_file_path:
             QMessageBox.warning(self, "尚未登入", "請先使用「新增/切換」建立本次登入檔案。")
             return
-        if self.courses_df is None:
+        if self.course_store is None:
             return
 
         try:
@@ -2828,7 +3073,7 @@ class MainWindow(QMainWindow):
                 self._get_included_sorted(),
                 self._get_locked_sorted(),
                 self.fav_seq,
-                self.courses_df,
+                self.course_store,
             )
         except Exception as e:
             QMessageBox.critical(self, "覆蓋失敗", f"覆蓋失敗：\n{e}")
@@ -2844,7 +3089,6 @@ class MainWindow(QMainWindow):
         self._refresh_favorites_table()
         self._refresh_timetable()
         self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
         current_mode = self._history_mode
         self._close_history_panel()
         if current_mode == "history":
@@ -2853,86 +3097,16 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "完成", "已使用此規劃覆蓋本次登入檔案。")
 
     def _compute_total_credits(self, ids_sorted: np.ndarray) -> float:
-        if self.courses_df is None:
+        if self.course_store is None:
             return 0.0
         if ids_sorted is None or ids_sorted.size == 0:
             return 0.0
-
-        if self._cid_sorted is not None and self._credit_sorted is not None:
-            ids = ids_sorted.astype(np.int64, copy=False)
-            pos = np.searchsorted(self._cid_sorted, ids)
-            if pos.size == 0:
-                return 0.0
-            valid = (pos >= 0) & (pos < self._cid_sorted.size)
-            if not np.any(valid):
-                return 0.0
-            pos = pos[valid]
-            ids = ids[valid]
-            match = self._cid_sorted[pos] == ids
-            if not np.any(match):
-                return 0.0
-            credits = self._credit_sorted[pos[match]]
-            total = float(np.nansum(credits)) if credits.size else 0.0
-            return total
-
-        sub = self.courses_df[self.courses_df["_cid"].isin(ids_sorted)][["學分"]]
-        if sub.empty:
-            return 0.0
-        s = pd.to_numeric(sub["學分"], errors="coerce").fillna(0).sum()
-        try:
-            return float(s)
-        except Exception:
-            return 0.0
+        return self.course_store.total_credits(ids_sorted)
 
     def _collect_slots_for_ids(self, ids: Optional[Set[int]]) -> Set[Tuple[str, str]]:
-        slots: Set[Tuple[str, str]] = set()
-        if self.courses_df is None or not ids:
-            return slots
-        
-        # Use parsed cache if available for faster collection
-        if self._parsed_slots_by_cid:
-            for cid in ids:
-                cid_i = int(cid)
-                parsed = self._parsed_slots_by_cid.get(cid_i)
-                if parsed:
-                    slots.update(parsed)
-            return slots
-
-        if self._slots_by_cid:
-            for cid in ids:
-                try:
-                    cid_i = int(cid)
-                except Exception:
-                    continue
-                slots_set = self._slots_by_cid.get(cid_i)
-                if not slots_set:
-                    continue
-                for slot in slots_set:
-                    if not isinstance(slot, str) or "-" not in slot:
-                        continue
-                    day, per = slot.split("-", 1)
-                    if day and per:
-                        slots.add((day, per))
-            return slots
-
-        try:
-            ids_list = [int(x) for x in ids]
-        except Exception:
-            ids_list = []
-        if not ids_list:
-            return slots
-        subset = self.courses_df[self.courses_df["_cid"].isin(ids_list)]
-        if subset.empty or "_slots_set" not in subset:
-            return slots
-        for entry in subset["_slots_set"]:
-            slots_set = entry if isinstance(entry, set) else set()
-            for slot in slots_set:
-                if not isinstance(slot, str) or "-" not in slot:
-                    continue
-                day, per = slot.split("-", 1)
-                if day and per:
-                    slots.add((day, per))
-        return slots
+        if self.course_store is None or not ids:
+            return set()
+        return self.course_store.slot_pairs_for_ids(sorted(int(x) for x in ids))
 
     def _render_timetable(
         self,
@@ -2947,11 +3121,10 @@ class MainWindow(QMainWindow):
         # E-01: Disable updates before massive changes
         widget.setUpdatesEnabled(False)
         matrix, conflicts, day_lanes, col_day_idx, id_matrix, locked_matrix = build_timetable_matrix_per_day_lanes_sorted(
-            self.courses_df,
+            self.course_store,
             included_sorted,
             locked_ids,
             self.show_days,
-            parsed_slots_map=self._parsed_slots_by_cid,
         )
         cols = len(col_day_idx)
         if store_state:
@@ -3117,7 +3290,7 @@ class MainWindow(QMainWindow):
             return
 
         snapshot = self._history_preview_snapshot
-        if snapshot is None or self.courses_df is None:
+        if snapshot is None or self.course_store is None:
             if getattr(self, "gb_tt_preview", None) is not None:
                 self.gb_tt_preview.setVisible(False)
             return
@@ -3156,7 +3329,7 @@ class MainWindow(QMainWindow):
         self._apply_timetable_row_heights()
 
     def _refresh_timetable(self) -> None:
-        if self.courses_df is None:
+        if self.course_store is None:
             return
 
         self.included_ids |= self.locked_ids
@@ -3205,278 +3378,110 @@ class MainWindow(QMainWindow):
 
         self.tbl_tt.viewport().update()
 
-    def on_search(self) -> None:
-        if self.courses_df is None:
-            return
-
-        # B-07: Search signature cache
-        # Collect all search parameters first
-        full = (self.ed_full.text() or "").strip()
-        serial = self.ed_serial.text().strip()
-        code_q = (self.ed_course_code.text() or "").strip()
-        cname = self.ed_cname.text().strip()
-        teacher = self.ed_teacher.text().strip()
-        dept_text = self.cb_dept.currentText().strip()
-
-        special_gened = self.ck_gened.isChecked()
-        special_sport = self.ck_sport.isChecked()
-        special_teaching = self.ck_teaching.isChecked()
-        
-        current_sig = (
-            full, serial, code_q, cname, teacher, dept_text,
-            special_gened, special_sport, special_teaching,
-            self.ck_not_full.isChecked(), self.ck_exclude_selected.isChecked(),
-            self.ck_show_tba.isChecked(), self.ck_exclude_conflict.isChecked(),
-            self.cb_match_mode.currentIndex(), self.cb_gened_core.currentText(),
-            self._sel_lo, self._sel_hi,
-            hash(tuple(self._get_included_sorted())) if self.ck_exclude_conflict.isChecked() or self.ck_exclude_selected.isChecked() else 0
+    def _build_search_query(self) -> SearchQuery:
+        special = ""
+        if self.ck_gened.isChecked():
+            special = SPECIAL_GENED
+        elif self.ck_sport.isChecked():
+            special = SPECIAL_SPORT
+        elif self.ck_teaching.isChecked():
+            special = SPECIAL_TEACHING
+
+        inc_ids: Tuple[int, ...] = ()
+        if self.ck_exclude_selected.isChecked() or self.ck_exclude_conflict.isChecked():
+            inc_ids = tuple(self._get_included_sorted().tolist())
+
+        return SearchQuery(
+            full=(self.ed_full.text() or "").strip(),
+            serial=self.ed_serial.text().strip(),
+            code=(self.ed_course_code.text() or "").strip(),
+            cname=self.ed_cname.text().strip(),
+            teacher=self.ed_teacher.text().strip(),
+            dept=self.cb_dept.currentText().strip(),
+            special=special,
+            gened_core=self.cb_gened_core.currentText().strip(),
+            not_full=self.ck_not_full.isChecked(),
+            show_tba=self.ck_show_tba.isChecked(),
+            sel_lo=int(self._sel_lo),
+            sel_hi=int(self._sel_hi),
+            match_mode=self.cb_match_mode.currentIndex(),
+            exclude_ids=inc_ids if self.ck_exclude_selected.isChecked() else (),
+            conflict_ids=inc_ids if self.ck_exclude_conflict.isChecked() else (),
+            free_days=tuple(d for d, ck in enumerate(self.ck_free_days) if ck.isChecked()),
+            start_period=self.cb_start_period.currentIndex() - 1,
+            end_period=self.cb_end_period.currentIndex() - 1,
+            max_daily=self.cb_max_daily.currentIndex(),
         )
-        
-        if self._last_search_signature == current_sig:
-            return
-        self._last_search_signature = current_sig
-
-        df = self.courses_df
-        n = len(df)
-        mask = np.ones(n, dtype=bool)
-
-        if serial:
-            ids: List[int] = []
-            raw = serial.replace(",", " ").replace("，", " ")
-            for tok in raw.split():
-                try:
-                    ids.append(int(tok))
-                except Exception:
-                    continue
-            if ids:
-                if self._cid_arr is not None:
-                    # Optimization: Use searchsorted (O(k log N)) instead of isin (O(N))
-                    # Since k (number of serials typed) is small, this is much faster.
-                    ids_arr = np.array(ids, dtype=np.int64)
-                    indices = np.searchsorted(self._cid_arr, ids_arr)
-                    
-                    # Filter valid indices
-                    valid = (indices < len(self._cid_arr))
-                    if not valid.all():
-                        indices = indices[valid]
-                        ids_arr = ids_arr[valid]
-                    
-                    # Check exact matches
-                    matched = (self._cid_arr[indices] == ids_arr)
-                    final_indices = indices[matched]
-                    
-                    serial_mask = np.zeros(n, dtype=bool)
-                    serial_mask[final_indices] = True
-                    mask &= serial_mask
-                else:
-                    # Fallback if index not built (should not happen normally)
-                    cid_arr = df["_cid"].to_numpy(dtype=np.int64, copy=False)
-                    mask &= np.isin(cid_arr, np.array(ids, dtype=np.int64))
-
-        apply_dept_filter = not (special_gened or special_sport)
-        if apply_dept_filter:
-            if dept_text and dept_text != "(全部)" and "系所" in df.columns:
-                if dept_text in self._all_depts:
-                    if self._dept_arr is not None:
-                        mask &= (self._dept_arr == dept_text)
-                    else:
-                        mask &= (df["系所"] == dept_text).to_numpy()
-                else:
-                    dept_lc = dept_text.lower()
-                    if "_dept_lc" in df.columns:
-                        mask &= df["_dept_lc"].str.contains(dept_lc, regex=False, na=False).to_numpy()
-                    else:
-                        mask &= df["系所"].astype(str).str.contains(dept_text, na=False).to_numpy()
 
-        elif special_gened and "系所" in df.columns:
-            if self._dept_arr is not None:
-                mask &= (self._dept_arr == GENED_DEPT_NAME)
-            else:
-                mask &= (df["系所"] == GENED_DEPT_NAME).to_numpy()
-            core_choice = self.cb_gened_core.currentText().strip()
-            if core_choice and core_choice != "所有通識":
-                # B-04: Use bitmask
-                if self._gened_mask_arr is not None:
-                    from app_constants import GENED_CORE_OPTIONS
-                    if core_choice in GENED_CORE_OPTIONS:
-                        bit = 1 << GENED_CORE_OPTIONS.index(core_choice)
-                        mask &= (self._gened_mask_arr & bit) != 0
-
-        elif special_sport and "系所" in df.columns:
-            # B-05: Use precomputed boolean
-            if self._is_sport_arr is not None:
-                mask &= self._is_sport_arr
-            elif self._dept_arr is not None:
-                mask &= (self._dept_arr == SPORT_DEPT_NAME)
-            else:
-                mask &= (df["系所"] == SPORT_DEPT_NAME).to_numpy()
-
-        elif special_teaching:
-            # B-05: Use precomputed boolean
-            if self._is_teaching_arr is not None:
-                mask &= self._is_teaching_arr
-            elif "中文課程名稱" in df.columns:
-                mask &= df["中文課程名稱"].astype(str).str.contains(TEACHING_NAME_TOKEN, na=False).to_numpy()
-
-        if self.ck_not_full.isChecked():
-            # B-05: Use precomputed boolean
-            if self._not_full_arr is not None:
-                mask &= self._not_full_arr
-            elif "限修人數" in df.columns and "選修人數" in df.columns:
-                mask &= ((df["限修人數"].notna()) & (df["選修人數"].notna()) & (df["選修人數"] < df["限修人數"])).to_numpy()
-
-        if self.ck_exclude_selected.isChecked():
-            # Fix: Ensure included_ids is up-to-date (merging locked_ids) before checking size
-            inc_sorted = self._get_included_sorted()
-            if inc_sorted.size > 0:
-                if self._cid_arr is not None:
-                    # Optimization: Use searchsorted (O(k log N)) instead of isin (O(N))
-                    indices = np.searchsorted(self._cid_arr, inc_sorted)
-                    
-                    # Filter valid indices and check matches
-                    valid = (indices < len(self._cid_arr))
-                    if valid.all():
-                        matched = (self._cid_arr[indices] == inc_sorted)
-                        mask[indices[matched]] = False
-                    else:
-                        valid_indices = indices[valid]
-                        valid_inc = inc_sorted[valid]
-                        matched = (self._cid_arr[valid_indices] == valid_inc)
-                        mask[valid_indices[matched]] = False
-                else:
-                    if "_cid" in df.columns:
-                        cid_arr = df["_cid"].to_numpy(dtype=np.int64, copy=False)
-                    else:
-                        cid_arr = np.array([], dtype=np.int64)
-                    mask &= ~np.isin(cid_arr, inc_sorted)
+    def _get_search_engine(self) -> SearchEngine:
+        # One engine per catalog: a new catalog gets a new engine, a content-only reload rebinds the current one
+        if self._search_engine is None or self._search_engine_store is not self.course_store:
+            self._search_engine = SearchEngine(self.course_store)
+            self._search_engine_store = self.course_store
+        return self._search_engine
 
-        if not self.ck_show_tba.isChecked():
-            tba = self._tba_arr if self._tba_arr is not None else df["_tba"].to_numpy(dtype=bool, copy=False)
-            mask &= ~tba
+    def on_search(self) -> None:
+        if self.course_store is None:
+            return
 
-        if (self._sel_lo != 0) or (self._sel_hi != 0):
-            sel_lo = np.uint64(self._sel_lo)
-            sel_hi = np.uint64(self._sel_hi)
+        # B-07: Search signature cache (the query itself is the signature)
+        query = self._build_search_query()
+        if self._last_search_signature == query:
+            return
+        self._last_search_signature = query
 
-            mlo = self._mask_lo_arr if self._mask_lo_arr is not None else df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-            mhi = self._mask_hi_arr if self._mask_hi_arr is not None else df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
+        # Each query is a new generation; older workers stop between plan steps and their results are dropped
+        self._search_generation += 1
+        worker = SearchWorker(self._search_generation, self._get_search_engine(), query, self._current_search_generation)
+        worker.finished.connect(self._on_search_finished)
+        self._search_pool.start(worker)
 
-            mode = self.cb_match_mode.currentIndex()
-            if mode == 0:
-                cond = (np.bitwise_and(mlo, np.bitwise_not(sel_lo)) == 0) & (np.bitwise_and(mhi, np.bitwise_not(sel_hi)) == 0)
-            else:
-                cond = (np.bitwise_and(mlo, sel_lo) != 0) | (np.bitwise_and(mhi, sel_hi) != 0)
+    def _current_search_generation(self) -> int:
+        # Read from the search thread; a plain int attribute read is atomic
+        return self._search_generation
 
-            mask &= cond
+    def _on_search_finished(self, generation: int, engine: SearchEngine, result: Optional[SearchResult], msg: str) -> None:
+        if generation != self._search_generation or engine is not self._search_engine:
+            return
+        if result is None:
+            if msg:
+                # Let the next schedule_search() retry the same query
+                self._last_search_signature = None
+                self._set_catalog_label(f"搜尋失敗：{msg}")
+            return
 
-        if self.ck_exclude_conflict.isChecked():
-            inc_sorted = self._get_included_sorted()
-            if inc_sorted.size:
-                # B-01: Cache occupied masks
-                current_key = hash(tuple(inc_sorted))
-                if self._occ_cache_key == current_key:
-                    occ_lo, occ_hi = self._occ_lo, self._occ_hi
-                else:
-                    # F-01: Use optimized calculation
-                    if self._cid_arr is not None and self._mask_lo_arr is not None:
-                        occ_lo, occ_hi = occupied_masks_from_arrays(self._mask_lo_arr, self._mask_hi_arr, self._cid_arr, inc_sorted)
-                    else:
-                        occ_lo, occ_hi = occupied_masks_sorted(self.courses_df, inc_sorted)
-                    self._occ_lo = occ_lo
-                    self._occ_hi = occ_hi
-                    self._occ_cache_key = current_key
+        st = engine.store
+        if st is not self.course_store:
+            return
+        cols = self.display_columns if self.display_columns else list(st.display_columns)
 
-                mlo = self._mask_lo_arr if self._mask_lo_arr is not None else df["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-                mhi = self._mask_hi_arr if self._mask_hi_arr is not None else df["_mask_hi"].to_numpy(dtype="uint64", copy=False)
-                tba = self._tba_arr if self._tba_arr is not None else df["_tba"].to_numpy(dtype=bool, copy=False)
+        # B-03: Use row-index mapping instead of creating new DataFrame
+        visible_indices = result.rows
+        if self.model_results.set_data_view(st, visible_indices, cols):
+            self.model_results.notify_favorites_changed()
+        self._show_search_suggestions(result.suggestions)
 
-                cond_no_conflict = (np.bitwise_and(mlo, occ_lo) == 0) & (np.bitwise_and(mhi, occ_hi) == 0)
-                cond = cond_no_conflict | tba
-                mask &= cond
+    def _show_search_suggestions(self, suggestions: Tuple[QuerySuggestion, ...]) -> None:
+        self._search_suggestions = tuple(suggestions)
+        if not suggestions:
+            self.lbl_suggest.setVisible(False)
+            return
+        links = "、".join(
+            f'<a href="{i}">{html.escape(s.value)}</a>（{s.rows.size} 筆）' for i, s in enumerate(suggestions)
+        )
+        self.lbl_suggest.setText(f"找不到符合的課程。您是不是要找：{links}")
+        self.lbl_suggest.setVisible(True)
 
-        # Optimization: Apply heavy text filters only on the remaining subset if small
-        # This avoids scanning the entire dataframe for strings when other filters have already narrowed it down.
-        
-        text_filters_active = bool(full or code_q or cname or teacher)
-        
-        if text_filters_active:
-            # Check how many rows are left
-            current_count = np.count_nonzero(mask)
-            
-            # If mask is empty, no need to search
-            if current_count > 0:
-                # Threshold for subsetting (heuristic)
-                # If remaining rows are few, subsetting is faster than full scan
-                SUBSET_THRESHOLD = 4000 
-                
-                is_subset = False
-                indices = None
-                target_mask = None
-
-                if current_count < SUBSET_THRESHOLD:
-                    is_subset = True
-                    indices = np.flatnonzero(mask)
-                    # Create a temporary mask for the subset (all True initially)
-                    target_mask = np.ones(current_count, dtype=bool)
-                else:
-                    target_mask = mask
-
-                # Helper to apply mask
-                def apply_text_mask(m):
-                    nonlocal target_mask
-                    target_mask &= m
-
-                def get_search_series(col_name, fallback_col=None):
-                    if col_name in df.columns:
-                        series = df[col_name]
-                        if is_subset:
-                            return series.iloc[indices]
-                        return series
-                    elif fallback_col and fallback_col in df.columns:
-                        # Optimization: Subset first, then convert to string/lower
-                        source = df[fallback_col]
-                        if is_subset:
-                            source = source.iloc[indices]
-                        return source.astype(str).str.lower()
-                    else:
-                        return None
-
-                if full:
-                    tokens = [t.strip().lower() for t in full.split() if t.strip()]
-                    if tokens:
-                        s = get_search_series("_alltext")
-                        if s is not None:
-                            for tok in tokens:
-                                apply_text_mask(s.str.contains(tok, regex=False, na=False).to_numpy())
-
-                if code_q:
-                    tokens = [t.strip().lower() for t in code_q.split() if t.strip()]
-                    if tokens:
-                        s = get_search_series("_code_lc", "開課代碼")
-                        if s is not None:
-                            for tok in tokens:
-                                apply_text_mask(s.str.contains(tok, regex=False, na=False).to_numpy())
-
-                if cname:
-                    cname_lc = cname.lower()
-                    s = get_search_series("_cname_lc", "中文課程名稱")
-                    if s is not None:
-                        apply_text_mask(s.str.contains(cname_lc, regex=False, na=False).to_numpy())
-
-                if teacher:
-                    teacher_lc = teacher.lower()
-                    s = get_search_series("_teacher_lc", "教師")
-                    if s is not None:
-                        apply_text_mask(s.str.contains(teacher_lc, regex=False, na=False).to_numpy())
-
-                if is_subset:
-                    # Map subset mask back to original mask
-                    mask[indices] = target_mask
-
-        cols = self.display_columns if self.display_columns else [c for c in df.columns if not str(c).startswith("_")]
-        
-        # B-03: Use row-index mapping instead of creating new DataFrame
-        visible_indices = np.flatnonzero(mask).astype(np.int32)
-        self.model_results.set_data_view(df, visible_indices, cols)
-        self.model_results.notify_favorites_changed()
-        self.proxy_results.invalidate()
+    def _apply_search_suggestion(self, href: str) -> None:
+        try:
+            sug = self._search_suggestions[int(href)]
+        except (ValueError, IndexError):
+            return
+        if sug.box == "teacher":
+            self.ed_teacher.setText(sug.value)
+        elif sug.box == "cname":
+            self.ed_cname.setText(sug.value)
+        else:
+            tokens = (self.ed_full.text() or "").split()
+            self.ed_full.setText(" ".join(sug.value if t.lower() == sug.token else t for t in tokens))
+        self.schedule_search(0)
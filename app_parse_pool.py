@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app_constants import (
+    COURSE_PARSE_COLD_MIN_UNIQUE,
+    COURSE_PARSE_MAX_WORKERS,
+    COURSE_PARSE_PARALLEL_MIN_UNIQUE,
+    GENED_CORE_OPTIONS,
+)
+from app_utils import CompiledTimes, compile_time_texts, concat_compiled_times, parse_gened_categories_from_course_name
+
+_CORE_BITS = {name: (1 << i) for i, name in enumerate(GENED_CORE_OPTIONS)}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def gened_core_masks(names: Sequence[str]) -> np.ndarray:
+    """每個課名的通識核心分類 bitmask（uint32，位元順序同 GENED_CORE_OPTIONS）。"""
+    out = np.zeros(len(names), dtype=np.uint32)
+    for k, name in enumerate(names):
+        mask = 0
+        for c in parse_gened_categories_from_course_name(name):
+            mask |= _CORE_BITS.get(c, 0)
+        out[k] = mask
+    return out
+
+
+def _parse_shard(times: Sequence[str], names: Sequence[str]) -> Tuple[CompiledTimes, np.ndarray]:
+    # Runs in the worker processes; must stay importable without Qt
+    return compile_time_texts(times), gened_core_masks(names)
+
+
+def _default_workers() -> int:
+    return max(1, min(os.cpu_count() or 1, COURSE_PARSE_MAX_WORKERS))
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    # Kept alive across loads: reloads happen many times a day and spawning is the expensive part
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # spawn everywhere: forking a process that already runs Qt threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_parse_pool() -> None:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+def _shard_bounds(n: int, shards: int) -> List[Tuple[int, int]]:
+    edges = np.linspace(0, n, shards + 1).astype(int)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def parse_unique_values(
+    times: Sequence[str],
+    names: Sequence[str],
+    workers: Optional[int] = None,
+    min_unique: Optional[int] = None,
+) -> Tuple[CompiledTimes, np.ndarray]:
+    """
+    解析去重後的地點時間與課名：回傳 (compile_time_texts 結果, 通識核心 bitmask)，順序同輸入。
+    值夠多且有多核心時分段交給行程池，並依分段順序合併（結果與單行程相同）；否則或行程池失敗時單行程解析。
+    min_unique 未指定時依行程池是否已啟動取 COURSE_PARSE_PARALLEL_MIN_UNIQUE / COURSE_PARSE_COLD_MIN_UNIQUE。
+    """
+    times = list(times)
+    names = list(names)
+    workers = _default_workers() if workers is None else max(1, int(workers))
+    if min_unique is None:
+        # Spawning the pool costs far more than parsing a typical catalog serially
+        with _pool_lock:
+            warm = _pool is not None and _pool_workers == workers
+        min_unique = COURSE_PARSE_PARALLEL_MIN_UNIQUE if warm else COURSE_PARSE_COLD_MIN_UNIQUE
+    if workers < 2 or len(times) + len(names) < min_unique:
+        return _parse_shard(times, names)
+
+    shards = workers * 2
+    try:
+        pool = _get_pool(workers)
+        futures = [
+            pool.submit(_parse_shard, times[ta:tb], names[na:nb])
+            for (ta, tb), (na, nb) in zip(_shard_bounds(len(times), shards), _shard_bounds(len(names), shards))
+        ]
+        results = [f.result() for f in futures]
+    except (BrokenProcessPool, OSError, RuntimeError):
+        # Sandboxed / frozen environments may not allow child processes
+        shutdown_parse_pool()
+        return _parse_shard(times, names)
+
+    compiled = concat_compiled_times([r[0] for r in results])
+    masks = np.concatenate([r[1] for r in results]) if results else np.zeros(0, dtype=np.uint32)
+    return compiled, masks
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app_constants import DAY_INDEX, PERIOD_INDEX
+from app_utils import expand_period_range
+
+# 「全面搜尋」欄的欄位語法：
+#   王            全文包含（所有顯示欄位）
+#   teacher:王    只比對該欄（teacher / dept / code / name）
+#   day:五        星期五有課；period:A-D 有任一節落在 A~D
+#   credit>=2     數值比較（credit / seats；seats = 限修人數 - 選修人數）
+#   -王、-day:五  反向（不符合者）
+FIELD_ALIASES = {
+    "teacher": "teacher", "t": "teacher", "教師": "teacher", "老師": "teacher",
+    "dept": "dept", "系所": "dept", "系": "dept",
+    "code": "code", "代碼": "code",
+    "name": "name", "cname": "name", "課名": "name",
+    "day": "day", "星期": "day",
+    "period": "period", "節": "period", "節次": "period",
+}
+NUMERIC_ALIASES = {
+    "credit": "credit", "學分": "credit",
+    "seats": "seats", "餘額": "seats", "名額": "seats",
+}
+TEXT_FIELDS = ("teacher", "dept", "code", "name")
+
+_RE_NUMERIC = re.compile(r"^([^<>=!]+?)(>=|<=|!=|==|=|>|<)(-?\d+(?:\.\d+)?)$")
+
+
+@dataclass(frozen=True)
+class QueryTerm:
+    """
+    一個搜尋詞。field 為 "" 表示全文；數值欄位 op 為比較運算子；
+    day / period 的 indices 為解析後的 DAYS / PERIODS 索引。
+    """
+
+    field: str
+    value: str
+    op: str = ""
+    negate: bool = False
+    indices: Tuple[int, ...] = ()
+
+    @property
+    def label(self) -> str:
+        neg = "-" if self.negate else ""
+        if self.op:
+            return f"{neg}{self.field}{self.op}{self.value}"
+        return f"{neg}{self.field or 'full'}:{self.value}"
+
+
+def _parse_day(value: str) -> Optional[Tuple[int, ...]]:
+    if any(ch not in DAY_INDEX for ch in value):
+        return None
+    return tuple(sorted({DAY_INDEX[ch] for ch in value}))
+
+
+def _parse_period(value: str) -> Optional[Tuple[int, ...]]:
+    start, _, end = value.partition("-")
+    try:
+        periods = expand_period_range(start, end if end else None)
+    except ValueError:
+        return None
+    return tuple(PERIOD_INDEX[p] for p in periods)
+
+
+def parse_term(token: str) -> QueryTerm:
+    """單一（已轉小寫）的詞；無法辨識的欄位語法一律視為全文關鍵字。"""
+    negate = len(token) > 1 and token.startswith("-")
+    body = token[1:] if negate else token
+
+    m = _RE_NUMERIC.match(body)
+    if m and m.group(1) in NUMERIC_ALIASES:
+        op = "==" if m.group(2) == "=" else m.group(2)
+        return QueryTerm(NUMERIC_ALIASES[m.group(1)], m.group(3), op, negate)
+
+    name, sep, value = body.partition(":")
+    if sep and value and name in FIELD_ALIASES:
+        field = FIELD_ALIASES[name]
+        if field in TEXT_FIELDS:
+            return QueryTerm(field, value, "", negate)
+        indices = _parse_day(value) if field == "day" else _parse_period(value)
+        if indices:
+            return QueryTerm(field, value, "", negate, indices)
+
+    return QueryTerm("", body, "", negate)
+
+
+def parse_full_text(tokens: Tuple[str, ...]) -> Tuple[QueryTerm, ...]:
+    return tuple(parse_term(t) for t in tokens)
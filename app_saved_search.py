@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, fields, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app_course_store import CourseStore
+from app_search import SearchEngine, SearchQuery
+from app_user_data import list_all_users, load_saved_searches, save_saved_searches, user_root_dir
+
+# Load-modify-save of a user's saved_searches.json (GUI saves vs. the post-reload pass)
+_FILE_LOCK = threading.Lock()
+
+_QUERY_FIELDS = {f.name: f for f in fields(SearchQuery)}
+
+
+def query_to_dict(q: SearchQuery) -> Dict:
+    return {name: list(v) if isinstance(v, tuple) else v for name, v in ((f, getattr(q, f)) for f in _QUERY_FIELDS)}
+
+
+def query_from_dict(d: Dict) -> SearchQuery:
+    """未知欄位略過、缺少的用預設值（舊檔相容）。"""
+    kw = {}
+    for name, value in d.items():
+        if name not in _QUERY_FIELDS:
+            continue
+        kw[name] = tuple(int(x) for x in value) if isinstance(value, list) else value
+    return SearchQuery(**kw)
+
+
+def saved_query(q: SearchQuery) -> SearchQuery:
+    """存檔用的查詢：排除已選 / 排除衝堂依賴當下的選課，不隨搜尋保存。"""
+    return replace(q, exclude_ids=(), conflict_ids=())
+
+
+@dataclass(frozen=True)
+class SavedSearch:
+    name: str
+    query: SearchQuery
+    # 上一次評估時符合的開課序號（遞增）
+    last_cids: Tuple[int, ...] = ()
+    evaluated_at: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "query": query_to_dict(self.query),
+            "last_cids": list(self.last_cids),
+            "evaluated_at": self.evaluated_at,
+        }
+
+    @staticmethod
+    def from_dict(d: Dict) -> Optional["SavedSearch"]:
+        try:
+            return SavedSearch(
+                str(d["name"]),
+                query_from_dict(d.get("query") or {}),
+                tuple(int(x) for x in d.get("last_cids") or ()),
+                str(d.get("evaluated_at") or ""),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+
+@dataclass(frozen=True)
+class SavedSearchReport:
+    user: str
+    name: str
+    new_cids: Tuple[int, ...]  # 上次評估之後才符合的開課序號
+    total: int
+
+
+def _user_path(course_excel_path: str, user: str) -> str:
+    return os.path.join(user_root_dir(course_excel_path), user)
+
+
+def list_saved_searches(user_dir_path: str) -> List[SavedSearch]:
+    out = []
+    for d in load_saved_searches(user_dir_path):
+        s = SavedSearch.from_dict(d)
+        if s is not None:
+            out.append(s)
+    return out
+
+
+def put_saved_search(user_dir_path: str, search: SavedSearch) -> None:
+    """新增或取代（同名）一筆已存搜尋。"""
+    with _FILE_LOCK:
+        entries = [s for s in list_saved_searches(user_dir_path) if s.name != search.name]
+        entries.append(search)
+        save_saved_searches(user_dir_path, [s.to_dict() for s in entries])
+
+
+def delete_saved_search(user_dir_path: str, name: str) -> None:
+    with _FILE_LOCK:
+        entries = list_saved_searches(user_dir_path)
+        save_saved_searches(user_dir_path, [s.to_dict() for s in entries if s.name != name])
+
+
+def refresh_saved_searches(course_excel_path: str, store: CourseStore) -> List[SavedSearchReport]:
+    """
+    課程資料載入後呼叫：所有使用者的已存搜尋一起評估，更新各自的 last_cids，
+    回傳有新符合課程的搜尋。
+    """
+    per_user: Dict[str, List[SavedSearch]] = {}
+    for user in list_all_users(course_excel_path):
+        searches = list_saved_searches(_user_path(course_excel_path, user))
+        if searches:
+            per_user[user] = searches
+    flat = [(user, s) for user, searches in per_user.items() for s in searches]
+    if not flat:
+        return []
+
+    # One batch: predicates shared by several saved searches are evaluated once
+    results = SearchEngine(store).search_many([s.query for _, s in flat], rank=False)
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    reports: List[SavedSearchReport] = []
+    updated: Dict[str, Dict[str, SavedSearch]] = {}
+    for (user, s), result in zip(flat, results):
+        # One cid can sit on several rows (duplicated 開課序號 in the catalog)
+        cids = np.unique(store.cid[result.rows]).astype(np.int64)
+        new = np.setdiff1d(cids, np.unique(np.asarray(s.last_cids, dtype=np.int64)), assume_unique=True)
+        if new.size:
+            reports.append(SavedSearchReport(user, s.name, tuple(new.tolist()), int(cids.size)))
+        updated.setdefault(user, {})[s.name] = replace(s, last_cids=tuple(cids.tolist()), evaluated_at=now)
+
+    for user, by_name in updated.items():
+        path = _user_path(course_excel_path, user)
+        with _FILE_LOCK:
+            # Re-read under the lock: searches added or deleted meanwhile are kept as they are
+            current = list_saved_searches(path)
+            merged = [by_name[s.name] if s.name in by_name and by_name[s.name].query == s.query else s for s in current]
+            save_saved_searches(path, [s.to_dict() for s in merged])
+    return reports
@@ -0,0 +1,790 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app_bitmap import RowBitmap
+from app_constants import FUZZY_MAX_SUGGESTIONS, FUZZY_TIME_BUDGET_MS, GENED_CORE_OPTIONS, SEARCH_RESULT_CACHE_MAX_BYTES
+from app_course_store import CourseStore
+from app_query_syntax import TEXT_FIELDS, QueryTerm, parse_full_text
+from app_utils import free_on_days, max_periods_per_day, no_period_after, no_period_before
+
+DEPT_ALL = "(全部)"
+GENED_CORE_ALL = "所有通識"
+# 多選欄位的分隔字元
+CHOICE_SEP = "、"
+
+# 與「時間匹配」下拉選單的索引相同
+MATCH_CONTAINED = 0
+MATCH_OVERLAP = 1
+
+SPECIAL_GENED = "gened"
+SPECIAL_SPORT = "sport"
+SPECIAL_TEACHING = "teaching"
+
+# 計畫步驟的成本等級：先做預先算好的布林欄位，再做 bitmask，最後才做文字掃描
+COST_INDEX = 0
+COST_BOOL = 1
+COST_BITMASK = 2
+COST_DICT_TEXT = 3
+COST_ROW_TEXT = 4
+
+# 相關度等級（越大越前面）
+RANK_OTHER = 0
+RANK_NAME_SUBSTRING = 1
+RANK_NAME_PREFIX = 2
+RANK_EXACT = 3
+
+
+_NUMERIC_OPS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+class SearchCancelled(Exception):
+    """搜尋在步驟之間被取消（已有更新的查詢）。"""
+
+
+def split_tokens(text: str) -> Tuple[str, ...]:
+    return tuple(t.strip().lower() for t in (text or "").split() if t.strip())
+
+
+def split_choices(text: str, all_text: str = "") -> Tuple[str, ...]:
+    """多選欄位（系所、核心通識）：以「、」或逗號分隔的值，去除空白、重複與「全部」項目。"""
+    parts: List[str] = []
+    for part in (text or "").replace(",", CHOICE_SEP).replace("，", CHOICE_SEP).split(CHOICE_SEP):
+        part = part.strip()
+        if part and part != all_text and part not in parts:
+            parts.append(part)
+    return tuple(parts)
+
+
+def parse_serial_ids(text: str) -> Tuple[int, ...]:
+    """開課序號欄：以空白或逗號分隔的整數，無法解析者略過。"""
+    ids: List[int] = []
+    for tok in (text or "").replace(",", " ").replace("，", " ").split():
+        try:
+            ids.append(int(tok))
+        except Exception:
+            continue
+    return tuple(ids)
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """
+    宣告式查詢條件（不含任何 Qt 物件）；可雜湊，直接作為搜尋簽章使用。
+    ids 類欄位為遞增排序的 tuple。
+    """
+
+    full: str = ""
+    serial: str = ""
+    code: str = ""
+    cname: str = ""
+    teacher: str = ""
+    dept: str = ""
+    special: str = ""
+    gened_core: str = ""
+    not_full: bool = False
+    show_tba: bool = False
+    sel_lo: int = 0
+    sel_hi: int = 0
+    match_mode: int = MATCH_OVERLAP
+    exclude_ids: Tuple[int, ...] = ()
+    conflict_ids: Tuple[int, ...] = ()
+    # 每日節次條件：整天空堂的星期（DAYS 索引）、最早 / 最晚節次（PERIODS 索引，-1 = 不限）、單日最多節數（0 = 不限）
+    free_days: Tuple[int, ...] = ()
+    start_period: int = -1
+    end_period: int = -1
+    max_daily: int = 0
+
+
+def _tokens_narrow(old_text: str, new_text: str) -> bool:
+    # Every old token is contained in some new token => every new match also matched before
+    new_tokens = split_tokens(new_text)
+    return all(any(t in nt for nt in new_tokens) for t in split_tokens(old_text))
+
+
+def _full_terms_narrow(old_text: str, new_text: str) -> bool:
+    new_terms = parse_full_text(split_tokens(new_text))
+    for t in parse_full_text(split_tokens(old_text)):
+        if t in new_terms:
+            continue
+        # A positive text term narrows to any term on the same column that contains it
+        if not t.negate and (not t.field or t.field in TEXT_FIELDS):
+            if any(not n.negate and n.field == t.field and t.value in n.value for n in new_terms):
+                continue
+        return False
+    return True
+
+
+def _ids_subset(small: Tuple[int, ...], big: Tuple[int, ...]) -> bool:
+    return set(small) <= set(big)
+
+
+def _core_bits(text: str) -> Tuple[int, ...]:
+    """核心通識多選值 → GENED_CORE_OPTIONS 位元；含「所有通識」或沒有有效值時為空（不限）。"""
+    parts = split_choices(text)
+    if GENED_CORE_ALL in parts:
+        return ()
+    return tuple(sorted({GENED_CORE_OPTIONS.index(p) for p in parts if p in GENED_CORE_OPTIONS}))
+
+
+def query_narrows(old: SearchQuery, new: SearchQuery, is_exact_dept: Optional[Callable[[str], bool]] = None) -> bool:
+    """
+    new 的結果是否必為 old 結果的子集（例如多打一個字、多勾一個條件、縮小時段）。
+    只做保守判斷：無法確定時回傳 False，改為完整搜尋。
+    is_exact_dept(d) 表示 d 是否為完整系所名稱（等值比對）；未提供時一律視為等值比對。
+    """
+    if new.special != old.special:
+        return False
+    if not (_full_terms_narrow(old.full, new.full) and _tokens_narrow(old.code, new.code)):
+        return False
+    if old.cname.strip().lower() not in new.cname.strip().lower():
+        return False
+    if old.teacher.strip().lower() not in new.teacher.strip().lower():
+        return False
+
+    # Multi-value dept is an OR: every new value must fall inside some old value. Substring mode
+    # narrows to anything containing the old text (exact matches included); an exact match only to itself
+    old_depts = split_choices(old.dept, DEPT_ALL)
+    new_depts = split_choices(new.dept, DEPT_ALL)
+    if old_depts and set(new_depts) != set(old_depts):
+        if not new_depts:
+            return False
+        for nd in new_depts:
+            if not any(
+                nd == od or (is_exact_dept is not None and not is_exact_dept(od) and od.lower() in nd.lower()) for od in old_depts
+            ):
+                return False
+
+    old_ids = parse_serial_ids(old.serial)
+    if old_ids and not (parse_serial_ids(new.serial) and _ids_subset(parse_serial_ids(new.serial), old_ids)):
+        return False
+
+    old_cores = _core_bits(old.gened_core)
+    if old.special == SPECIAL_GENED and old_cores:
+        new_cores = _core_bits(new.gened_core)
+        if not new_cores or not set(new_cores) <= set(old_cores):
+            return False
+
+    if old.not_full and not new.not_full:
+        return False
+    if new.show_tba and not old.show_tba:
+        return False
+
+    # A smaller selection narrows both match modes; the mode only matters while a selection exists
+    if old.sel_lo or old.sel_hi:
+        if not (new.sel_lo or new.sel_hi) or new.match_mode != old.match_mode:
+            return False
+        if (new.sel_lo & ~old.sel_lo) or (new.sel_hi & ~old.sel_hi):
+            return False
+
+    if not _ids_subset(old.free_days, new.free_days):
+        return False
+    if old.start_period >= 0 and new.start_period < old.start_period:
+        return False
+    if old.end_period >= 0 and not (0 <= new.end_period <= old.end_period):
+        return False
+    if old.max_daily > 0 and not (0 < new.max_daily <= old.max_daily):
+        return False
+
+    return _ids_subset(old.exclude_ids, new.exclude_ids) and _ids_subset(old.conflict_ids, new.conflict_ids)
+
+
+def query_sources(q: SearchQuery) -> FrozenSet[str]:
+    """
+    查詢結果（含相關度排序）所依賴的課程表來源名稱，與 CourseStore.reload_changes 使用相同名稱；
+    重新載入只異動其他來源時，這個查詢的快取結果仍然有效。
+    """
+    out: Set[str] = set()
+    if split_choices(q.dept, DEPT_ALL):
+        out.add("dept")
+    if q.special in (SPECIAL_GENED, SPECIAL_SPORT, SPECIAL_TEACHING):
+        out.add(q.special)
+    if q.not_full:
+        out.add("not_full")
+    if not q.show_tba:
+        out.add("tba")
+    if q.sel_lo or q.sel_hi or q.conflict_ids:
+        out.update(("slots", "tba"))
+    if q.free_days or q.start_period >= 0 or q.end_period >= 0 or q.max_daily > 0:
+        out.add("slots")
+    if split_tokens(q.code):
+        out.add("code")
+    if q.teacher.strip():
+        out.add("teacher")
+    if q.cname.strip():
+        out.add("cname")
+    for term in parse_full_text(split_tokens(q.full)):
+        if term.op:
+            out.add("credit" if term.field == "credit" else "seats_left")
+        elif term.field in ("day", "period"):
+            out.add("slots")
+        elif term.field:
+            out.add({"name": "cname"}.get(term.field, term.field))
+        else:
+            # A bare word scans every column and is ranked on course code / name
+            out.update(("alltext", "code", "cname"))
+    return frozenset(out)
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    name: str
+    cost: int
+    # 預估通過比例（0~1），同成本等級內越小越先做
+    selectivity: float
+    evaluate: Callable[[Optional[np.ndarray]], np.ndarray]
+    # 條件本身（含參數）；兩次查詢中 key 相同的步驟結果相同，精煉查詢時可略過
+    key: Tuple = ()
+    # 點陣索引步驟：回傳符合列的 RowBitmap；exclude 為 True 時表示「不在集合內」
+    bitmap: Optional[Callable[[], RowBitmap]] = None
+    exclude: bool = False
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    rows: np.ndarray  # int32；依相關度排序（ranked 為 False 時依課程序號遞增）
+    executed: Tuple[str, ...]
+    skipped: Tuple[str, ...]
+    # 只在上一次結果的列中篩選（新查詢是上一次查詢的收窄）
+    refined: bool = False
+    # 直接取自結果快取
+    cached: bool = False
+    ranked: bool = False
+    # 查無結果時的錯字建議（由 SearchEngine.suggest 填入）
+    suggestions: Tuple["QuerySuggestion", ...] = ()
+
+
+@dataclass(frozen=True)
+class QuerySuggestion:
+    """把查詢欄位 box（"teacher" / "cname" / "full"）中的 token 換成 value 的建議。"""
+
+    box: str
+    token: str
+    value: str
+    distance: int
+    rows: np.ndarray
+
+
+# Rough per-entry bookkeeping (key tuple, dict slot, array header) on top of the row bytes
+_CACHE_ENTRY_OVERHEAD = 256
+
+
+class ResultCache:
+    """查詢 -> 結果列（唯讀 int32）的 LRU 快取，以總位元組數為上限。"""
+
+    def __init__(self, max_bytes: int = SEARCH_RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self._entries: "OrderedDict[SearchQuery, np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, q: SearchQuery) -> Optional[np.ndarray]:
+        rows = self._entries.get(q)
+        if rows is not None:
+            self._entries.move_to_end(q)
+        return rows
+
+    def put(self, q: SearchQuery, rows: np.ndarray) -> None:
+        cost = rows.nbytes + _CACHE_ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        old = self._entries.pop(q, None)
+        if old is not None:
+            self.nbytes -= old.nbytes + _CACHE_ENTRY_OVERHEAD
+        self._entries[q] = rows
+        self.nbytes += cost
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes + _CACHE_ENTRY_OVERHEAD
+
+    def discard_if(self, pred: Callable[[SearchQuery], bool]) -> int:
+        drop = [q for q in self._entries if pred(q)]
+        for q in drop:
+            self.nbytes -= self._entries.pop(q).nbytes + _CACHE_ENTRY_OVERHEAD
+        return len(drop)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+
+class SearchEngine:
+    """
+    對單一 CourseStore 執行 SearchQuery，回傳符合的列索引。
+    步驟依成本與預估選擇性排序：布林 / bitmask 步驟在完整長度的遮罩上累積，
+    文字步驟只掃描剩下的列；結果已為空時其餘步驟直接略過。
+    """
+
+    def __init__(self, store: CourseStore):
+        self.store = store
+        # search() may run on a worker thread; one search at a time keeps cache / refinement state consistent
+        self._lock = threading.Lock()
+        self._occ_key: Optional[Tuple[int, ...]] = None
+        self._occ = (np.uint64(0), np.uint64(0))
+        # (上一次的查詢, 結果列, 已套用的步驟 key；快取命中時為 None，需要時才規劃)；下一次查詢若為其收窄，只需篩選這些列
+        self._last: Optional[Tuple[SearchQuery, np.ndarray, Optional[FrozenSet[Tuple]]]] = None
+        # A new catalog gets a new engine; a content-only reload keeps it through rebind()
+        self.cache = ResultCache()
+
+    def rebind(self, store: CourseStore, changed: FrozenSet[str]) -> int:
+        """
+        改用同一組列、只有內容異動的新課程表（見 CourseStore.reload_changes）。
+        只丟掉依賴異動來源的快取結果與漸進篩選基準，回傳丟掉的快取筆數。
+        """
+        with self._lock:
+            self.store = store
+            self._occ_key = None
+            if self._last is not None and query_sources(self._last[0]) & changed:
+                self._last = None
+            return self.cache.discard_if(lambda q: bool(query_sources(q) & changed))
+
+    # ====== 規劃 ======
+    def _bitmap_step(
+        self,
+        name: str,
+        cost: int,
+        make: Callable[[], RowBitmap],
+        key: Tuple = (),
+        exclude: bool = False,
+        count: Optional[int] = None,
+    ) -> PlanStep:
+        """
+        以 RowBitmap 表示的步驟；通過比例取自點陣筆數（count 指定時不必先建出點陣）。
+        """
+        st = self.store
+        built: List[RowBitmap] = []
+
+        def bitmap() -> RowBitmap:
+            if not built:
+                built.append(make())
+            return built[0]
+
+        sel = (len(bitmap()) if count is None else count) / max(1, st.n)
+
+        def evaluate(rows):
+            m = bitmap().to_mask(st.n) if rows is None else bitmap().contains_rows(rows)
+            return ~m if exclude else m
+
+        return PlanStep(name, cost, 1.0 - sel if exclude else sel, evaluate, key, bitmap, exclude)
+
+    def _occupied(self, ids: Tuple[int, ...]) -> Tuple[np.uint64, np.uint64]:
+        if self._occ_key != ids:
+            self._occ = self.store.occupied_masks(ids)
+            self._occ_key = ids
+        return self._occ
+
+    @staticmethod
+    def _take(col: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        return col if rows is None else col[rows]
+
+    def plan(self, q: SearchQuery) -> List[PlanStep]:
+        st = self.store
+        take = self._take
+        steps: List[PlanStep] = []
+
+        # Equality and flag filters are compressed row bitmaps, combined with AND / ANDNOT in _run
+        fb = st.filter_bitmaps
+        ids = parse_serial_ids(q.serial)
+        if ids:
+            steps.append(self._bitmap_step("serial", COST_INDEX, lambda: RowBitmap.from_rows(np.unique(st.rows_of(ids))), ("serial", ids)))
+
+        if q.exclude_ids:
+            ex = q.exclude_ids
+            steps.append(
+                self._bitmap_step("exclude_selected", COST_INDEX, lambda: RowBitmap.from_rows(np.unique(st.rows_of(ex))), ("exclude", ex), exclude=True)
+            )
+
+        # Several departments / core areas are one OR over their per-value bitmaps
+        depts = split_choices(q.dept, DEPT_ALL)
+        if q.special not in (SPECIAL_GENED, SPECIAL_SPORT) and depts:
+            exact = [st.dept_dict.code_of(d) for d in depts]
+            if all(c >= 0 for c in exact):
+                name, codes = "dept", np.unique(exact)
+            else:
+                # Substring on the department name: every matching department joins the OR
+                name = "dept_contains"
+                codes = np.unique(np.concatenate([[c] if c >= 0 else st.dept_dict.codes_containing(d.lower()) for d, c in zip(depts, exact)]))
+            codes = codes.astype(np.int64)
+            count = int(st.dept_dict.counts()[codes].sum())
+            steps.append(
+                self._bitmap_step(name, COST_BOOL, lambda: RowBitmap.union_all([fb.dept[c] for c in codes]), ("dept", tuple(sorted(depts))), count=count)
+            )
+
+        if q.special == SPECIAL_GENED:
+            steps.append(self._bitmap_step("gened", COST_BOOL, lambda: fb.flags["gened"]))
+            bits = _core_bits(q.gened_core)
+            if bits:
+                steps.append(self._bitmap_step("gened_core", COST_BOOL, lambda: RowBitmap.union_all([fb.gened_core[b] for b in bits]), ("gened_core", bits)))
+        elif q.special == SPECIAL_SPORT:
+            steps.append(self._bitmap_step("sport", COST_BOOL, lambda: fb.flags["sport"]))
+        elif q.special == SPECIAL_TEACHING:
+            steps.append(self._bitmap_step("teaching", COST_BOOL, lambda: fb.flags["teaching"]))
+
+        if q.not_full:
+            steps.append(self._bitmap_step("not_full", COST_BOOL, lambda: fb.flags["not_full"]))
+
+        if not q.show_tba:
+            steps.append(self._bitmap_step("hide_tba", COST_BOOL, lambda: fb.flags["tba"], exclude=True))
+
+        # Time filters go through the per-slot bitmap index: a few ORs of packed row-bitsets per selection
+        if q.sel_lo or q.sel_hi:
+            if q.match_mode == MATCH_CONTAINED:
+                def _time(rows):
+                    return take(st.slot_index.contained(q.sel_lo, q.sel_hi), rows)
+            else:
+                def _time(rows):
+                    return take(st.slot_index.overlaps(q.sel_lo, q.sel_hi), rows)
+            steps.append(PlanStep("time", COST_BITMASK, 0.5, _time, ("time", q.sel_lo, q.sel_hi, q.match_mode)))
+
+        if q.conflict_ids:
+            occ_lo, occ_hi = self._occupied(q.conflict_ids)
+            steps.append(
+                PlanStep("no_conflict", COST_BITMASK, 0.7, lambda rows: take(st.slot_index.free_of(int(occ_lo), int(occ_hi)), rows), ("no_conflict", q.conflict_ids))
+            )
+
+        # Calendar-shaped filters on the (n, 7) per-day period masks
+        if q.free_days:
+            steps.append(
+                PlanStep("free_days", COST_BITMASK, 0.6, lambda rows: free_on_days(take(st.day_periods, rows), q.free_days), ("free_days", q.free_days))
+            )
+        if q.start_period >= 0:
+            steps.append(
+                PlanStep("start_period", COST_BITMASK, 0.6, lambda rows: no_period_before(take(st.day_periods, rows), q.start_period), ("start_period", q.start_period))
+            )
+        if q.end_period >= 0:
+            steps.append(
+                PlanStep("end_period", COST_BITMASK, 0.6, lambda rows: no_period_after(take(st.day_periods, rows), q.end_period), ("end_period", q.end_period))
+            )
+        if q.max_daily > 0:
+            steps.append(
+                PlanStep("max_daily", COST_BITMASK, 0.8, lambda rows: max_periods_per_day(take(st.day_periods, rows)) <= q.max_daily, ("max_daily", q.max_daily))
+            )
+
+        # Text: dictionary-encoded columns scan their (short) string tables; longer tokens first
+        for tok in split_tokens(q.code):
+            steps.append(PlanStep(f"code:{tok}", COST_DICT_TEXT, 1.0 / (1 + len(tok)), lambda rows, t=tok: st.code_dict.contains(t, rows)))
+        teacher = q.teacher.strip().lower()
+        if teacher:
+            steps.append(PlanStep("teacher", COST_DICT_TEXT, 1.0 / (1 + len(teacher)), lambda rows: st.teacher_dict.contains(teacher, rows), ("teacher", teacher)))
+        # Per-row text goes through the bigram index: posting-list intersection + verification of survivors
+        cname = q.cname.strip().lower()
+        if cname:
+            steps.append(
+                PlanStep("cname", COST_ROW_TEXT, 1.0 / (1 + len(cname)), lambda rows: st.text_index("cname_lc").contains(cname, rows), ("cname", cname))
+            )
+        # 全面搜尋：欄位語法的詞各自比對自己的欄位 / 索引，只有一般關鍵字才掃全文
+        for term in parse_full_text(split_tokens(q.full)):
+            steps.append(self._term_step(term))
+
+        steps.sort(key=lambda s: (s.cost, s.selectivity))
+        return steps
+
+    def _term_step(self, term: QueryTerm) -> PlanStep:
+        st = self.store
+        take = self._take
+        v = term.value
+        if term.op:
+            col = st.credit if term.field == "credit" else st.seats_left
+            cmp, num = _NUMERIC_OPS[term.op], float(v)
+            cost, sel = COST_BOOL, 0.5
+
+            def match(rows):
+                return cmp(take(col, rows), num)
+        elif term.field == "day":
+            days = list(term.indices)
+            cost, sel = COST_BITMASK, 0.3
+
+            def match(rows):
+                return take(st.day_periods, rows)[:, days].any(axis=1)
+        elif term.field == "period":
+            bits = np.uint16(sum(1 << p for p in term.indices))
+            cost, sel = COST_BITMASK, 0.3
+
+            def match(rows):
+                return (take(st.day_periods, rows) & bits).any(axis=1)
+        elif term.field in ("teacher", "dept", "code"):
+            col = {"teacher": st.teacher_dict, "dept": st.dept_dict, "code": st.code_dict}[term.field]
+            cost, sel = COST_DICT_TEXT, 1.0 / (1 + len(v))
+
+            def match(rows):
+                return col.contains(v, rows)
+        else:
+            index = "cname_lc" if term.field == "name" else "alltext"
+            cost, sel = COST_ROW_TEXT, 1.0 / (1 + len(v))
+
+            def match(rows):
+                return st.text_index(index).contains(v, rows)
+
+        if not term.negate:
+            return PlanStep(term.label, cost, sel, match)
+        return PlanStep(term.label, cost, 1.0 - sel, lambda rows: ~match(rows))
+
+    # ====== 錯字建議 ======
+    def suggest(self, q: SearchQuery, budget_ms: float = FUZZY_TIME_BUDGET_MS) -> Tuple[QuerySuggestion, ...]:
+        """
+        對教師 / 課名欄與全面搜尋的一般關鍵字做容錯比對，回傳依距離排序的建議（最多 FUZZY_MAX_SUGGESTIONS 筆）。
+        所有來源共用同一個時間預算；完全相符的值不列入（那是其他條件造成的無結果）。
+        """
+        sources: List[Tuple[str, str, str, str]] = []  # (box, token, matcher field, prefix)
+        if len(q.teacher.strip()) >= 2:
+            sources.append(("teacher", q.teacher.strip().lower(), "teacher", ""))
+        if len(q.cname.strip()) >= 2:
+            sources.append(("cname", q.cname.strip().lower(), "cname", ""))
+        for raw, term in zip(split_tokens(q.full), parse_full_text(split_tokens(q.full))):
+            if term.negate or term.op or len(term.value) < 2:
+                continue
+            if term.field in ("", "teacher"):
+                sources.append(("full", raw, "teacher", raw[: len(raw) - len(term.value)]))
+            if term.field in ("", "name"):
+                sources.append(("full", raw, "cname", raw[: len(raw) - len(term.value)]))
+
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        found: List[QuerySuggestion] = []
+        seen = set()
+        for box, token, field, prefix in sources:
+            left_ms = (deadline - time.perf_counter()) * 1000.0
+            if left_ms <= 0:
+                break
+            value_token = token[len(prefix):]
+            for m in self.store.fuzzy_matcher(field).suggest(value_token, budget_ms=left_ms):
+                # A full-text token cannot contain spaces; skip values that would split into several terms
+                if m.distance == 0 or (box == "full" and any(ch.isspace() for ch in m.value)):
+                    continue
+                value = prefix + m.value
+                if (box, token, value) in seen:
+                    continue
+                seen.add((box, token, value))
+                found.append(QuerySuggestion(box, token, value, m.distance, m.rows))
+        found.sort(key=lambda s: s.distance)
+        return tuple(found[:FUZZY_MAX_SUGGESTIONS])
+
+    # ====== 執行 ======
+    def search(self, q: SearchQuery, cancelled: Optional[Callable[[], bool]] = None) -> SearchResult:
+        """
+        執行查詢。cancelled 在每個步驟之間被呼叫，回傳 True 時丟出 SearchCancelled
+        （被取消的搜尋不會寫入快取，也不會成為下一次漸進篩選的基準）。
+        """
+        with self._lock:
+            terms = self._rank_terms(q)
+            rows = self.cache.get(q)
+            if rows is not None:
+                # No planning on a hit (step keys are planned only if the next query refines this one);
+                # refinement needs the rows in catalog order, cached rows are in ranked order
+                self._last = (q, np.sort(rows) if terms else rows, None)
+                return SearchResult(rows=rows, executed=(), skipped=(), cached=True, ranked=bool(terms))
+
+            steps = self.plan(q)
+            keys = frozenset(s.key or (s.name,) for s in steps)
+            prev = self._last
+            if prev is not None and query_narrows(prev[0], q, lambda d: self.store.dept_dict.code_of(d) >= 0):
+                prev_keys = prev[2] if prev[2] is not None else frozenset(s.key or (s.name,) for s in self.plan(prev[0]))
+                result = self._refine(steps, prev[1], prev_keys, cancelled)
+            else:
+                result = self._run(steps, cancelled)
+            self._check(cancelled)
+            sorted_rows = result.rows
+            if terms and sorted_rows.size > 1:
+                result = replace(result, rows=sorted_rows[self._rank_order(sorted_rows, *terms)], ranked=True)
+            # Cached arrays are handed out again later, so nobody may modify them
+            sorted_rows.setflags(write=False)
+            result.rows.setflags(write=False)
+            self.cache.put(q, result.rows)
+            self._last = (q, sorted_rows, keys)
+            return result
+
+    def search_many(
+        self, queries: Sequence[SearchQuery], cancelled: Optional[Callable[[], bool]] = None, rank: bool = True
+    ) -> List[SearchResult]:
+        """
+        一次執行多個查詢，結果與逐一呼叫 search 相同。相同的條件（PlanStep key 相同，例如同一個關鍵字 × 欄位、
+        同一個系所、同一組時段）在整批中只計算一次：點陣條件共用同一個 RowBitmap，
+        其餘出現在兩個以上查詢的條件算一次整欄結果後各自取用。
+        不讀寫結果快取，也不改變漸進篩選的基準；rank 為 False 時結果一律依課程序號順序（省去相關度計算）。
+        """
+        with self._lock:
+            plans = [self.plan(q) for q in queries]
+            uses: Dict[Tuple, int] = {}
+            canonical: Dict[Tuple, PlanStep] = {}
+            for steps in plans:
+                for i, step in enumerate(steps):
+                    key = step.key or (step.name,)
+                    uses[key] = uses.get(key, 0) + 1
+                    # Identical predicates share one step object, so a bitmap is built only once
+                    steps[i] = canonical.setdefault(key, step)
+            shared = frozenset(key for key, n in uses.items() if n > 1)
+            memo: Dict[Tuple, np.ndarray] = {}
+
+            results: List[SearchResult] = []
+            for q, steps in zip(queries, plans):
+                result = self._run(steps, cancelled, shared, memo)
+                terms = self._rank_terms(q) if rank else None
+                if terms and result.rows.size > 1:
+                    result = replace(result, rows=result.rows[self._rank_order(result.rows, *terms)], ranked=True)
+                results.append(result)
+            return results
+
+    # ====== 相關度排序 ======
+    @staticmethod
+    def _rank_terms(q: SearchQuery):
+        """排序用的關鍵字：(開課序號, 開課代碼候選, 課名候選)；都沒有時回傳 None（維持課程序號順序）。"""
+        serial = set(parse_serial_ids(q.serial))
+        codes = set(split_tokens(q.code))
+        names = set()
+        if q.cname.strip():
+            names.add(q.cname.strip().lower())
+        for term in parse_full_text(split_tokens(q.full)):
+            if term.negate or term.op:
+                continue
+            if not term.field:
+                # A bare word may be a serial number, a course code or part of a name
+                if term.value.isdigit():
+                    serial.add(int(term.value))
+                codes.add(term.value)
+                names.add(term.value)
+            elif term.field == "code":
+                codes.add(term.value)
+            elif term.field == "name":
+                names.add(term.value)
+        if not (serial or codes or names):
+            return None
+        return tuple(sorted(serial)), tuple(sorted(codes)), tuple(sorted(names))
+
+    def _rank_order(self, rows: np.ndarray, serial, codes, names) -> np.ndarray:
+        """
+        rows（遞增）的相關度排序：開課序號 / 開課代碼完全相符 > 課名開頭相符 > 課名包含 > 其他（只在全文命中）；
+        同分維持課程序號順序。回傳 rows 的排列索引。
+        """
+        st = self.store
+        score = np.zeros(rows.size, dtype=np.int8)
+        for tok in names:
+            sub = st.text_index("cname_lc").lookup(tok, rows)
+            if sub.size == 0:
+                continue
+            prefix = np.fromiter((st.cname_lc[r].startswith(tok) for r in sub.tolist()), dtype=bool, count=sub.size)
+            pos = np.searchsorted(rows, sub)
+            score[pos] = np.maximum(score[pos], np.where(prefix, RANK_NAME_PREFIX, RANK_NAME_SUBSTRING).astype(np.int8))
+        exact = np.zeros(rows.size, dtype=bool)
+        if serial:
+            exact |= np.isin(st.cid[rows], np.asarray(serial, dtype=np.int64))
+        if codes:
+            code_ids = np.flatnonzero(np.isin(st.code_dict.lc, np.asarray(codes, dtype=object)))
+            if code_ids.size:
+                exact |= np.isin(st.code_dict.codes[rows], code_ids)
+        score[exact] = RANK_EXACT
+        return np.argsort(-score, kind="stable")
+
+    @staticmethod
+    def _check(cancelled: Optional[Callable[[], bool]]) -> None:
+        if cancelled is not None and cancelled():
+            raise SearchCancelled()
+
+    def _refine(self, steps: List[PlanStep], base_rows: np.ndarray, done_keys, cancelled=None) -> SearchResult:
+        # Every row of the previous result already passed the unchanged steps
+        todo = [s for s in steps if (s.key or (s.name,)) not in done_keys]
+        rows = base_rows
+        executed: List[str] = []
+        k = 0
+        while k < len(todo) and rows.size:
+            self._check(cancelled)
+            rows = rows[todo[k].evaluate(rows)]
+            executed.append(todo[k].name)
+            k += 1
+        return SearchResult(
+            rows=rows.astype(np.int32, copy=False),
+            executed=tuple(executed),
+            skipped=tuple(s.name for s in todo[k:]),
+            refined=True,
+        )
+
+    def _run(
+        self,
+        steps: List[PlanStep],
+        cancelled=None,
+        shared: FrozenSet[Tuple] = frozenset(),
+        memo: Optional[Dict[Tuple, np.ndarray]] = None,
+    ) -> SearchResult:
+        """shared 中的步驟（批次內多個查詢共有）只算一次整欄結果，存在 memo 供其他查詢取用。"""
+        executed: List[str] = []
+        mask: Optional[np.ndarray] = None
+        rows: Optional[np.ndarray] = None
+        k = 0
+
+        def full(step: PlanStep) -> np.ndarray:
+            key = step.key or (step.name,)
+            if key not in shared:
+                return step.evaluate(None)
+            m = memo.get(key)
+            if m is None:
+                m = memo[key] = step.evaluate(None)
+            return m
+
+        def keep(step: PlanStep, rows: np.ndarray) -> np.ndarray:
+            return full(step)[rows] if (step.key or (step.name,)) in shared else step.evaluate(rows)
+
+        # Bitmap steps first: AND the positive sets, then subtract the excluded ones
+        cheap = [s for s in steps if s.cost < COST_DICT_TEXT]
+        ordered = [s for s in cheap if s.bitmap is not None and not s.exclude]
+        ordered += [s for s in cheap if s.bitmap is not None and s.exclude]
+        ordered += [s for s in cheap if s.bitmap is None]
+        steps = ordered + [s for s in steps if s.cost >= COST_DICT_TEXT]
+
+        acc: Optional[RowBitmap] = None
+        while k < len(steps) and steps[k].bitmap is not None:
+            self._check(cancelled)
+            step = steps[k]
+            if step.exclude:
+                acc = (acc if acc is not None else RowBitmap.full(self.store.n)).andnot(step.bitmap())
+            else:
+                acc = step.bitmap() if acc is None else (acc & step.bitmap())
+            executed.append(step.name)
+            k += 1
+            if not len(acc):
+                break
+        if acc is not None:
+            rows = acc.to_rows()
+
+        # Remaining cheap predicates: one full-length mask, or a gather over the bitmap survivors
+        while k < len(steps) and steps[k].cost < COST_DICT_TEXT and (rows is None or rows.size):
+            self._check(cancelled)
+            step = steps[k]
+            if rows is not None:
+                rows = rows[keep(step, rows)]
+            else:
+                m = full(step)
+                mask = m.copy() if mask is None else (mask & m)
+                if not mask.any():
+                    rows = np.empty(0, dtype=np.int32)
+            executed.append(step.name)
+            k += 1
+
+        if rows is None:
+            rows = np.flatnonzero(mask) if mask is not None else np.arange(self.store.n)
+
+        # Text predicates only look at the surviving rows
+        while k < len(steps) and rows.size:
+            self._check(cancelled)
+            step = steps[k]
+            rows = rows[keep(step, rows)]
+            executed.append(step.name)
+            k += 1
+
+        return SearchResult(
+            rows=rows.astype(np.int32, copy=False),
+            executed=tuple(executed),
+            skipped=tuple(s.name for s in steps[k:]),
+        )
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import List
+
+import numpy as np
+
+from app_constants import BITS_PER_DAY, DAYS
+
+SLOT_BITS = len(DAYS) * BITS_PER_DAY
+
+
+def _bit_indices(lo: int, hi: int) -> List[int]:
+    """(lo, hi) 兩個 64-bit 遮罩中設為 1 的時段位元位置（遞增；超出 SLOT_BITS 者略過）。"""
+    out: List[int] = []
+    for base, v in ((0, int(lo)), (64, int(hi))):
+        while v:
+            low = v & -v
+            out.append(base + low.bit_length() - 1)
+            v ^= low
+    return [b for b in out if b < SLOT_BITS]
+
+
+class SlotBitmapIndex:
+    """
+    時段點陣索引：每個「星期×節次」位元一個壓縮的列位元集（uint64 words，第 r 列 = 第 r 個位元），
+    另有每日彙總與 TBA 位元集。時段篩選只需對選取（或選取日中未選取）的少數時段做 OR / AND，
+    成本與時段數成正比，而非與課程筆數成正比。
+    """
+
+    def __init__(self, mask_lo: np.ndarray, mask_hi: np.ndarray, tba: np.ndarray):
+        self.n = int(len(mask_lo))
+        self.words = (self.n + 63) // 64
+
+        bits = np.zeros((SLOT_BITS, self.words), dtype=np.uint64)
+        for b in range(SLOT_BITS):
+            col, shift = (mask_lo, b) if b < 64 else (mask_hi, b - 64)
+            bits[b] = self._pack(((col >> np.uint64(shift)) & np.uint64(1)).astype(bool))
+        self._bits = bits
+        # Slots no course uses never need to be ORed in
+        self._used = np.flatnonzero(bits.any(axis=1))
+        self._day_bits = np.bitwise_or.reduce(bits.reshape(len(DAYS), BITS_PER_DAY, self.words), axis=1)
+        self._tba = self._pack(np.asarray(tba, dtype=bool))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._bits.nbytes + self._day_bits.nbytes + self._tba.nbytes)
+
+    # ====== 位元集 <-> 布林遮罩 ======
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        packed = np.packbits(mask, bitorder="little")
+        buf = np.zeros(self.words * 8, dtype=np.uint8)
+        buf[:packed.size] = packed
+        return buf.view(np.uint64)
+
+    def _unpack(self, bitset: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bitset.view(np.uint8), count=self.n, bitorder="little").view(bool)
+
+    def _union(self, slots) -> np.ndarray:
+        if len(slots) == 0:
+            return np.zeros(self.words, dtype=np.uint64)
+        return np.bitwise_or.reduce(self._bits[slots], axis=0)
+
+    # ====== 查詢（回傳長度 n 的布林遮罩）======
+    def overlaps(self, sel_lo: int, sel_hi: int) -> np.ndarray:
+        """與選取時段有任一節重疊的列。"""
+        return self._unpack(self._union(_bit_indices(sel_lo, sel_hi)))
+
+    def contained(self, sel_lo: int, sel_hi: int) -> np.ndarray:
+        """所有時段都落在選取範圍內的列（沒有時段的列也算）。"""
+        sel = set(_bit_indices(sel_lo, sel_hi))
+        # Reject rows using any slot outside the selection: whole days the selection never touches
+        # come from the per-day bitsets, only the touched days are checked slot by slot
+        touched = {b // BITS_PER_DAY for b in sel}
+        outside_days = [d for d in range(len(DAYS)) if d not in touched]
+        outside_slots = [int(b) for b in self._used if b // BITS_PER_DAY in touched and int(b) not in sel]
+        reject = self._union(outside_slots)
+        if outside_days:
+            reject = reject | np.bitwise_or.reduce(self._day_bits[outside_days], axis=0)
+        return self._unpack(~reject)
+
+    def free_of(self, occ_lo: int, occ_hi: int) -> np.ndarray:
+        """與 occ 時段完全不衝突的列；TBA 列一律視為不衝突。"""
+        return self._unpack(~self._union(_bit_indices(occ_lo, occ_hi)) | self._tba)
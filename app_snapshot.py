@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app_constants import COURSE_INGEST_CHUNKED_MIN_BYTES, COURSE_SNAPSHOT_DIRNAME
+from app_excel import COURSE_PARSER_VERSION, load_courses_auto
+from app_ingest import IngestProgress, load_courses_chunked
+
+# 快照格式版本（欄位編碼方式改變時遞增；與 COURSE_PARSER_VERSION 分開管理）
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_META_FILENAME = "meta.json"
+
+# set/list 欄位（_slots_set / _slots）以此分隔字元串接後存成字串欄
+_SEQ_SEP = "\x1f"
+
+_KIND_NUMERIC = "num"
+_KIND_STR = "str"
+_KIND_SET = "set"
+_KIND_LIST = "list"
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk_size)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def snapshot_root_path(excel_path: str) -> Path:
+    """快照與輸入檔放在同一層（例如 user_data/course_inputs/.snapshot）。"""
+    return Path(excel_path).resolve().parent / COURSE_SNAPSHOT_DIRNAME
+
+
+def _snapshot_prefix(excel_path: str) -> str:
+    return Path(excel_path).name + "."
+
+
+def snapshot_dir_path(excel_path: str, digest: str) -> Path:
+    key = f"{digest[:20]}.p{COURSE_PARSER_VERSION}.f{SNAPSHOT_FORMAT_VERSION}"
+    return snapshot_root_path(excel_path) / (_snapshot_prefix(excel_path) + key)
+
+
+def _column_kind(s: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(s.dtype) or pd.api.types.is_numeric_dtype(s.dtype):
+        return _KIND_NUMERIC
+    for v in s:
+        if isinstance(v, set):
+            return _KIND_SET
+        if isinstance(v, list):
+            return _KIND_LIST
+        if isinstance(v, str):
+            return _KIND_STR
+    return _KIND_STR
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Arrow-style layout: one UTF-8 blob plus code-point offsets (n + 1),
+    # so the whole column decodes with a single bytes.decode() call.
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    blob = np.frombuffer("".join(values).encode("utf-8"), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    text = blob.tobytes().decode("utf-8")
+    off = offsets.tolist()
+    return [text[off[i] : off[i + 1]] for i in range(len(off) - 1)]
+
+
+def save_snapshot(df: pd.DataFrame, sheet: str, snap_dir: Path, digest: str) -> None:
+    """將處理完成的課程表（含衍生欄位）寫成欄式二進位快照；以暫存資料夾 + rename 原子寫入。"""
+    snap_dir = Path(snap_dir)
+    snap_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp_", dir=str(snap_dir.parent)))
+    try:
+        columns_meta: List[Dict] = []
+        for i, col in enumerate(df.columns):
+            s = df[col]
+            kind = _column_kind(s)
+            entry: Dict = {"name": str(col), "kind": kind, "file": f"c{i:03d}"}
+            if kind == _KIND_NUMERIC:
+                arr = s.to_numpy()
+                entry["dtype"] = arr.dtype.str
+                np.save(tmp_dir / f"c{i:03d}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+            else:
+                na = s.isna().to_numpy(dtype=bool)
+                if kind == _KIND_STR:
+                    values = ["" if m else str(v) for v, m in zip(s.tolist(), na.tolist())]
+                else:
+                    values = [_SEQ_SEP.join(str(x) for x in v) if isinstance(v, (set, list)) else "" for v in s.tolist()]
+                blob, offsets = _encode_strings(values)
+                np.save(tmp_dir / f"c{i:03d}.blob.npy", blob, allow_pickle=False)
+                np.save(tmp_dir / f"c{i:03d}.off.npy", offsets, allow_pickle=False)
+                if kind == _KIND_STR and na.any():
+                    np.save(tmp_dir / f"c{i:03d}.na.npy", na, allow_pickle=False)
+                    entry["has_na"] = True
+            columns_meta.append(entry)
+
+        meta = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "parser_version": COURSE_PARSER_VERSION,
+            "content_sha1": digest,
+            "sheet": sheet,
+            "rows": int(len(df)),
+            "columns": columns_meta,
+        }
+        with open(tmp_dir / SNAPSHOT_META_FILENAME, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        if snap_dir.exists():
+            shutil.rmtree(snap_dir, ignore_errors=True)
+        os.replace(tmp_dir, snap_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_snapshot(snap_dir: Path, digest: str) -> Optional[Tuple[pd.DataFrame, str]]:
+    """讀取快照；數值欄以 memory-map 開啟。版本或內容雜湊不符時回傳 None。"""
+    snap_dir = Path(snap_dir)
+    meta_path = snap_dir / SNAPSHOT_META_FILENAME
+    if not meta_path.exists():
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if (
+        meta.get("format_version") != SNAPSHOT_FORMAT_VERSION
+        or meta.get("parser_version") != COURSE_PARSER_VERSION
+        or meta.get("content_sha1") != digest
+    ):
+        return None
+
+    n = int(meta["rows"])
+    data: Dict[str, object] = {}
+    for entry in meta["columns"]:
+        name = entry["name"]
+        base = snap_dir / entry["file"]
+        kind = entry["kind"]
+        if kind == _KIND_NUMERIC:
+            arr = np.load(str(base) + ".npy", mmap_mode="r", allow_pickle=False)
+            if arr.shape != (n,) or arr.dtype.str != entry["dtype"]:
+                return None
+            data[name] = arr
+            continue
+
+        blob = np.load(str(base) + ".blob.npy", mmap_mode="r", allow_pickle=False)
+        offsets = np.load(str(base) + ".off.npy", allow_pickle=False)
+        if offsets.shape != (n + 1,):
+            return None
+        values = _decode_strings(blob, offsets)
+        if kind == _KIND_STR:
+            col = np.array(values, dtype=object)
+            if entry.get("has_na"):
+                na = np.load(str(base) + ".na.npy", allow_pickle=False)
+                col[na] = np.nan
+            data[name] = col
+        elif kind == _KIND_SET:
+            data[name] = [set(v.split(_SEQ_SEP)) if v else set() for v in values]
+        else:
+            data[name] = [v.split(_SEQ_SEP) if v else [] for v in values]
+
+    df = pd.DataFrame(data, columns=[e["name"] for e in meta["columns"]], copy=False)
+    return df, str(meta.get("sheet", ""))
+
+
+def _prune_stale_snapshots(excel_path: str, keep: Path) -> None:
+    root = snapshot_root_path(excel_path)
+    if not root.is_dir():
+        return
+    prefix = _snapshot_prefix(excel_path)
+    for p in root.iterdir():
+        if p == keep or not p.is_dir():
+            continue
+        if p.name.startswith(prefix):
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def load_courses_cached(
+    excel_path: str,
+    progress: Optional[Callable[[IngestProgress], None]] = None,
+) -> Tuple[pd.DataFrame, str]:
+    """
+    以「檔案內容雜湊 + 解析器版本」為鍵的快照快取包裝 load_courses_auto。
+    命中時只需 memory-map 欄位陣列，不再經過 xlrd / openpyxl 與衍生欄位計算。
+    未命中且檔案較大時改用分塊載入（load_courses_chunked），progress 會收到記憶體估計。
+    """
+    if not os.path.exists(excel_path):
+        raise FileNotFoundError(f"找不到檔案：{excel_path}")
+
+    digest = file_content_hash(excel_path)
+    snap_dir = snapshot_dir_path(excel_path, digest)
+    try:
+        hit = load_snapshot(snap_dir, digest)
+    except Exception:
+        hit = None
+        shutil.rmtree(snap_dir, ignore_errors=True)
+    if hit is not None:
+        return hit
+
+    # load_courses_auto 開檔時可能就地修補 xlsx，因此載入後重新計算雜湊
+    if os.path.getsize(excel_path) >= COURSE_INGEST_CHUNKED_MIN_BYTES:
+        df, sheet = load_courses_chunked(excel_path, progress=progress)
+    else:
+        df, sheet = load_courses_auto(excel_path)
+
+    digest = file_content_hash(excel_path)
+    snap_dir = snapshot_dir_path(excel_path, digest)
+    try:
+        save_snapshot(df, sheet, snap_dir, digest)
+        _prune_stale_snapshots(excel_path, snap_dir)
+    except Exception:
+        # 快照只是加速用途；寫入失敗（唯讀目錄等）不影響載入結果
+        pass
+    return df, sheet
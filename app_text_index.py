@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Code points fit in 21 bits: a bigram key is (first << 21) | second, a single character is (ch << 21)
+_CP_BITS = 21
+_SEP = "\x00"
+# rows 不超過此數時直接逐列比對，不查 posting list
+_DIRECT_SCAN_ROWS = 64
+
+
+def _sorted_member_mask(hits: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """hits、rows 皆遞增；回傳 rows 中每一列是否出現在 hits。"""
+    if hits.size == 0 or rows.size == 0:
+        return np.zeros(rows.shape, dtype=bool)
+    pos = np.searchsorted(hits, rows)
+    return hits[np.minimum(pos, hits.size - 1)] == rows
+
+
+class BigramIndex:
+    """
+    字元 bigram 倒排索引（另含單字元）：posting list 為遞增的 int32 列索引，以 CSR 格式保存。
+    子字串查詢 = 取查詢字串所有 bigram 的 posting list 求交集，長度 >= 3 時再對剩下的少數列逐一驗證。
+    values 需為已正規化（例如小寫）的字串；查詢字串以相同方式正規化後傳入。
+    """
+
+    def __init__(self, values: Sequence[str]):
+        self.values = values
+        self.n = len(values)
+        texts = [v if isinstance(v, str) else "" for v in values]
+        joined = "".join(t + _SEP for t in texts)
+        cps = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        lens = np.fromiter((len(t) for t in texts), dtype=np.int64, count=self.n)
+        row_of_char = np.repeat(np.arange(self.n, dtype=np.int64), lens + 1)
+
+        is_char = cps != 0
+        uni_keys = cps[is_char] << _CP_BITS
+        uni_rows = row_of_char[is_char]
+        pair_ok = is_char[:-1] & is_char[1:]
+        bi_keys = ((cps[:-1] << _CP_BITS) | cps[1:])[pair_ok]
+        bi_rows = row_of_char[:-1][pair_ok]
+
+        # (key, row) packed into one int64 so a single sort dedups and orders both
+        stride = max(1, self.n)
+        packed = np.concatenate([uni_keys, bi_keys]) * stride + np.concatenate([uni_rows, bi_rows])
+        # sort + neighbour compare; np.unique's hash path is several times slower here
+        packed.sort()
+        if packed.size:
+            packed = packed[np.r_[True, packed[1:] != packed[:-1]]]
+        keys = packed // stride
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if keys.size else np.empty(0, dtype=np.int64)
+        self._keys = keys[starts]
+        self._offsets = np.r_[starts, keys.size].astype(np.int64)
+        self._rows = (packed % stride).astype(np.int32)
+
+    def with_rows(self, values: Sequence[str], rows: np.ndarray) -> "BigramIndex":
+        """
+        values 與原值只在 rows 這些列不同（列數相同）時的索引：移除這些列的舊 posting，
+        再把新值的 posting 依序插入，不必重新編碼 / 排序整欄。
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        stride = max(1, self.n)
+        sizes = np.diff(self._offsets)
+        packed = np.repeat(self._keys, sizes) * stride + self._rows
+        if rows.size:
+            packed = packed[~np.isin(self._rows, rows)]
+        # The changed rows as a small index of their own, mapped back to row numbers in values
+        part = BigramIndex([values[r] for r in rows.tolist()])
+        part_keys = np.repeat(part._keys, np.diff(part._offsets))
+        added = part_keys * stride + rows[part._rows]
+        added.sort()
+        packed = np.insert(packed, np.searchsorted(packed, added), added)
+
+        out = BigramIndex.__new__(BigramIndex)
+        out.values = values
+        out.n = self.n
+        keys = packed // stride
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if keys.size else np.empty(0, dtype=np.int64)
+        out._keys = keys[starts]
+        out._offsets = np.r_[starts, keys.size].astype(np.int64)
+        out._rows = (packed % stride).astype(np.int32)
+        return out
+
+    def __len__(self) -> int:
+        return int(self._keys.size)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._keys.nbytes + self._offsets.nbytes + self._rows.nbytes)
+
+    def _posting(self, key: int) -> np.ndarray:
+        i = int(np.searchsorted(self._keys, key))
+        if i >= self._keys.size or int(self._keys[i]) != key:
+            return self._rows[:0]
+        return self._rows[self._offsets[i]:self._offsets[i + 1]]
+
+    def lookup(self, token: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """包含 token 的列（遞增 int32）；rows（遞增）指定時只在這些列中找。"""
+        if not token:
+            return np.arange(self.n, dtype=np.int32) if rows is None else np.asarray(rows, dtype=np.int32)
+        if rows is not None and len(rows) <= _DIRECT_SCAN_ROWS:
+            # A handful of candidate rows (e.g. refining the previous result): checking them is cheaper
+            rows = np.asarray(rows, dtype=np.int32)
+            return rows[np.fromiter((token in self.values[r] for r in rows.tolist()), dtype=bool, count=rows.size)]
+
+        if len(token) == 1:
+            hits = self._posting(ord(token) << _CP_BITS)
+        else:
+            keys = {(ord(a) << _CP_BITS) | ord(b) for a, b in zip(token, token[1:])}
+            postings = sorted((self._posting(k) for k in keys), key=len)
+            hits = postings[0]
+            for p in postings[1:]:
+                if hits.size == 0:
+                    break
+                hits = np.intersect1d(hits, p, assume_unique=True)
+
+        if rows is not None and hits.size:
+            hits = hits[_sorted_member_mask(np.asarray(rows), hits)]
+        if len(token) > 2 and hits.size:
+            # Bigrams can all be present without being adjacent: verify the survivors
+            ok = np.fromiter((token in self.values[r] for r in hits.tolist()), dtype=bool, count=hits.size)
+            hits = hits[ok]
+        return hits
+
+    def contains(self, token: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """與 contains_mask 相同的布林結果（rows 指定時只回傳這些列；rows 需遞增）。"""
+        hits = self.lookup(token, rows)
+        if rows is None:
+            mask = np.zeros(self.n, dtype=bool)
+            mask[hits] = True
+            return mask
+        return _sorted_member_mask(hits, np.asarray(rows))
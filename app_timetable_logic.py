@@ -3,10 +3,10 @@ from __future__ import annotations
 from typing import Dict, List, Optional, Set, Tuple
 
 import numpy as np
-import pandas as pd
 from PySide6.QtGui import QColor
 
 from app_constants import DAY_LABEL, PERIODS, PERIOD_INDEX
+from app_course_store import CourseStore
 from app_utils import format_cid4, strip_bracket_text_for_timetable
 
 
@@ -17,53 +17,10 @@ def darken(color: QColor, factor: float) -> QColor:
     return QColor(r, g, b)
 
 
-def _subset_courses_by_ids(
-    courses_df: pd.DataFrame, included_ids_sorted: np.ndarray, cols: List[str]
-) -> pd.DataFrame:
-    if courses_df is None or courses_df.empty:
-        return pd.DataFrame(columns=cols)
-    if included_ids_sorted is None or included_ids_sorted.size == 0:
-        return courses_df.iloc[0:0][cols]
-
-    ids = included_ids_sorted.astype(np.int64, copy=False)
-    cid_arr = courses_df["_cid"].to_numpy(dtype=np.int64, copy=False)
-    
-    # D-03: Use searchsorted for O(k log n) lookup
-    # We assume courses_df is sorted by _cid (ensured in app_excel.py)
-    # Check if cid_arr is actually sorted (cheap check for first/last or just assume)
-    # Since we control app_excel, we assume it is sorted.
-    
-    indices = np.searchsorted(cid_arr, ids)
-    
-    # Filter out indices that are out of bounds or don't match (id not found)
-    valid_mask = (indices < len(cid_arr))
-    if not valid_mask.all():
-        indices = indices[valid_mask]
-        ids = ids[valid_mask]
-    
-    # Double check matches
-    if len(indices) > 0:
-        matched_mask = (cid_arr[indices] == ids)
-        indices = indices[matched_mask]
-    
-    if len(indices) == 0:
-        return courses_df.iloc[0:0][cols]
-        
-    return courses_df.iloc[indices][cols]
-
-
-def occupied_masks_sorted(courses_df: pd.DataFrame, included_ids_sorted: np.ndarray) -> Tuple[np.uint64, np.uint64]:
-    if included_ids_sorted is None or included_ids_sorted.size == 0:
-        return np.uint64(0), np.uint64(0)
-    sub = _subset_courses_by_ids(courses_df, included_ids_sorted, ["_mask_lo", "_mask_hi"])
-    if sub.empty:
+def occupied_masks_sorted(store: CourseStore, included_ids_sorted: np.ndarray) -> Tuple[np.uint64, np.uint64]:
+    if store is None or included_ids_sorted is None or included_ids_sorted.size == 0:
         return np.uint64(0), np.uint64(0)
-
-    arr_lo = sub["_mask_lo"].to_numpy(dtype="uint64", copy=False)
-    arr_hi = sub["_mask_hi"].to_numpy(dtype="uint64", copy=False)
-    occ_lo = np.bitwise_or.reduce(arr_lo) if arr_lo.size else np.uint64(0)
-    occ_hi = np.bitwise_or.reduce(arr_hi) if arr_hi.size else np.uint64(0)
-    return np.uint64(occ_lo), np.uint64(occ_hi)
+    return store.occupied_masks(included_ids_sorted)
 
 
 def occupied_masks_from_arrays(
@@ -99,45 +56,32 @@ def occupied_masks_from_arrays(
 
 
 def build_lane_assignment_sorted(
-    courses_df: pd.DataFrame,
+    store: CourseStore,
     included_ids_sorted: np.ndarray,
-    parsed_slots_map: Optional[Dict[int, List[Tuple[str, str]]]] = None,
 ) -> Tuple[Dict[int, int], int]:
-    if included_ids_sorted is None or included_ids_sorted.size == 0:
+    if store is None or included_ids_sorted is None or included_ids_sorted.size == 0:
         return {}, 1
-    sub = _subset_courses_by_ids(courses_df, included_ids_sorted, ["_cid", "_slots_set"])
-    if sub.empty:
+    rows = store.rows_of(included_ids_sorted)
+    if rows.size == 0:
         return {}, 1
 
-    used_by_slot: Dict[str, int] = {}
+    used_by_slot: Dict[Tuple[str, str], int] = {}
     lane_of: Dict[int, int] = {}
     max_lane = 1
 
-    # D-04: Avoid itertuples for performance
-    cids = sub["_cid"].to_numpy()
-    slots_col = sub["_slots_set"].to_numpy()
-    
-    # Prepare data for sorting: (len_slots desc, cid asc)
-    data = []
-    for cid, slots in zip(cids, slots_col):
-        l = len(slots) if isinstance(slots, set) else 0
-        data.append((l, cid, slots))
-    
+    # Sort by (len_slots desc, cid asc); slots come pre-split from the store
+    cids = store.cid[rows].tolist()
+    parsed_col = store.parsed_slots[rows]
+    data = [(len(slots), cid, slots) for cid, slots in zip(cids, parsed_col)]
     data.sort(key=lambda x: (-x[0], x[1]))
 
-    for _, cid, slots in data:
-        cid_i = int(cid)
-        slots_set = slots if isinstance(slots, set) else set()
-        if not slots_set:
+    for n_slots, cid_i, slots in data:
+        if not n_slots:
             lane_of[cid_i] = 1
             continue
 
         used = 0
-        # Use pre-parsed slots if available
-        current_parsed = parsed_slots_map.get(cid_i) if parsed_slots_map else None
-        iterator = [f"{d}-{p}" for d, p in current_parsed] if current_parsed is not None else slots_set
-
-        for s in iterator:
+        for s in slots:
             used |= used_by_slot.get(s, 0)
 
         bitlen = used.bit_length() + 2
@@ -150,18 +94,17 @@ def build_lane_assignment_sorted(
             max_lane = lane
 
         bit = 1 << (lane - 1)
-        for s in iterator:
+        for s in slots:
             used_by_slot[s] = used_by_slot.get(s, 0) | bit
 
     return lane_of, max_lane
 
 
 def build_timetable_matrix_per_day_lanes_sorted(
-    courses_df: pd.DataFrame,
+    store: CourseStore,
     included_ids_sorted: np.ndarray,
     locked_ids_set: Set[int],
     show_days: List[str],
-    parsed_slots_map: Optional[Dict[int, List[Tuple[str, str]]]] = None,
 ) -> Tuple[
     List[List[str]],
     List[str],
@@ -170,31 +113,20 @@ def build_timetable_matrix_per_day_lanes_sorted(
     List[List[Optional[int]]],
     List[List[bool]],
 ]:
-    lane_map, _ = build_lane_assignment_sorted(courses_df, included_ids_sorted, parsed_slots_map)
+    lane_map, _ = build_lane_assignment_sorted(store, included_ids_sorted)
     day_lanes: Dict[str, int] = {d: 1 for d in show_days}
 
-    subset_meta = _subset_courses_by_ids(
-        courses_df,
-        included_ids_sorted,
-        ["_cid", "中文課程名稱", "_slots_set", "_tt_label"],
-    )
+    if store is not None and included_ids_sorted is not None and included_ids_sorted.size:
+        rows = store.rows_of(included_ids_sorted)
+    else:
+        rows = np.empty((0,), dtype=np.int64)
 
-    # D-04: Pre-fetch columns to avoid DataFrame overhead in loops
-    meta_cids = subset_meta["_cid"].to_numpy()
-    meta_slots = subset_meta["_slots_set"].to_numpy()
+    meta_cids = store.cid[rows].tolist() if rows.size else []
+    meta_slots = store.parsed_slots[rows] if rows.size else []
 
-    for cid, slots in zip(meta_cids, meta_slots):
-        cid_i = int(cid)
+    for cid_i, slots in zip(meta_cids, meta_slots):
         lane = lane_map.get(cid_i, 1)
-        slots_set = slots if isinstance(slots, set) else set()
-        
-        # Use pre-parsed slots if available to avoid string split
-        current_parsed = parsed_slots_map.get(cid_i) if parsed_slots_map else None
-        
-        # Calculate max lanes per day
-        # If we have parsed slots, iterate them. Otherwise split strings.
-        iterator = current_parsed if current_parsed is not None else [s.split("-", 1) for s in slots_set if "-" in s]
-        for day, _per in iterator:
+        for day, _per in slots:
             if day in day_lanes and lane > day_lanes[day]:
                 day_lanes[day] = lane
 
@@ -215,38 +147,20 @@ def build_timetable_matrix_per_day_lanes_sorted(
 
     locked_ids_set = set(int(x) for x in locked_ids_set)
 
-    # D-02: Use precomputed _tt_label if available
-    has_tt_label = "_tt_label" in subset_meta.columns
-    meta_labels = subset_meta["_tt_label"].to_numpy() if has_tt_label else None
-    meta_cnames = subset_meta["中文課程名稱"].to_numpy() if not has_tt_label else None
-
-    if has_tt_label:
-        iterator = zip(meta_cids, meta_slots, meta_labels)
-    else:
-        iterator = zip(meta_cids, meta_slots, meta_cnames)
+    # D-02: Use precomputed _tt_label; fall back to building it from the course name
+    meta_labels = store.tt_label[rows] if rows.size else []
+    meta_cnames = store.cname[rows] if rows.size else []
 
-    for item in iterator:
-        cid = item[0]
-        slots = item[1]
-        cid_i = int(cid)
-        
-        if has_tt_label:
-            label = str(item[2])
-        else:
-            # Fallback
-            cname = item[2]
+    for cid_i, slots, label, cname in zip(meta_cids, meta_slots, meta_labels, meta_cnames):
+        label = str(label or "")
+        if not label:
             cname_show = strip_bracket_text_for_timetable(str(cname).strip())
             label = f"{cname_show}\n{format_cid4(cid_i)}".strip()
 
-        slots_set = slots if isinstance(slots, set) else set()
         lane = lane_map.get(cid_i, 1)
         is_locked = (cid_i in locked_ids_set)
 
-        # Use pre-parsed slots if available
-        current_parsed = parsed_slots_map.get(cid_i) if parsed_slots_map else None
-        iterator = current_parsed if current_parsed is not None else [s.split("-", 1) for s in slots_set if "-" in s]
-
-        for day, per in iterator:
+        for day, per in slots:
             if day not in day_offset or per not in PERIOD_INDEX:
                 continue
 
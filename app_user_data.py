@@ -7,9 +7,9 @@ from typing import Dict, List, Optional, Set, Tuple
 
 import numpy as np
 from openpyxl import Workbook, load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 
 from app_constants import user_data_store_path
+from app_course_store import CourseStore
 from app_utils import (
     format_cid4,
     parse_cid_to_int,
@@ -159,6 +159,44 @@ def save_best_schedule_cache(
         json.dump(payload, f, ensure_ascii=False, indent=2)
 
 
+SAVED_SEARCHES_FILENAME = "saved_searches.json"
+
+
+def saved_searches_path(user_dir_path: str) -> str:
+    if not user_dir_path:
+        return ""
+    return os.path.join(user_dir_path, SAVED_SEARCHES_FILENAME)
+
+
+def load_saved_searches(user_dir_path: str) -> List[Dict]:
+    """使用者的已存搜尋（每筆含 name / query / last_cids / evaluated_at）；檔案不存在或損毀時為空。"""
+    path = saved_searches_path(user_dir_path)
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except Exception:
+        return []
+    entries = payload.get("searches") if isinstance(payload, dict) else None
+    return [e for e in entries if isinstance(e, dict)] if isinstance(entries, list) else []
+
+
+def save_saved_searches(user_dir_path: str, entries: List[Dict]) -> None:
+    path = saved_searches_path(user_dir_path)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = {
+        "searches": list(entries),
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
 def load_user_file(xlsx_path: str) -> Tuple[Set[int], Set[int], Dict[int, int], Set[int]]:
     """
     回傳：favorites, included, seq_map, locked_set
@@ -232,7 +270,7 @@ def save_user_file(
     included_ids_sorted: np.ndarray,
     locked_ids_sorted: np.ndarray,
     fav_seq: Dict[int, int],
-    courses_df,
+    store: CourseStore,
 ) -> None:
     os.makedirs(os.path.dirname(os.path.abspath(xlsx_path)), exist_ok=True)
 
@@ -262,24 +300,20 @@ def save_user_file(
     ws_fav.append(["最後更新", time.strftime("%Y-%m-%d %H:%M:%S")])
 
     ws_tt = wb.create_sheet("課表匯出")
-    out_cols = [c for c in courses_df.columns if not str(c).startswith("_")] + ["_tba", "_slots"]
+    out_cols = list(store.display_columns)
 
+    rows: List[int] = []
     if included_ids_sorted.size:
-        # I-01: Use isin directly with numpy array
-        subset = courses_df[courses_df["_cid"].isin(included_ids_sorted)].copy()
-    else:
-        subset = courses_df.iloc[0:0].copy()
-
-    if not subset.empty:
-        subset["_slots"] = subset["_slots"].apply(lambda x: json.dumps(x, ensure_ascii=False))
-        if "系所" in subset.columns and "中文課程名稱" in subset.columns:
-            subset = subset.sort_values(["系所", "中文課程名稱", "_cid"], kind="mergesort")
+        rows = store.rows_of(included_ids_sorted).tolist()
+        rows.sort(key=lambda r: (str(store.dept[r]), str(store.cname[r]), int(store.cid[r])))
 
     ws_tt.append([f"使用者：{username}（顯示於課表的課程匯出）"])
-    ws_tt.append(out_cols)
-    if not subset.empty:
-        for r in dataframe_to_rows(subset[out_cols], index=False, header=False):
-            ws_tt.append(r)
+    ws_tt.append(out_cols + ["_tba", "_slots"])
+    for r in rows:
+        ws_tt.append(
+            store.row_values(r, out_cols)
+            + [bool(store.tba[r]), json.dumps(list(store.slots[r]), ensure_ascii=False)]
+        )
 
     # I-03: Atomic write (write to temp then replace)
     tmp_path = xlsx_path + ".tmp"
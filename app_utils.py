@@ -91,6 +91,54 @@ def slots_set_to_masks(slots: Set[str]) -> Tuple[np.uint64, np.uint64]:
     return lo, hi
 
 
+# ====== 每日節次遮罩 ((n, 7) uint16) ======
+_DAY_PERIOD_BITS = np.uint64((1 << BITS_PER_DAY) - 1)
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def masks_to_day_periods(mask_lo: np.ndarray, mask_hi: np.ndarray) -> np.ndarray:
+    """lo/hi 時段遮罩 → (n, 7) uint16：第 d 欄為星期 d 的節次位元（bit p = PERIODS[p]）。"""
+    lo = np.asarray(mask_lo, dtype=np.uint64)
+    hi = np.asarray(mask_hi, dtype=np.uint64)
+    out = np.zeros((lo.size, len(DAYS)), dtype=np.uint16)
+    for d in range(len(DAYS)):
+        start = d * BITS_PER_DAY
+        if start + BITS_PER_DAY <= 64:
+            v = lo >> np.uint64(start)
+        elif start >= 64:
+            v = hi >> np.uint64(start - 64)
+        else:
+            # This day straddles the lo/hi boundary
+            v = (lo >> np.uint64(start)) | (hi << np.uint64(64 - start))
+        out[:, d] = (v & _DAY_PERIOD_BITS).astype(np.uint16)
+    return out
+
+
+def free_on_days(day_periods: np.ndarray, days) -> np.ndarray:
+    """days（星期索引）當天都沒有課的列。"""
+    days = list(days)
+    if not days:
+        return np.ones(day_periods.shape[0], dtype=bool)
+    return ~day_periods[:, days].any(axis=1)
+
+
+def no_period_before(day_periods: np.ndarray, period: int) -> np.ndarray:
+    """每天都沒有早於第 period 個節次（PERIODS 索引）的課。"""
+    early = np.uint16((1 << max(0, int(period))) - 1)
+    return ~(day_periods & early).any(axis=1)
+
+
+def no_period_after(day_periods: np.ndarray, period: int) -> np.ndarray:
+    """每天的課都在第 period 個節次（含）以前結束。"""
+    return ~(day_periods >> np.uint16(min(BITS_PER_DAY, int(period) + 1))).any(axis=1)
+
+
+def max_periods_per_day(day_periods: np.ndarray) -> np.ndarray:
+    """每列單日最多的節數。"""
+    counts = _POPCOUNT8[day_periods & np.uint16(0xFF)] + _POPCOUNT8[day_periods >> np.uint16(8)]
+    return counts.max(axis=1, initial=0)
+
+
 def expand_period_range(start: str, end: Optional[str]) -> List[str]:
     start_u = str(start).strip().upper()
     end_u = str(end).strip().upper() if end is not None else None
@@ -196,6 +244,155 @@ def _slot_sort_key(slot: str) -> Tuple[int, int]:
     return (DAYS.index(day) if day in DAYS else 99, PERIOD_INDEX.get(per, 999))
 
 
+# ====== 批次時段編譯器 ======
+# 與 parse_time_text 規則相同，但直接以整數位元累積節次，不產生 "一-3" 之類的中間字串集合。
+_RE_TIME_SEP = re.compile(r"[,，;；]")
+_RE_TIME_DAY = re.compile(r"[一二三四五六日天]")
+_TOKEN_NONE = -1
+_TOKEN_INVALID = -2
+_TOKEN_TABLE = {p: i for i, p in enumerate(PERIODS) if p != "10"}
+_U64_MASK = (1 << 64) - 1
+# _RANGE_BITS[i][j]: 同一天第 i..j 節的位元（未位移到星期）
+_RANGE_BITS = [[((1 << (j - i + 1)) - 1) << i if j >= i else 0 for j in range(BITS_PER_DAY)] for i in range(BITS_PER_DAY)]
+SLOT_NAMES = [f"{d}-{p}" for d in DAYS for p in PERIODS]
+
+
+@dataclass(frozen=True)
+class CompiledTimes:
+    """compile_time_texts 的結果；slot_* 為 CSR 格式，第 i 筆的節次為 slot_offsets[i]:slot_offsets[i+1]。"""
+
+    mask_lo: np.ndarray  # uint64 (n,)
+    mask_hi: np.ndarray  # uint64 (n,)
+    tba: np.ndarray  # bool (n,)
+    slot_offsets: np.ndarray  # int64 (n + 1,)
+    slot_day: np.ndarray  # int8，DAY_INDEX
+    slot_period: np.ndarray  # int8，PERIOD_INDEX
+
+    def slot_names(self, i: int) -> List[str]:
+        """第 i 筆的節次字串（依星期、節次排序，與 _slot_sort_key 相同）。"""
+        a, b = int(self.slot_offsets[i]), int(self.slot_offsets[i + 1])
+        return [SLOT_NAMES[int(d) * BITS_PER_DAY + int(p)] for d, p in zip(self.slot_day[a:b], self.slot_period[a:b])]
+
+
+def _period_token(s: str) -> int:
+    # Same rules as _extract_first_token, mapped straight to PERIOD_INDEX
+    t = s.strip().upper()
+    if not t:
+        return _TOKEN_NONE
+    if t.startswith("10"):
+        return PERIOD_INDEX["10"]
+    ch = t[0]
+    idx = _TOKEN_TABLE.get(ch)
+    if idx is not None:
+        return idx
+    # Other unicode digits (e.g. full-width) count as a token but name no period
+    return _TOKEN_INVALID if ch.isdigit() else _TOKEN_NONE
+
+
+def _compile_time_bits(text: str) -> Tuple[int, bool]:
+    """回傳 (105 位元節次遮罩, tba)。"""
+    s0 = text.strip()
+    if not s0 or s0 == "nan":
+        return 0, True
+
+    bits = 0
+    matched_any = False
+    for part in _RE_TIME_SEP.split(s0):
+        part = part.strip()
+        if not part:
+            continue
+        m = _RE_TIME_DAY.search(part)
+        if m is None:
+            continue
+        day = m.group(0)
+        if day == "天":
+            day = "日"
+        t = part.replace(" ", "")
+        day_pos = t.find(day)
+        if day_pos < 0:
+            continue
+        rest = t[day_pos + 1 :]
+        if not rest:
+            continue
+
+        matched_any = True
+        shift = DAY_INDEX[day] * BITS_PER_DAY
+
+        dash = rest.find("-")
+        if dash >= 0:
+            i = _period_token(rest[:dash])
+            if i < 0:
+                continue
+            j = _period_token(rest[dash + 1 :])
+            if j == _TOKEN_INVALID:
+                continue
+            if j == _TOKEN_NONE:
+                j = i
+            elif j < i:
+                i, j = j, i
+            bits |= _RANGE_BITS[i][j] << shift
+        else:
+            i = _period_token(rest)
+            if i >= 0:
+                bits |= 1 << (shift + i)
+
+    if not matched_any:
+        return 0, True
+    return bits, bits == 0
+
+
+def compile_time_texts(texts) -> CompiledTimes:
+    """
+    批次編譯地點時間文字（建議傳入去重後的值）。
+    一次產生 lo/hi 遮罩、TBA 旗標與 (星期, 節次) 索引陣列；規則與 parse_time_text 相同，
+    唯一差異是無法對應到 PERIODS 的單一節次（例如全形數字）會被略過，而不是留下無法上課表的字串。
+    """
+    n = len(texts)
+    bits_list: List[int] = [0] * n
+    tba = np.ones(n, dtype=bool)
+    for k, text in enumerate(texts):
+        if text is None:
+            continue
+        b, is_tba = _compile_time_bits(str(text))
+        bits_list[k] = b
+        tba[k] = is_tba
+
+    mask_lo = np.fromiter((b & _U64_MASK for b in bits_list), dtype=np.uint64, count=n)
+    mask_hi = np.fromiter((b >> 64 for b in bits_list), dtype=np.uint64, count=n)
+
+    # Expand both words into per-bit flags; nonzero() yields (row, bit) already sorted by bit
+    words = np.stack([mask_lo, mask_hi], axis=1).astype("<u8", copy=False)
+    flags = np.unpackbits(words.view(np.uint8).reshape(n, 16), axis=1, bitorder="little")
+    rows, bit_idx = np.nonzero(flags)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=offsets[1:])
+
+    return CompiledTimes(
+        mask_lo=mask_lo,
+        mask_hi=mask_hi,
+        tba=tba,
+        slot_offsets=offsets,
+        slot_day=(bit_idx // BITS_PER_DAY).astype(np.int8),
+        slot_period=(bit_idx % BITS_PER_DAY).astype(np.int8),
+    )
+
+
+def concat_compiled_times(parts: List[CompiledTimes]) -> CompiledTimes:
+    """依序串接多段 compile_time_texts 結果（平行分段編譯後合併用）。"""
+    if len(parts) == 1:
+        return parts[0]
+    base = np.cumsum([0] + [int(p.slot_offsets[-1]) for p in parts[:-1]])
+    offsets = np.concatenate([parts[0].slot_offsets[:1]] + [p.slot_offsets[1:] + b for p, b in zip(parts, base)])
+    return CompiledTimes(
+        mask_lo=np.concatenate([p.mask_lo for p in parts]),
+        mask_hi=np.concatenate([p.mask_hi for p in parts]),
+        tba=np.concatenate([p.tba for p in parts]),
+        slot_offsets=offsets.astype(np.int64, copy=False),
+        slot_day=np.concatenate([p.slot_day for p in parts]),
+        slot_period=np.concatenate([p.slot_period for p in parts]),
+    )
+
+
 def parse_gened_categories_from_course_name(course_name: str) -> List[str]:
     s = str(course_name or "").strip()
     if not s:
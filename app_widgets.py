@@ -1,22 +1,23 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Protocol, Set, Tuple
+from typing import List, Optional, Protocol, Sequence, Set, Tuple
 
 import numpy as np
 import pandas as pd
 from PySide6.QtCore import (
     Qt,
+    QAbstractItemModel,
     QAbstractTableModel,
     QModelIndex,
     QEvent,
-    QSortFilterProxyModel,
     QRect,
     Signal,
 )
 from PySide6.QtGui import QColor, QPainter, QPen, QFontMetrics, QBrush
 from PySide6.QtWidgets import (
     QAbstractItemView,
+    QComboBox,
     QHBoxLayout,
     QHeaderView,
     QStyledItemDelegate,
@@ -26,6 +27,8 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
+from app_course_store import CourseStore
+from app_search import CHOICE_SEP, split_choices
 from app_utils import sorted_array_from_set_int
 
 
@@ -424,17 +427,22 @@ class FavoritesTableWidget(QTableWidget):
 class ResultsModel(QAbstractTableModel):
     favoriteToggled = Signal(int, bool)
 
-    def __init__(self, df: pd.DataFrame, favorites_ref: Set[int]):
+    def __init__(self, store: Optional[CourseStore], favorites_ref: Set[int]):
         super().__init__()
-        self._source_df = df
-        self._visible_rows = np.arange(len(df), dtype=np.int32)
-        self._display_columns = [c for c in df.columns if not str(c).startswith("_")]
+        self._store = store
+        n = len(store) if store is not None else 0
+        self._visible_rows = np.arange(n, dtype=np.int32)
+        self._display_columns = list(store.display_columns) if store is not None else []
         self._favorites = favorites_ref
         self._readonly = False
         self._fav_sorted = np.empty((0,), dtype=np.int64)
         self._cid_col: Optional[np.ndarray] = None
         self._col_arrays: List[np.ndarray] = [] # C-02: Cache display columns
         self._cid_col_idx: int = -1
+        # Rows in the order they were given (search order); _visible_rows is that order after sort()
+        self._base_rows = self._visible_rows
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
         self._rebuild_fav_sorted()
 
     def _rebuild_fav_sorted(self) -> None:
@@ -455,50 +463,113 @@ class ResultsModel(QAbstractTableModel):
             bot = self.index(self.rowCount() - 1, 0)
             self.dataChanged.emit(top, bot, [Qt.CheckStateRole])
 
-    def set_data_view(self, source_df: pd.DataFrame, visible_rows: Optional[np.ndarray] = None, display_cols: Optional[List[str]] = None) -> None:
+    def set_data_view(self, store: CourseStore, visible_rows: Optional[np.ndarray] = None, display_cols: Optional[List[str]] = None) -> bool:
+        """更新顯示的列；store、欄位與列都未改變時不發出任何訊號並回傳 False。"""
+        new_cols = list(display_cols) if display_cols is not None else list(store.display_columns)
+        if visible_rows is None:
+            visible_rows = np.arange(len(store), dtype=np.int32)
+
+        if (
+            self._store is store
+            and new_cols == self._display_columns
+            and self._cid_col is not None
+            and np.array_equal(visible_rows, self._base_rows)
+        ):
+            return False
+
         # B-03: Update view without resetting model if possible, or use layoutChanged
         self.layoutAboutToBeChanged.emit()
 
         cache_dirty = False
 
-        if self._source_df is not source_df:
-            self._source_df = source_df
+        if self._store is not store:
+            self._store = store
             cache_dirty = True
 
-        if display_cols is not None:
-            if display_cols != self._display_columns:
-                self._display_columns = display_cols
-                cache_dirty = True
-        else:
-            # If display_cols is None, we default to all non-internal columns
-            new_cols = [c for c in source_df.columns if not str(c).startswith("_")]
-            if new_cols != self._display_columns:
-                self._display_columns = new_cols
-                cache_dirty = True
-
-        if visible_rows is not None:
-            self._visible_rows = visible_rows
-        else:
-            self._visible_rows = np.arange(len(source_df), dtype=np.int32)
+        if new_cols != self._display_columns:
+            self._display_columns = new_cols
+            cache_dirty = True
 
         if cache_dirty:
-            # C-02: Cache all display columns as numpy arrays for O(1) access
-            self._col_arrays = []
-            self._cid_col_idx = -1
-            for i, col in enumerate(self._display_columns):
-                self._col_arrays.append(self._source_df[col].to_numpy(copy=False))
-                # Cache the index of the course ID column to avoid string comparison in data()
-                if str(col) == "開課序號":
-                    self._cid_col_idx = i
-
-            # C-01: Cache cid column from source directly (it's immutable usually)
-            # We use _cid (int) for faster lookup if available
-            if "_cid" in self._source_df.columns:
-                self._cid_col = self._source_df["_cid"].to_numpy(dtype=np.int64, copy=False)
-            else:
-                self._cid_col = None
+            self._bind_store_columns(store)
+
+        # New rows keep the current header sort
+        self._base_rows = visible_rows
+        self._visible_rows = visible_rows[self._sort_permutation(visible_rows)]
 
         self.layoutChanged.emit()
+        return True
+
+    # ====== 排序 ======
+    def _sort_permutation(self, rows: np.ndarray) -> np.ndarray:
+        """rows 依目前排序欄的名次做 stable argsort；未排序時維持原順序。"""
+        c = self._sort_column
+        if c < 0 or self._store is None or rows.size == 0:
+            return np.arange(rows.size)
+        if c == 0:
+            keys = np.isin(self._cid_col[rows], self._fav_sorted).astype(np.int32)
+        else:
+            keys = self._store.sort_rank(self._display_columns[c - 1])[rows]
+        order = np.argsort(keys, kind="stable")
+        # Descending is the ascending order reversed (ties included), as QSortFilterProxyModel did
+        return order[::-1] if self._sort_order == Qt.DescendingOrder else order
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder) -> None:
+        """
+        依欄位排序目前顯示的列：取出該欄預先算好的名次再 argsort，不逐格比較；
+        column 為 -1 時回到搜尋結果原本的順序。
+        """
+        if column >= self.columnCount():
+            column = -1
+        self._sort_column = int(column)
+        self._sort_order = order
+        self._resort()
+
+    def _resort(self) -> None:
+        self.layoutAboutToBeChanged.emit()
+        old_rows = self._visible_rows
+        self._visible_rows = self._base_rows[self._sort_permutation(self._base_rows)]
+
+        # Move persistent indexes (selection, current cell) along with their rows
+        persistent = self.persistentIndexList()
+        if persistent:
+            order = np.argsort(self._visible_rows, kind="stable")
+            new_pos = order[np.searchsorted(self._visible_rows[order], old_rows)]
+            self.changePersistentIndexList(
+                persistent, [self.index(int(new_pos[i.row()]), i.column()) if i.row() < new_pos.size else QModelIndex() for i in persistent]
+            )
+        self.layoutChanged.emit()
+
+    def _bind_store_columns(self, store: CourseStore) -> None:
+        # C-02: Display columns are shared read-only views of the store (no copies)
+        self._col_arrays = []
+        self._cid_col_idx = -1
+        for i, col in enumerate(self._display_columns):
+            self._col_arrays.append(store.column(col))
+            # Cache the index of the course ID column to avoid string comparison in data()
+            if str(col) == "開課序號":
+                self._cid_col_idx = i
+
+        # C-01: Use the store's int cid column for lookups
+        self._cid_col = store.cid
+
+    def replace_store_rows(self, store: CourseStore, changed_rows: np.ndarray) -> int:
+        """
+        換成列位置相同的新 store（只有內容異動），僅對目前顯示中的異動列發出 dataChanged。
+        回傳被刷新的顯示列數。
+        """
+        self._store = store
+        self._bind_store_columns(store)
+        if changed_rows.size == 0 or self._visible_rows.size == 0:
+            return 0
+        if self._sort_column > 0:
+            # Changed cells may move under the current sort
+            self._resort()
+        view_rows = np.flatnonzero(np.isin(self._visible_rows, changed_rows))
+        last_col = self.columnCount() - 1
+        for r in view_rows.tolist():
+            self.dataChanged.emit(self.index(r, 0), self.index(r, last_col))
+        return int(view_rows.size)
 
     def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         return 0 if parent.isValid() else len(self._visible_rows)
@@ -526,12 +597,7 @@ class ResultsModel(QAbstractTableModel):
         # C-01: Use cached array (O(1) lookup)
         if self._cid_col is not None:
             return int(self._cid_col[real_row])
-        
-        try:
-            v = self._source_df.iat[real_row, self._source_df.columns.get_loc("開課序號")]
-            return int(str(v).strip())
-        except Exception:
-            return None
+        return None
 
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
         if not index.isValid():
@@ -549,7 +615,6 @@ class ResultsModel(QAbstractTableModel):
             real_row = self._visible_rows[r]
             
             # C-02: Use cached array access
-            # v = self._source_df.at[real_row, col_name] # Old way
             v = self._col_arrays[col_idx][real_row]
 
             if col_idx == self._cid_col_idx:
@@ -627,11 +692,75 @@ class ResultsModel(QAbstractTableModel):
         self._rebuild_fav_sorted()
         if self.rowCount() <= 0:
             return
+        if self._sort_column == 0:
+            self._resort()
         top_left = self.index(0, 0)
         bottom_right = self.index(self.rowCount() - 1, 0)
         self.dataChanged.emit(top_left, bottom_right, [Qt.CheckStateRole, Qt.UserRole])
 
 
+class CheckableComboBox(QComboBox):
+    """
+    可多選的下拉選單：點清單項目切換勾選（清單保持開啟），輸入框內容即為以「、」串接的已選值。
+    all_text 項目代表全部，點選後清空勾選；read_only 為 False 時也可直接輸入（例如系所關鍵字）。
+    """
+
+    def __init__(self, all_text: str, read_only: bool = False, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.all_text = all_text
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        # The default combo delegate may draw items as menu entries without check boxes
+        self.setItemDelegate(QStyledItemDelegate(self))
+        self.view().viewport().installEventFilter(self)
+        if read_only:
+            self.lineEdit().setReadOnly(True)
+            self.lineEdit().installEventFilter(self)
+
+    def checked_values(self) -> List[str]:
+        return list(split_choices(self.currentText(), self.all_text))
+
+    def set_checked_values(self, values: Sequence[str]) -> None:
+        self.setEditText(CHOICE_SEP.join(values) if values else self.all_text)
+
+    def _update_checks(self, chosen: Sequence[str]) -> None:
+        # Changing the current item's data makes QComboBox rewrite the edit text; keep the typed text
+        edit = self.lineEdit()
+        text = edit.text()
+        was_blocked = self.blockSignals(True)
+        edit_blocked = edit.blockSignals(True)
+        try:
+            for i in range(self.count()):
+                if self.itemText(i) != self.all_text:
+                    self.setItemData(i, Qt.Checked if self.itemText(i) in chosen else Qt.Unchecked, Qt.CheckStateRole)
+            edit.setText(text)
+        finally:
+            edit.blockSignals(edit_blocked)
+            self.blockSignals(was_blocked)
+
+    def showPopup(self) -> None:
+        self._update_checks(self.checked_values())
+        super().showPopup()
+
+    def eventFilter(self, obj, event):
+        if obj is self.lineEdit() and event.type() == QEvent.MouseButtonPress:
+            self.showPopup()
+            return True
+        if obj is self.view().viewport() and event.type() == QEvent.MouseButtonRelease:
+            index = self.view().indexAt(event.position().toPoint())
+            text = index.data() if index.isValid() else None
+            if text and text != self.all_text:
+                values = self.checked_values()
+                if text in values:
+                    values.remove(text)
+                else:
+                    values.append(text)
+                self._update_checks(values)
+                self.set_checked_values(values)
+                return True
+        return super().eventFilter(obj, event)
+
+
 class CheckBoxClickDelegate(QStyledItemDelegate):
     def editorEvent(self, event, model, option, index):
         if event.type() in (QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
@@ -685,7 +814,7 @@ class ResultsFrozenView(QWidget):
         self._checkbox_delegate = CheckBoxClickDelegate(self.frozen_view)
         self.frozen_view.setItemDelegateForColumn(0, self._checkbox_delegate)
 
-        self._model: Optional[QSortFilterProxyModel] = None
+        self._model: Optional[QAbstractItemModel] = None
 
         self.main_view.verticalScrollBar().valueChanged.connect(self.frozen_view.verticalScrollBar().setValue)
         self.frozen_view.verticalScrollBar().valueChanged.connect(self.main_view.verticalScrollBar().setValue)
@@ -697,11 +826,11 @@ class ResultsFrozenView(QWidget):
 
         self._last_header_signature: Optional[Tuple[str, ...]] = None
 
-    def setModel(self, proxy_model: QSortFilterProxyModel) -> None:
-        self._model = proxy_model
+    def setModel(self, model: QAbstractItemModel) -> None:
+        self._model = model
 
-        self.main_view.setModel(proxy_model)
-        self.frozen_view.setModel(proxy_model)
+        self.main_view.setModel(model)
+        self.frozen_view.setModel(model)
 
         self.frozen_view.setSelectionModel(self.main_view.selectionModel())
 
@@ -714,12 +843,12 @@ class ResultsFrozenView(QWidget):
         self.frozen_view.setSortingEnabled(False)
         self._update_frozen_width()
 
-        proxy_model.modelReset.connect(self._on_proxy_reset_like)
-        proxy_model.layoutChanged.connect(self._on_proxy_reset_like)
-        proxy_model.columnsInserted.connect(self._on_proxy_reset_like)
-        proxy_model.columnsRemoved.connect(self._on_proxy_reset_like)
+        model.modelReset.connect(self._on_model_reset_like)
+        model.layoutChanged.connect(self._on_model_reset_like)
+        model.columnsInserted.connect(self._on_model_reset_like)
+        model.columnsRemoved.connect(self._on_model_reset_like)
 
-    def _on_proxy_reset_like(self, *_args) -> None:
+    def _on_model_reset_like(self, *_args) -> None:
         self._apply_column_visibility()
         self._apply_result_default_column_widths_if_needed()
 
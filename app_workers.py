@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
-from typing import Dict, List, Set, Tuple, Optional
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, FrozenSet, List, Set, Tuple, Optional
 
 import numpy as np
 from PySide6.QtCore import QObject, QRunnable, Signal
 
-from app_constants import GENED_DEPT_NAME
+from app_course_store import CatalogDiff, CourseStore, diff_course_stores
+from app_saved_search import refresh_saved_searches
+from app_search import SearchCancelled, SearchEngine, SearchQuery
+from app_snapshot import load_courses_cached
 from app_user_data import best_schedule_dir_path, save_best_schedule_cache, save_user_file
 from app_utils import sorted_array_from_set_int
 
@@ -24,7 +27,7 @@ class SaveWorker(QObject, QRunnable):
         included_sorted: np.ndarray,
         locked_sorted: np.ndarray,
         fav_seq: Dict[int, int],
-        courses_df,
+        store: CourseStore,
     ):
         QObject.__init__(self)
         QRunnable.__init__(self)
@@ -37,7 +40,7 @@ class SaveWorker(QObject, QRunnable):
         self.included_sorted = included_sorted.copy() if included_sorted is not None else np.empty((0,), dtype=np.int64)
         self.locked_sorted = locked_sorted.copy() if locked_sorted is not None else np.empty((0,), dtype=np.int64)
         self.fav_seq = dict(fav_seq)
-        self.courses_df = courses_df
+        self.store = store
 
     def run(self):
         try:
@@ -48,13 +51,115 @@ class SaveWorker(QObject, QRunnable):
                 self.included_sorted,
                 self.locked_sorted,
                 self.fav_seq,
-                self.courses_df,
+                self.store,
             )
             self.finished.emit(self.token, True, "")
         except Exception as e:
             self.finished.emit(self.token, False, str(e))
 
 
+@dataclass(frozen=True)
+class CatalogLoadResult:
+    path: str
+    sheet: str
+    store: CourseStore
+    diff: Optional[CatalogDiff]
+    # 與舊課程表為同一組列時，內容有異動的來源（見 CourseStore.reload_changes）；否則為 None
+    changes: Optional[FrozenSet[str]] = None
+
+
+class CatalogLoadWorker(QObject, QRunnable):
+    """在背景執行緒讀取課程檔並建立新的 CourseStore（含與舊資料的差異）；GUI 執行緒只負責換上。"""
+
+    finished = Signal(int, bool, object, str)
+    progress = Signal(object)
+
+    def __init__(self, token: int, path: str, old_store: Optional[CourseStore]):
+        QObject.__init__(self)
+        QRunnable.__init__(self)
+        self.setAutoDelete(True)
+
+        self.token = int(token)
+        self.path = path
+        self.old_store = old_store
+
+    def run(self):
+        try:
+            df, sheet = load_courses_cached(self.path, progress=self.progress.emit)
+            store = CourseStore(df)
+            del df
+            diff = None
+            changes = None
+            if self.old_store is not None:
+                diff = diff_course_stores(self.old_store, store)
+                if not diff.is_empty:
+                    store.carry_over_derived(self.old_store)
+                    changes = store.reload_changes(self.old_store)
+                    if changes is not None:
+                        store.carry_over_indexes(self.old_store, changes)
+            self.finished.emit(self.token, True, CatalogLoadResult(self.path, sheet, store, diff, changes), "")
+        except Exception as e:
+            self.finished.emit(self.token, False, None, str(e))
+
+
+class SavedSearchWorker(QObject, QRunnable):
+    """課程資料載入後，在背景一次評估所有使用者的已存搜尋；finished 帶有新符合課程的 SavedSearchReport 清單。"""
+
+    finished = Signal(int, object, str)
+
+    def __init__(self, token: int, course_excel_path: str, store: CourseStore):
+        QObject.__init__(self)
+        QRunnable.__init__(self)
+        self.setAutoDelete(True)
+
+        self.token = int(token)
+        self.course_excel_path = course_excel_path
+        self.store = store
+
+    def run(self):
+        try:
+            self.finished.emit(self.token, refresh_saved_searches(self.course_excel_path, self.store), "")
+        except Exception as e:
+            self.finished.emit(self.token, [], str(e))
+
+
+class SearchWorker(QObject, QRunnable):
+    """
+    在背景執行緒執行一次搜尋。generation 不再是最新時（使用者又改了條件）於步驟之間放棄，
+    finished 帶 None；GUI 執行緒只套用最新一代的結果。
+    """
+
+    finished = Signal(int, object, object, str)
+
+    def __init__(self, generation: int, engine: SearchEngine, query: SearchQuery, current_generation: Callable[[], int]):
+        QObject.__init__(self)
+        QRunnable.__init__(self)
+        self.setAutoDelete(True)
+
+        self.generation = int(generation)
+        self.engine = engine
+        self.query = query
+        self.current_generation = current_generation
+
+    def _stale(self) -> bool:
+        return self.current_generation() != self.generation
+
+    def run(self):
+        if self._stale():
+            self.finished.emit(self.generation, self.engine, None, "")
+            return
+        try:
+            result = self.engine.search(self.query, cancelled=self._stale)
+            if result.rows.size == 0 and not self._stale():
+                # Nothing matched: offer typo corrections (bounded by the fuzzy time budget)
+                result = replace(result, suggestions=self.engine.suggest(self.query))
+            self.finished.emit(self.generation, self.engine, result, "")
+        except SearchCancelled:
+            self.finished.emit(self.generation, self.engine, None, "")
+        except Exception as e:
+            self.finished.emit(self.generation, self.engine, None, str(e))
+
+
 @dataclass(frozen=True)
 class _BestCandidate:
     cid: int
@@ -96,7 +201,7 @@ class BestScheduleWorker(QObject, QRunnable):
         locked_ids: Set[int],
         included_ids: Set[int],
         fav_seq: Dict[int, int],
-        courses_df,
+        store: CourseStore,
     ):
         QObject.__init__(self)
         QRunnable.__init__(self)
@@ -109,7 +214,7 @@ class BestScheduleWorker(QObject, QRunnable):
         self.locked_ids = set(int(x) for x in locked_ids)
         self.included_ids = set(int(x) for x in included_ids)
         self.fav_seq = dict(fav_seq)
-        self.courses_df = courses_df
+        self.store = store
         self.best_schedule_dir = best_schedule_dir_path(user_dir_path)
 
         self._cancel_requested = False
@@ -138,15 +243,14 @@ class BestScheduleWorker(QObject, QRunnable):
             return 0.0
 
     def _build_candidates(self) -> Tuple[List[_BestCandidate], float, int, List[int], np.uint64, np.uint64]:
-        if self.courses_df is None or self.courses_df.empty or not self.favorites:
+        if self.store is None or self.store.empty or not self.favorites:
             return [], 0.0, 0, [], np.uint64(0), np.uint64(0)
 
-        cols = ["_cid", "學分", "系所", "_mask_lo", "_mask_hi"]
         target_ids = set(self.favorites) & self.included_ids
         if not target_ids:
             return [], 0.0, 0, [], np.uint64(0), np.uint64(0)
-        sub = self.courses_df[self.courses_df["_cid"].isin(list(target_ids))][cols]
-        if sub.empty:
+        rows = self.store.rows_of(sorted(target_ids))
+        if rows.size == 0:
             return [], 0.0, 0, [], np.uint64(0), np.uint64(0)
 
         candidates: List[_BestCandidate] = []
@@ -156,12 +260,15 @@ class BestScheduleWorker(QObject, QRunnable):
         base_lo = np.uint64(0)
         base_hi = np.uint64(0)
 
-        for cid, credit, dept, mlo, mhi in sub.itertuples(index=False, name=None):
+        st = self.store
+        for cid, credit, is_gened, lo, hi in zip(
+            st.cid[rows].tolist(), st.credit[rows], st.is_gened[rows].tolist(), st.mask_lo[rows], st.mask_hi[rows]
+        ):
             cid_i = int(cid)
             cr = self._safe_credit(credit)
-            gened = 1 if str(dept).strip() == GENED_DEPT_NAME else 0
-            lo = np.uint64(mlo) if mlo is not None else np.uint64(0)
-            hi = np.uint64(mhi) if mhi is not None else np.uint64(0)
+            gened = 1 if is_gened else 0
+            lo = np.uint64(lo)
+            hi = np.uint64(hi)
 
             if cid_i in self.locked_ids:
                 base_credit += cr
@@ -542,7 +649,7 @@ class BestScheduleWorker(QObject, QRunnable):
                 included_sorted,
                 locked_sorted,
                 self.fav_seq,
-                self.courses_df,
+                self.store,
             )
             files.append(path)
 
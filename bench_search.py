@@ -0,0 +1,65 @@
+"""
+搜尋熱路徑量測：對課程 Excel 建立 CourseStore，逐一執行代表性的 SearchQuery 並列出耗時與執行計畫。
+用法：python bench_search.py [課程 Excel 路徑] [重複次數]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+from app_course_store import CourseStore
+from app_excel import load_courses_auto
+from app_search import MATCH_CONTAINED, SPECIAL_GENED, SearchEngine, SearchQuery
+from app_utils import slot_to_mask
+
+DEFAULT_XLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_data", "course_inputs", "2025_1_16_課程.xls")
+
+
+def _sel(days: str, periods: str):
+    lo = hi = 0
+    for d in days:
+        for p in periods:
+            a, b = slot_to_mask(d, p)
+            lo |= int(a)
+            hi |= int(b)
+    return lo, hi
+
+
+def _queries():
+    lo, hi = _sel("一二三", "1234")
+    return {
+        "all": SearchQuery(),
+        "full 1 char": SearchQuery(full="數"),
+        "full 2 tokens": SearchQuery(full="數學 3"),
+        "cname": SearchQuery(cname="程式設計"),
+        "teacher": SearchQuery(teacher="王"),
+        "dept + full": SearchQuery(dept="資工系", full="a"),
+        "gened core": SearchQuery(special=SPECIAL_GENED, gened_core="自然科學"),
+        "time contained": SearchQuery(sel_lo=lo, sel_hi=hi, match_mode=MATCH_CONTAINED),
+        "empty before text": SearchQuery(serial="99999", full="數學"),
+    }
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_XLS
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    df, _ = load_courses_auto(path)
+    store = CourseStore(df)
+    engine = SearchEngine(store)
+    # Build the lazy search columns up front so they are not part of the timings
+    store.alltext, store.cname_lc
+
+    print(f"rows: {len(store)}")
+    for name, q in _queries().items():
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            res = engine.search(q)
+            best = min(best, time.perf_counter() - t0)
+        skipped = f"  skipped={list(res.skipped)}" if res.skipped else ""
+        print(f"{name:18s}: {best * 1000:7.3f} ms  {res.rows.size:5d} rows  plan={list(res.executed)}{skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+地點時間解析吞吐量比較：parse_time_text + slots_set_to_masks（逐筆）vs compile_time_texts（批次）。
+用法：python bench_time_parser.py [課程 Excel 路徑] [重複次數]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+from app_utils import _slot_sort_key, compile_time_texts, parse_time_text, slots_set_to_masks
+
+DEFAULT_XLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_data", "course_inputs", "2025_1_16_課程.xls")
+
+
+def _reference(texts):
+    out = []
+    for t in texts:
+        res = parse_time_text(t)
+        out.append((slots_set_to_masks(res.slots), sorted(res.slots, key=_slot_sort_key), res.tba))
+    return out
+
+
+def _best_of(fn, texts, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_XLS
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    raw = pd.read_excel(path, usecols=["地點時間"])
+    texts = list(raw["地點時間"].fillna("").astype(str).str.strip().unique())
+
+    t_ref = _best_of(_reference, texts, repeat)
+    t_new = _best_of(compile_time_texts, texts, repeat)
+    n = len(texts)
+    print(f"unique texts: {n}")
+    print(f"parse_time_text    : {t_ref * 1000:8.2f} ms  {n / t_ref:12,.0f} texts/s")
+    print(f"compile_time_texts : {t_new * 1000:8.2f} ms  {n / t_new:12,.0f} texts/s  ({t_ref / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ echo 正在安裝依賴...
 pip install -r requirements.txt
 echo.
 echo 正在執行單元測試...
-python -m unittest test_timetable_logic.py
+python -m unittest discover -p "test_*.py"
 if %errorlevel% neq 0 (
     echo 測試失敗！請檢查程式碼。
     pause
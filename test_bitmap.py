@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_bitmap import FilterBitmaps, RowBitmap
+
+
+class TestRowBitmap(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 200_000
+        self.n = n
+        # Dense in the first chunk, sparse elsewhere, plus an empty chunk
+        self.masks = [
+            (rng.random(n) < 0.3) & (np.arange(n) < 70_000) | (rng.random(n) < 0.01),
+            (rng.random(n) < 0.5) & (np.arange(n) < 65_536) | (rng.random(n) < 0.002) & (np.arange(n) > 131_072),
+            rng.random(n) < 0.0005,
+        ]
+        self.bitmaps = [RowBitmap.from_mask(m) for m in self.masks]
+
+    def test_set_operations_match_masks(self):
+        for i, a in enumerate(self.bitmaps):
+            ma = self.masks[i]
+            self.assertEqual(a.cardinality, int(ma.sum()))
+            self.assertEqual(a.to_rows().tolist(), np.flatnonzero(ma).tolist())
+            for j, b in enumerate(self.bitmaps):
+                mb = self.masks[j]
+                for got, want in ((a & b, ma & mb), (a | b, ma | mb), (a.andnot(b), ma & ~mb)):
+                    self.assertEqual(got.cardinality, int(want.sum()))
+                    self.assertTrue(np.array_equal(got.to_mask(self.n), want))
+
+    def test_union_all(self):
+        got = RowBitmap.union_all(self.bitmaps + [RowBitmap.from_rows(np.array([3, 4]))])
+        want = self.masks[0] | self.masks[1] | self.masks[2]
+        want[[3, 4]] = True
+        self.assertTrue(np.array_equal(got.to_mask(self.n), want))
+        self.assertEqual(len(RowBitmap.union_all([])), 0)
+
+    def test_contains_rows_and_edges(self):
+        rows = np.array([5, 70_001, 0, 199_999, 65_536])
+        self.assertEqual(self.bitmaps[0].contains_rows(rows).tolist(), self.masks[0][rows].tolist())
+        empty = RowBitmap.from_rows(np.empty(0, dtype=np.int64))
+        self.assertEqual(len(empty & self.bitmaps[0]), 0)
+        self.assertEqual(len(self.bitmaps[1].andnot(RowBitmap.full(self.n))), 0)
+        self.assertEqual(empty.to_rows().dtype, np.int32)
+
+    def test_filter_bitmaps(self):
+        fb = FilterBitmaps(5, np.array([1, 0, 1, 2, 1]), 3, np.array([0, 1, 3, 0, 2], dtype=np.uint32), 2, {"tba": np.array([0, 0, 1, 0, 0], bool)})
+        self.assertEqual([b.to_rows().tolist() for b in fb.dept], [[1], [0, 2, 4], [3]])
+        self.assertEqual([b.to_rows().tolist() for b in fb.gened_core], [[1, 2], [2, 4]])
+        self.assertEqual(fb.flags["tba"].cardinality, 1)
+
+        patched = fb.with_flags({"tba": np.array([1, 0, 0, 0, 1], bool)})
+        self.assertEqual(patched.flags["tba"].to_rows().tolist(), [0, 4])
+        self.assertEqual(fb.flags["tba"].to_rows().tolist(), [2])
+        self.assertIs(patched.dept, fb.dept)
+
+
+if __name__ == '__main__':
+    unittest.main()
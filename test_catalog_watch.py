@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from PySide6.QtCore import QCoreApplication
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_catalog_watch import CourseInputWatcher, is_course_excel_name, pick_changed_export, scan_course_inputs
+
+
+class TestCourseInputWatcher(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data=b"x", mtime=None):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_scan_and_pick(self):
+        a = self._write("a.xls", mtime=1000)
+        self._write("~$a.xlsx")
+        self._write("notes.txt")
+        base = scan_course_inputs(self.dir)
+        self.assertEqual(list(base), [a])
+        self.assertIsNone(pick_changed_export(base, base))
+
+        b = self._write("b.xlsx", mtime=2000)
+        self._write("a.xls", b"xy", mtime=1500)
+        self.assertEqual(pick_changed_export(base, scan_course_inputs(self.dir)), b)
+        # Removing files alone never triggers a load; empty files are still being created
+        self._write("c.xlsx", b"", mtime=3000)
+        self.assertEqual(pick_changed_export(base, scan_course_inputs(self.dir)), b)
+        self.assertIsNone(pick_changed_export(scan_course_inputs(self.dir), {}))
+
+    def test_ignores_namespace_patch_backups(self):
+        self.assertTrue(is_course_excel_name("課程.XLSX"))
+        self.assertFalse(is_course_excel_name("課程.xlsx.bak.xlsx"))
+        a = self._write("a.xlsx", mtime=1000)
+        base = scan_course_inputs(self.dir)
+        # Loading a.xlsx writes its backup into the watched folder; that alone must not trigger a reload
+        self._write("a.xlsx.bak.xlsx", mtime=2000)
+        self.assertEqual(list(scan_course_inputs(self.dir)), [a])
+        self.assertIsNone(pick_changed_export(base, scan_course_inputs(self.dir)))
+
+    def test_waits_for_write_to_settle(self):
+        self._write("a.xls")
+        watcher = CourseInputWatcher(self.dir, settle_ms=10)
+        ready = []
+        watcher.exportReady.connect(ready.append)
+
+        path = self._write("b.xlsx", b"1", mtime=1000)
+        watcher._on_fs_event(self.dir)
+        self._write("b.xlsx", b"12", mtime=1001)
+        watcher._check_settled()
+        self.assertEqual(ready, [])
+        watcher._check_settled()
+        self.assertEqual(ready, [path])
+
+        watcher._check_settled()
+        self.assertEqual(ready, [path])
+
+        self._write("b.xlsx", b"123", mtime=1002)
+        watcher.acknowledge()
+        watcher._on_fs_event(self.dir)
+        watcher._check_settled()
+        self.assertEqual(ready, [path])
+
+
+if __name__ == '__main__':
+    unittest.main()
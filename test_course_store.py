@@ -0,0 +1,158 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_course_store import CourseStore, DictColumn, contains_mask, diff_course_stores, sort_ranks
+
+
+class TestCourseStore(unittest.TestCase):
+    def setUp(self):
+        # Deliberately unsorted by _cid; the store must reorder rows
+        self.df = pd.DataFrame({
+            "開課序號": ["0030", "0010", "0020"],
+            "系所": ["通識", "資工系", "數學系"],
+            "中文課程名稱": ["哲學", "程式設計", "微積分"],
+            "教師": ["甲", "乙", "丙"],
+            "學分": [2.0, 3.0, np.nan],
+            "_cid": [30, 10, 20],
+            "_mask_lo": np.array([4, 1, 2], dtype=np.uint64),
+            "_mask_hi": np.array([0, 0, 8], dtype=np.uint64),
+            "_slots": [["一-2"], ["一-0"], ["一-1"]],
+        })
+        self.store = CourseStore(self.df)
+
+    def test_rows_sorted_by_cid(self):
+        self.assertEqual(self.store.cid.tolist(), [10, 20, 30])
+        self.assertEqual(self.store.cname.tolist(), ["程式設計", "微積分", "哲學"])
+        self.assertEqual(self.store.column("系所").tolist(), ["資工系", "數學系", "通識"])
+
+    def test_lookups(self):
+        self.assertEqual(self.store.rows_of([30, 99, 10]).tolist(), [2, 0])
+        self.assertEqual(self.store.row_of(20), 1)
+        self.assertEqual(self.store.row_of(21), -1)
+        self.assertEqual(self.store.credit_of(20), 0.0)
+        self.assertEqual(self.store.total_credits([10, 20, 30]), 5.0)
+        lo, hi = self.store.occupied_masks([20, 30])
+        self.assertEqual((int(lo), int(hi)), (6, 8))
+        self.assertEqual(self.store.is_gened.tolist(), [False, False, True])
+        self.assertEqual(self.store.slot_pairs_for_ids([10, 20]), {("一", "0"), ("一", "1")})
+
+    def test_duplicate_cids(self):
+        # The same 開課序號 can appear on two courses; every row is returned
+        df = pd.concat([self.df, self.df.iloc[[1]].assign(中文課程名稱="程式實習")], ignore_index=True)
+        store = CourseStore(df)
+        self.assertEqual(store.cid.tolist(), [10, 10, 20, 30])
+        self.assertEqual(store.rows_of([30, 10, 99, 20]).tolist(), [3, 0, 1, 2])
+        self.assertEqual(sorted(store.cname[store.rows_of([10])].tolist()), ["程式實習", "程式設計"])
+        self.assertEqual(store.total_credits([10]), 6.0)
+
+    def test_columns_are_read_only(self):
+        with self.assertRaises(ValueError):
+            self.store.mask_lo[0] = 0
+        with self.assertRaises(ValueError):
+            self.store.column("教師")[0] = "x"
+
+    def test_contains_mask(self):
+        self.assertEqual(contains_mask(self.store.cname_lc, "微").tolist(), [False, True, False])
+
+    def test_lazy_columns(self):
+        store = CourseStore(self.df)
+        self.assertFalse(store.is_derived("tt_label"))
+        self.assertEqual(store.tt_label.tolist(), ["程式設計\n0010", "微積分\n0020", "哲學\n0030"])
+        self.assertTrue(store.is_derived("tt_label"))
+        self.assertEqual(store.alltext[0], "0010 資工系 程式設計 乙 3.0")
+
+        store = CourseStore(self.df)
+        store.start_background_derivation()
+        store._derive_thread.join()
+        self.assertTrue(all(store.is_derived(name) for name in ("cname_lc", "alltext", "tt_label", "gened_cats")))
+        with self.assertRaises(ValueError):
+            store.alltext[0] = "x"
+
+    def test_dict_encoded_columns(self):
+        dept = self.store.dept_dict
+        self.assertEqual(dept.categories.tolist(), sorted(["通識", "資工系", "數學系"]))
+        self.assertEqual(dept.values.tolist(), ["資工系", "數學系", "通識"])
+        self.assertEqual(dept.eq_mask("數學系").tolist(), [False, True, False])
+        self.assertEqual(dept.code_of("物理系"), -1)
+        self.assertEqual(self.store.teacher_dict.contains("丙", np.array([2, 1])).tolist(), [False, True])
+        # Columns missing from the frame encode as a single empty string
+        self.assertEqual(self.store.code_dict.categories.tolist(), [""])
+
+    def test_dict_column_counts(self):
+        col = DictColumn(np.array(["b", "A", "b", np.nan], dtype=object))
+        self.assertEqual(col.categories[:2].tolist(), ["A", "b"])
+        self.assertEqual(col.counts().tolist(), [1, 2, 1])
+        self.assertEqual(col.counts(np.array([True, False, True, False])).tolist(), [0, 2, 0])
+        self.assertEqual(col.contains("a").tolist(), [False, True, False, False])
+
+    def test_sort_ranks(self):
+        # Numbers before strings (None as ""), equal values share a rank; NaN in numeric columns comes first
+        self.assertEqual(sort_ranks(np.array(["b", 10, "a", 9.5, None, "b"], dtype=object)).tolist(), [4, 1, 3, 0, 2, 4])
+        self.assertEqual(sort_ranks(np.array([2.0, np.nan, 1.0, 2.0])).tolist(), [2, 0, 1, 2])
+        self.assertEqual(self.store.sort_rank("學分").tolist(), [2, 0, 1])
+        self.assertEqual(self.store.sort_rank("系所").tolist(), np.argsort(np.argsort(self.store.column("系所"))).tolist())
+        self.assertEqual(self.store.sort_rank("開課序號").tolist(), [0, 1, 2])
+
+    def test_diff_and_carry_over(self):
+        old = CourseStore(self.df)
+        self.assertTrue(diff_course_stores(old, CourseStore(self.df)).is_empty)
+
+        df2 = self.df.copy()
+        df2.loc[df2["_cid"] == 20, "教師"] = "丁"
+        new = CourseStore(df2)
+        diff = diff_course_stores(old, new)
+        self.assertTrue(diff.same_rows)
+        self.assertEqual(diff.changed.tolist(), [20])
+
+        old.start_background_derivation()
+        old._derive_thread.join()
+        self.assertEqual(new.carry_over_derived(old), 2)
+        self.assertTrue(new.is_derived("alltext"))
+        self.assertEqual(new.alltext.tolist(), CourseStore(df2).alltext.tolist())
+
+        df3 = pd.concat([df2[df2["_cid"] != 30], self.df.iloc[[0]].assign(開課序號="0040", _cid=40)])
+        diff = diff_course_stores(new, CourseStore(df3))
+        self.assertFalse(diff.same_rows)
+        self.assertEqual((diff.added.tolist(), diff.removed.tolist(), diff.changed.tolist()), ([40], [30], []))
+        self.assertEqual(diff.changed_cids.tolist(), [30, 40])
+
+        # Duplicate cids pair up by order of appearance
+        dup = pd.concat([self.df, self.df.iloc[[1]].assign(教師="戊")])
+        self.assertTrue(diff_course_stores(CourseStore(dup), CourseStore(dup)).is_empty)
+
+    def test_reload_keeps_indexes(self):
+        df = self.df.assign(限修人數=[30, 30, 30], 選修人數=[10, 30, 5], _not_full=[True, False, True])
+        old = CourseStore(df)
+        old.start_background_derivation()
+        old._derive_thread.join()
+        cname_index, slots, fb = old.text_index("cname_lc"), old.slot_index, old.filter_bitmaps
+
+        # Enrollment only: text / time indexes carry over, the not_full flag bitmap is rebuilt
+        df2 = df.copy()
+        df2.loc[df2["_cid"] == 10, ["選修人數", "_not_full"]] = [29, True]
+        new = CourseStore(df2)
+        changes = new.reload_changes(old)
+        self.assertEqual(changes, frozenset({"選修人數", "alltext", "not_full", "seats_left"}))
+        new.carry_over_derived(old)
+        new.carry_over_indexes(old, changes)
+        self.assertIs(new.text_index("cname_lc"), cname_index)
+        self.assertIs(new.slot_index, slots)
+        self.assertIs(new.filter_bitmaps.dept, fb.dept)
+        self.assertEqual(new.filter_bitmaps.flags["not_full"].to_rows().tolist(), [0, 1, 2])
+        self.assertIs(new.sort_rank("學分"), old.sort_rank("學分"))
+        self.assertTrue(new.is_derived("alltext"))
+        self.assertEqual(new.text_index("alltext").contains("29").tolist(), [True, False, False])
+
+        # A different set of rows is not a content-only reload
+        self.assertIsNone(CourseStore(df2[df2["_cid"] != 30]).reload_changes(old))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_constants import REQUIRED_COLUMNS
+from app_excel import ExcelFormatError, load_courses_auto
+
+
+def _course_sheet(cids):
+    data = {c: [""] * len(cids) for c in REQUIRED_COLUMNS}
+    data["開課序號"] = list(cids)
+    data["中文課程名稱"] = [f"課程{i}" for i in range(len(cids))]
+    return pd.DataFrame(data)
+
+
+class TestLoadCoursesAuto(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "courses.xlsx")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, sheets):
+        with pd.ExcelWriter(self.path, engine="openpyxl") as w:
+            for name, df in sheets.items():
+                df.to_excel(w, sheet_name=name, index=False)
+
+    def test_picks_sheet_with_most_course_ids(self):
+        self._write({
+            "說明": pd.DataFrame({"a": [1, 2]}),
+            "課程": _course_sheet(["0001", "x"]),
+            "全部": _course_sheet(["0001", "0002", "0003"]),
+        })
+        df, sheet = load_courses_auto(self.path)
+        self.assertEqual(sheet, "全部")
+        self.assertEqual(df["_cid"].tolist(), [1, 2, 3])
+
+    def test_large_sheets_scored_on_every_row(self):
+        # Both sheets qualify with thousands of ids; the larger one wins over the preferred name
+        self._write({
+            "課程": _course_sheet([f"{i:04d}" for i in range(1, 2501)]),
+            "全部": _course_sheet([f"{i:04d}" for i in range(1, 3001)]),
+        })
+        df, sheet = load_courses_auto(self.path)
+        self.assertEqual(sheet, "全部")
+        self.assertEqual(len(df), 3000)
+
+    def test_tie_keeps_preferred_sheet(self):
+        self._write({
+            "其他": _course_sheet(["0005", "0006"]),
+            "課程": _course_sheet(["0001", "0002"]),
+        })
+        _, sheet = load_courses_auto(self.path)
+        self.assertEqual(sheet, "課程")
+
+    def test_only_winning_sheet_is_parsed_in_full(self):
+        self._write({
+            "課程": _course_sheet(["0001"]),
+            "全部": _course_sheet(["0001", "0002"]),
+        })
+        full_reads = []
+        parse = pd.ExcelFile.parse
+
+        def spy(xf, sheet_name=0, **kw):
+            # Scoring reads only the 開課序號 column
+            if kw.get("nrows") is None and kw.get("usecols") is None:
+                full_reads.append(sheet_name)
+            return parse(xf, sheet_name=sheet_name, **kw)
+
+        with mock.patch.object(pd.ExcelFile, "parse", spy):
+            _, sheet = load_courses_auto(self.path)
+        self.assertEqual(sheet, "全部")
+        self.assertEqual(full_reads, ["全部"])
+
+    def test_no_course_sheet_raises(self):
+        self._write({"說明": pd.DataFrame({"a": [1]})})
+        with self.assertRaises(ExcelFormatError):
+            load_courses_auto(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_fuzzy import FuzzyMatcher, bounded_substring_distance
+
+
+class TestFuzzyMatcher(unittest.TestCase):
+    def test_substring_distance(self):
+        self.assertEqual(bounded_substring_distance("微積分", "微積分(一)", 1), 0)
+        self.assertEqual(bounded_substring_distance("微積份", "微積分(一)", 1), 1)
+        self.assertEqual(bounded_substring_distance("程式涉計", "創意程式設計", 1), 1)
+        self.assertEqual(bounded_substring_distance("abcd", "xbcx", 1), 2)
+        # Beyond the bound the result is capped at max_dist + 1
+        self.assertEqual(bounded_substring_distance("abc", "", 1), 2)
+        self.assertEqual(bounded_substring_distance("", "abc", 0), 0)
+
+    def test_suggest_ranks_and_maps_rows(self):
+        values = ["王小明", "王曉明", "李大華", "王小明 李大華", "陳一"]
+        codes = np.array([0, 2, 1, 0, 3, 4, 0])
+        matcher = FuzzyMatcher(values, codes)
+        got = matcher.suggest("王小民")
+        self.assertEqual([s.value for s in got], ["王小明", "王小明 李大華"])
+        self.assertEqual(got[0].distance, 1)
+        self.assertEqual(got[0].rows.tolist(), [0, 3, 6])
+        self.assertEqual(matcher.suggest("李大華", limit=1)[0].rows.tolist(), [1])
+        self.assertEqual(matcher.suggest("張三豐"), [])
+        # An exhausted budget returns whatever was checked so far (here: nothing)
+        self.assertEqual(matcher.suggest("王小民", budget_ms=-1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
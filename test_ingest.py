@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_excel
+from app_excel import load_courses_auto
+from app_ingest import load_courses_chunked
+
+
+class TestChunkedIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "courses.xlsx")
+        n = 23
+        raw = pd.DataFrame({
+            "開課序號": [f"{(n - i) * 3:04d}" for i in range(n)],
+            "開課代碼": [f"CSU{i:04d}" for i in range(n)],
+            "系所": ["資工系" if i % 2 else "通識" for i in range(n)],
+            "中文課程名稱": [f"課程{i}[通識：自然科學 邏輯運算]" for i in range(n)],
+            "教師": [f"老師{i % 5}" for i in range(n)],
+            # integers in the first blocks, a fraction near the end -> float64 overall
+            "學分": [2] * (n - 1) + [2.5],
+            "必/選": ["必"] * n,
+            "全/半": ["半"] * n,
+            "地點時間": ["一 3-4 公館" if i % 3 else "" for i in range(n)],
+            "限修人數": [50] * n,
+            "選修人數": [i for i in range(n)],
+            "備註": [None] * 10 + ["英語授課"] * (n - 10),
+        })
+        raw.to_excel(self.path, sheet_name="課程", index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_full_load(self):
+        full, sheet = load_courses_auto(self.path)
+        reports = []
+        chunked, sheet2 = load_courses_chunked(self.path, chunk_rows=4, progress=reports.append)
+        self.assertEqual(sheet, sheet2)
+        self.assertEqual(list(full.columns), list(chunked.columns))
+        for col in full.columns:
+            self.assertTrue(full[col].equals(chunked[col]), col)
+        self.assertEqual(len(reports), 6)
+        self.assertEqual(reports[-1].rows_read, 23)
+        self.assertFalse(reports[-1].over_ceiling)
+
+    def test_values_parsed_once_per_file(self):
+        calls = []
+        parse = app_excel.parse_unique_values
+
+        def spy(times, names, *a, **kw):
+            calls.append((len(times), len(names)))
+            return parse(times, names, *a, **kw)
+
+        with mock.patch.object(app_excel, "parse_unique_values", spy):
+            load_courses_chunked(self.path, chunk_rows=4)
+        # 2 distinct time texts and 23 distinct names across all six blocks
+        self.assertEqual(calls, [(2, 23)])
+
+    def test_reports_ceiling_overrun(self):
+        reports = []
+        df, _ = load_courses_chunked(self.path, chunk_rows=4, memory_ceiling_mb=0.001, progress=reports.append)
+        self.assertEqual(len(df), 23)
+        self.assertTrue(reports[-1].over_ceiling)
+        self.assertGreaterEqual(reports[-1].peak_bytes, max(r.est_bytes for r in reports))
+
+
+if __name__ == '__main__':
+    unittest.main()
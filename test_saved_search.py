@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_saved_search
+from app_course_store import CourseStore
+from app_saved_search import (
+    SavedSearch,
+    list_saved_searches,
+    put_saved_search,
+    query_from_dict,
+    query_to_dict,
+    refresh_saved_searches,
+    saved_query,
+)
+from app_search import SearchQuery
+
+
+def _frame(not_full):
+    return pd.DataFrame({
+        "開課序號": ["0010", "0020", "0030", "0040"],
+        "開課代碼": ["CSU0001", "MAU0002", "CSU0003", "PEU0004"],
+        "系所": ["資工系", "數學系", "資工系", "體育室"],
+        "中文課程名稱": ["程式設計", "微積分", "資料結構", "籃球"],
+        "教師": ["王小明", "李大華", "王大同", "陳一"],
+        "_cid": [10, 20, 30, 40],
+        "_mask_lo": np.array([2, 4, 1 << 16, 0], dtype=np.uint64),
+        "_mask_hi": np.zeros(4, dtype=np.uint64),
+        "_tba": [False, False, False, True],
+        "_slots": [["一-1"], ["一-2"], ["二-1"], []],
+        "_not_full": not_full,
+    })
+
+
+def _store(not_full):
+    return CourseStore(_frame(not_full))
+
+
+class TestSavedSearch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        for user in ("amy", "bob"):
+            os.makedirs(os.path.join(root, user))
+        self.patches = [
+            mock.patch.object(app_saved_search, "user_root_dir", lambda _p: root),
+            mock.patch.object(app_saved_search, "list_all_users", lambda _p: sorted(os.listdir(root))),
+        ]
+        for p in self.patches:
+            p.start()
+        self.root = root
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_query_round_trip(self):
+        q = SearchQuery(full="王", dept="資工系、數學系", sel_lo=1 << 63, free_days=(0, 4), not_full=True, exclude_ids=(10,))
+        self.assertEqual(query_from_dict(query_to_dict(q)), q)
+        self.assertEqual(saved_query(q).exclude_ids, ())
+        self.assertEqual(query_from_dict({"teacher": "王", "unknown": 1}), SearchQuery(teacher="王"))
+
+    def test_refresh_reports_new_matches(self):
+        amy = os.path.join(self.root, "amy")
+        bob = os.path.join(self.root, "bob")
+        put_saved_search(amy, SavedSearch("王老師有名額", SearchQuery(teacher="王", not_full=True), (10,)))
+        put_saved_search(bob, SavedSearch("資工", SearchQuery(dept="資工系"), (10, 30)))
+
+        reports = refresh_saved_searches("", _store([True, False, True, True]))
+        self.assertEqual([(r.user, r.name, r.new_cids, r.total) for r in reports], [("amy", "王老師有名額", (30,), 2)])
+        self.assertEqual(list_saved_searches(amy)[0].last_cids, (10, 30))
+        self.assertTrue(list_saved_searches(amy)[0].evaluated_at)
+
+        # Already reported matches are not reported again
+        self.assertEqual(refresh_saved_searches("", _store([True, False, True, True])), [])
+
+
+    def test_duplicate_cid_reported_once(self):
+        amy = os.path.join(self.root, "amy")
+        put_saved_search(amy, SavedSearch("資工", SearchQuery(dept="資工系")))
+        df = _frame([True, True, True, True])
+        # Two courses share 開課序號 0030
+        store = CourseStore(pd.concat([df, df.iloc[[2]].assign(中文課程名稱="資料結構實習")], ignore_index=True))
+
+        reports = refresh_saved_searches("", store)
+        self.assertEqual([(r.new_cids, r.total) for r in reports], [((10, 30), 2)])
+        self.assertEqual(list_saved_searches(amy)[0].last_cids, (10, 30))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,311 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_constants import GENED_CORE_OPTIONS
+from app_course_store import CourseStore
+from app_search import (
+    MATCH_CONTAINED,
+    SPECIAL_GENED,
+    SPECIAL_SPORT,
+    SPECIAL_TEACHING,
+    ResultCache,
+    SearchCancelled,
+    SearchEngine,
+    SearchQuery,
+    parse_serial_ids,
+    query_narrows,
+    query_sources,
+    split_choices,
+)
+
+
+class TestSearchEngine(unittest.TestCase):
+    def setUp(self):
+        core_bit = 1 << GENED_CORE_OPTIONS.index("自然科學")
+        df = pd.DataFrame({
+            "開課序號": ["0010", "0020", "0030", "0040", "0050"],
+            "開課代碼": ["CSU0001", "MAU0002", "GEU0003", "PEU0004", "EDU0005"],
+            "系所": ["資工系", "數學系", "通識", "體育室", "師培學院"],
+            "中文課程名稱": ["程式設計", "微積分", "宇宙[通識：自然科學]", "籃球", "教育概論"],
+            "教師": ["王小明", "李大華", "王大同", "陳一", "林二"],
+            "學分": [3.0, 3.0, 2.0, 1.0, 2.0],
+            "_cid": [10, 20, 30, 40, 50],
+            # 一-1, 一-2, 二-1, TBA, 一-1 + 一-2
+            "_mask_lo": np.array([2, 4, 1 << 16, 0, 6], dtype=np.uint64),
+            "_mask_hi": np.zeros(5, dtype=np.uint64),
+            "_tba": [False, False, False, True, False],
+            "_slots": [["一-1"], ["一-2"], ["二-1"], [], ["一-1", "一-2"]],
+            "_gened_mask": np.array([0, 0, core_bit, 0, 0], dtype=np.uint32),
+            "_is_teaching": [False, False, False, False, True],
+            "_is_sport": [False, False, False, True, False],
+            "_not_full": [True, False, True, True, True],
+        })
+        self.df = df
+        self.store = CourseStore(df)
+        self.engine = SearchEngine(self.store)
+
+    def cids(self, **kw):
+        res = self.engine.search(SearchQuery(**kw))
+        return self.store.cid[res.rows].tolist()
+
+    def test_basic_filters(self):
+        self.assertEqual(self.cids(), [10, 20, 30, 50])
+        self.assertEqual(self.cids(show_tba=True), [10, 20, 30, 40, 50])
+        self.assertEqual(self.cids(full="王"), [10, 30])
+        self.assertEqual(self.cids(full="王 程式"), [10])
+        self.assertEqual(self.cids(code="csu mau"), [])
+        self.assertEqual(self.cids(cname="微"), [20])
+        self.assertEqual(self.cids(teacher="大"), [20, 30])
+        self.assertEqual(self.cids(serial="0020, 30，99"), [20, 30])
+        self.assertEqual(self.cids(dept="數學系"), [20])
+        self.assertEqual(self.cids(dept="系"), [10, 20])
+        self.assertEqual(self.cids(dept="(全部)"), [10, 20, 30, 50])
+        self.assertEqual(self.cids(not_full=True), [10, 30, 50])
+        self.assertEqual(self.cids(exclude_ids=(10, 50)), [20, 30])
+
+    def test_special_filters(self):
+        self.assertEqual(self.cids(special=SPECIAL_GENED), [30])
+        self.assertEqual(self.cids(special=SPECIAL_GENED, gened_core="所有通識", dept="數學系"), [30])
+        self.assertEqual(self.cids(special=SPECIAL_GENED, gened_core="人文藝術"), [])
+        self.assertEqual(self.cids(special=SPECIAL_SPORT, show_tba=True), [40])
+        self.assertEqual(self.cids(special=SPECIAL_TEACHING), [50])
+        self.assertEqual(self.cids(special=SPECIAL_TEACHING, dept="資工系"), [])
+
+    def test_bitmap_filters(self):
+        # 系所子字串 = 多個系所點陣的 OR；排除已選 / 隱藏 TBA 為 ANDNOT
+        self.assertEqual(self.cids(dept="系", show_tba=True), [10, 20])
+        self.assertEqual(self.cids(dept="系", exclude_ids=(10,)), [20])
+        self.assertEqual(self.cids(exclude_ids=(20, 30), show_tba=True, not_full=True), [10, 40, 50])
+        res = self.engine.search(SearchQuery(serial="0040"))
+        self.assertEqual(res.rows.tolist(), [])
+        self.assertEqual(res.executed, ("serial", "hide_tba"))
+
+    def test_multi_select_dept_and_core(self):
+        self.assertEqual(self.cids(dept="資工系、數學系"), [10, 20])
+        self.assertEqual(self.cids(dept="資工, 師培"), [10, 50])
+        self.assertEqual(self.cids(dept="(全部)、數學系"), [20])
+        self.assertEqual(self.cids(special=SPECIAL_GENED, gened_core="人文藝術、自然科學"), [30])
+        self.assertEqual(self.cids(special=SPECIAL_GENED, gened_core="人文藝術、社會科學"), [])
+        self.assertEqual(self.cids(special=SPECIAL_GENED, gened_core="人文藝術、所有通識"), [30])
+        self.assertEqual(split_choices(" 資工系、,數學系，資工系 ", "(全部)"), ("資工系", "數學系"))
+
+    def test_time_filters(self):
+        self.assertEqual(self.cids(sel_lo=2), [10, 50])
+        self.assertEqual(self.cids(sel_lo=6, match_mode=MATCH_CONTAINED), [10, 20, 50])
+        self.assertEqual(self.cids(sel_lo=6, match_mode=MATCH_CONTAINED, show_tba=True), [10, 20, 40, 50])
+        # Conflicts with 一-1; TBA rows never conflict
+        self.assertEqual(self.cids(conflict_ids=(10,), show_tba=True), [20, 30, 40])
+
+    def test_day_period_filters(self):
+        self.assertEqual(self.cids(free_days=(0,)), [30])
+        self.assertEqual(self.cids(free_days=(1, 5)), [10, 20, 50])
+        self.assertEqual(self.cids(start_period=2), [20])
+        self.assertEqual(self.cids(end_period=1), [10, 30])
+        self.assertEqual(self.cids(max_daily=1, show_tba=True), [10, 20, 30, 40])
+        self.assertTrue(query_narrows(SearchQuery(free_days=(1,)), SearchQuery(free_days=(1, 5), start_period=2)))
+        self.assertTrue(query_narrows(SearchQuery(end_period=5, max_daily=3), SearchQuery(end_period=4, max_daily=2)))
+        self.assertFalse(query_narrows(SearchQuery(end_period=5), SearchQuery()))
+        self.assertFalse(query_narrows(SearchQuery(start_period=3), SearchQuery(start_period=2)))
+
+    def test_structured_full_text(self):
+        self.assertEqual(self.cids(full="teacher:王"), [10, 30])
+        self.assertEqual(self.cids(full="-teacher:王"), [20, 50])
+        self.assertEqual(self.cids(full="dept:系 code:mau"), [20])
+        self.assertEqual(self.cids(full="name:宇宙 王"), [30])
+        self.assertEqual(self.cids(full="credit>=3"), [10, 20])
+        self.assertEqual(self.cids(full="學分<3 -day:二"), [50])
+        self.assertEqual(self.cids(full="day:一 period:2"), [20, 50])
+        # Unknown fields and malformed values stay plain substrings
+        self.assertEqual(self.cids(full="period:z"), [])
+        names = [s.name for s in self.engine.plan(SearchQuery(full="王 teacher:王 credit>=3 -day:五"))]
+        self.assertEqual(names, ["credit>=3", "hide_tba", "-day:五", "teacher:王", "full:王"])
+
+        self.assertTrue(query_narrows(SearchQuery(full="teacher:王"), SearchQuery(full="teacher:王大 -day:五")))
+        self.assertFalse(query_narrows(SearchQuery(full="teacher:王"), SearchQuery(full="王大")))
+        self.assertFalse(query_narrows(SearchQuery(full="-王"), SearchQuery(full="-王大")))
+        self.assertFalse(query_narrows(SearchQuery(full="credit>=2"), SearchQuery(full="credit>=3")))
+
+    def test_suggest_typos(self):
+        got = self.engine.suggest(SearchQuery(teacher="王小民", cname="程式涉計", full="teacher:李大化 -王"))
+        self.assertEqual([(s.box, s.token, s.value) for s in got], [
+            ("teacher", "王小民", "王小明"),
+            ("cname", "程式涉計", "程式設計"),
+            ("full", "teacher:李大化", "teacher:李大華"),
+        ])
+        self.assertEqual(self.store.cid[got[0].rows].tolist(), [10])
+        # Exact values are not suggestions
+        self.assertEqual(self.engine.suggest(SearchQuery(teacher="王小明")), ())
+
+    def test_relevance_ranking(self):
+        store = CourseStore(pd.DataFrame({
+            "開課序號": ["0001", "0002", "0003", "0004"],
+            "開課代碼": ["CSU01011", "CSU0101", "MAU0003", "MAU0004"],
+            "中文課程名稱": ["演算法", "程式設計與資料結構", "資料結構", "統計"],
+            "教師": ["林資料", "王", "李", "陳"],
+            "_cid": [1, 2, 3, 4],
+            "_mask_lo": np.full(4, 2, dtype=np.uint64),
+            "_mask_hi": np.zeros(4, dtype=np.uint64),
+        }))
+        engine = SearchEngine(store)
+
+        def ranked(**kw):
+            return store.cid[engine.search(SearchQuery(**kw)).rows].tolist()
+
+        # Name prefix > name substring > all-text only
+        self.assertEqual(ranked(full="資料"), [3, 2, 1])
+        # Exact course code / serial first
+        self.assertEqual(ranked(full="csu0101"), [2, 1])
+        self.assertEqual(ranked(full="0004 ", show_tba=True), [4])
+        self.assertEqual(ranked(cname="資料"), [3, 2])
+        # No text: catalog order; cached and refined results keep the ranking
+        self.assertEqual(ranked(), [1, 2, 3, 4])
+        self.assertEqual(ranked(full="資料"), [3, 2, 1])
+        res = engine.search(SearchQuery(full="資料 結構"))
+        self.assertTrue(res.refined)
+        self.assertEqual(store.cid[res.rows].tolist(), [3, 2])
+
+    def test_plan_order_and_short_circuit(self):
+        q = SearchQuery(full="程式", teacher="王", not_full=True, sel_lo=2)
+        names = [s.name for s in self.engine.plan(q)]
+        self.assertEqual(names, ["not_full", "hide_tba", "time", "teacher", "full:程式"])
+
+        res = self.engine.search(SearchQuery(serial="99", full="程式", cname="x"))
+        self.assertEqual(res.rows.size, 0)
+        self.assertEqual(res.executed, ("serial",))
+        self.assertIn("full:程式", res.skipped)
+        self.assertIn("cname", res.skipped)
+
+    def test_search_many_matches_single_searches(self):
+        queries = [
+            SearchQuery(dept="資工系、數學系", not_full=True),
+            SearchQuery(teacher="王", not_full=True),
+            SearchQuery(full="王 -程式", show_tba=True),
+            SearchQuery(full="王", sel_lo=2),
+            SearchQuery(cname="程式", full="王"),
+            SearchQuery(serial="0040"),
+            SearchQuery(),
+        ]
+        batch = self.engine.search_many(queries)
+        for q, res in zip(queries, batch):
+            single = SearchEngine(self.store).search(q)
+            self.assertEqual(res.rows.tolist(), single.rows.tolist())
+            self.assertEqual(res.executed, single.executed)
+        self.assertEqual(self.engine.search_many([]), [])
+
+    def test_query_is_hashable_signature(self):
+        self.assertEqual(SearchQuery(full="a", exclude_ids=(1, 2)), SearchQuery(full="a", exclude_ids=(1, 2)))
+        self.assertEqual(len({SearchQuery(), SearchQuery(), SearchQuery(show_tba=True)}), 2)
+        self.assertEqual(parse_serial_ids("1,x 2，3"), (1, 2, 3))
+
+    def test_query_narrows(self):
+        base = SearchQuery(full="王", cname="程", sel_lo=6, match_mode=MATCH_CONTAINED)
+        self.assertTrue(query_narrows(SearchQuery(), base))
+        self.assertTrue(query_narrows(base, SearchQuery(full="王小 x", cname="程式", sel_lo=2, match_mode=MATCH_CONTAINED)))
+        self.assertTrue(query_narrows(base, SearchQuery(full="王", cname="程", sel_lo=6, match_mode=MATCH_CONTAINED, not_full=True)))
+        self.assertFalse(query_narrows(base, SearchQuery(full="小", cname="程", sel_lo=6, match_mode=MATCH_CONTAINED)))
+        self.assertFalse(query_narrows(base, SearchQuery(full="王", cname="程", sel_lo=14, match_mode=MATCH_CONTAINED)))
+        self.assertFalse(query_narrows(base, SearchQuery(full="王", cname="程", sel_lo=6)))
+        self.assertFalse(query_narrows(SearchQuery(), SearchQuery(show_tba=True)))
+        self.assertTrue(query_narrows(SearchQuery(exclude_ids=(1,)), SearchQuery(exclude_ids=(1, 2))))
+        self.assertFalse(query_narrows(SearchQuery(serial="1 2"), SearchQuery()))
+        self.assertTrue(query_narrows(SearchQuery(serial="1 2"), SearchQuery(serial="2")))
+        # Substring dept narrows to longer text; an exact dept only to itself
+        self.assertTrue(query_narrows(SearchQuery(dept="資"), SearchQuery(dept="資工系"), lambda d: d == "資工系"))
+        self.assertFalse(query_narrows(SearchQuery(dept="資工系"), SearchQuery(dept="資工系x"), lambda d: d == "資工系"))
+        # Multi-select: dropping a value narrows, adding one does not
+        self.assertTrue(query_narrows(SearchQuery(dept="資工系、數學系"), SearchQuery(dept="數學系"), lambda d: True))
+        self.assertFalse(query_narrows(SearchQuery(dept="數學系"), SearchQuery(dept="數學系、資工系"), lambda d: True))
+        gened = SearchQuery(special=SPECIAL_GENED, gened_core="人文藝術、自然科學")
+        self.assertTrue(query_narrows(gened, SearchQuery(special=SPECIAL_GENED, gened_core="自然科學")))
+        self.assertFalse(query_narrows(gened, SearchQuery(special=SPECIAL_GENED, gened_core="所有通識")))
+
+    def test_refinement_matches_fresh_search(self):
+        typed = [SearchQuery(teacher="王"), SearchQuery(teacher="王大"), SearchQuery(teacher="王大", not_full=True),
+                 SearchQuery(teacher="王"), SearchQuery(teacher="王", full="宇宙")]
+        refined = []
+        for q in typed:
+            res = self.engine.search(q)
+            refined.append(res.refined)
+            self.assertEqual(res.rows.tolist(), SearchEngine(self.store).search(q).rows.tolist())
+        self.assertEqual(refined, [False, True, True, False, True])
+        # Unchanged steps are not re-evaluated on the previous result
+        self.assertEqual(self.engine.search(SearchQuery(teacher="王", full="宇宙", cname="宙")).executed, ("cname",))
+
+    def test_result_cache(self):
+        first = self.engine.search(SearchQuery(teacher="王"))
+        self.engine.search(SearchQuery(teacher="王", not_full=True))
+        again = self.engine.search(SearchQuery(teacher="王"))
+        self.assertTrue(again.cached)
+        self.assertIs(again.rows, first.rows)
+        self.assertFalse(again.rows.flags.writeable)
+
+        # A hit is not planned; refining from it still skips the already applied steps
+        planned = []
+        plan = self.engine.plan
+        self.engine.plan = lambda q: planned.append(q) or plan(q)
+        self.assertTrue(self.engine.search(SearchQuery(teacher="王")).cached)
+        self.assertEqual(planned, [])
+        refined = self.engine.search(SearchQuery(teacher="王", cname="程"))
+        self.assertTrue(refined.refined)
+        self.assertEqual(refined.executed, ("cname",))
+        del self.engine.plan
+
+        # The selection is part of the query: a changed selection never hits the old entry
+        self.engine.search(SearchQuery(conflict_ids=(10,)))
+        self.assertFalse(self.engine.search(SearchQuery(conflict_ids=(10, 20))).cached)
+        self.assertTrue(self.engine.search(SearchQuery(conflict_ids=(10,))).cached)
+
+    def test_cancelled_search_leaves_no_state(self):
+        q = SearchQuery(teacher="王", full="宇宙")
+        with self.assertRaises(SearchCancelled):
+            self.engine.search(q, cancelled=lambda: True)
+        self.assertEqual(len(self.engine.cache), 0)
+
+        # Cancel between steps: the first step ran, nothing after it
+        calls = []
+        with self.assertRaises(SearchCancelled):
+            self.engine.search(q, cancelled=lambda: calls.append(1) or len(calls) > 1)
+        self.assertEqual(len(calls), 2)
+        res = self.engine.search(q, cancelled=lambda: False)
+        self.assertFalse(res.refined)
+        self.assertEqual(self.store.cid[res.rows].tolist(), [30])
+
+    def test_rebind_keeps_unaffected_cache(self):
+        self.assertEqual(query_sources(SearchQuery(teacher="王", show_tba=True)), frozenset({"teacher"}))
+        self.assertEqual(query_sources(SearchQuery(full="餘額>0 day:一", show_tba=True)), frozenset({"seats_left", "slots"}))
+        self.engine.search(SearchQuery(teacher="王", show_tba=True))
+        self.engine.search(SearchQuery(not_full=True, show_tba=True))
+
+        # Enrollment changed for cid 20: only the not_full result depends on it
+        new = CourseStore(self.df.assign(_not_full=[True] * 5))
+        self.assertEqual(self.engine.rebind(new, frozenset({"not_full"})), 1)
+        self.assertIs(self.engine.store, new)
+        self.assertTrue(self.engine.search(SearchQuery(teacher="王", show_tba=True)).cached)
+        res = self.engine.search(SearchQuery(not_full=True, show_tba=True))
+        self.assertFalse(res.cached)
+        self.assertEqual(new.cid[res.rows].tolist(), [10, 20, 30, 40, 50])
+
+    def test_result_cache_evicts_by_bytes(self):
+        cache = ResultCache(max_bytes=2 * (256 + 400))
+        for i in range(3):
+            cache.put(SearchQuery(full=str(i)), np.zeros(100, dtype=np.int32))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(SearchQuery(full="0")))
+        cache.get(SearchQuery(full="1"))
+        cache.put(SearchQuery(full="3"), np.zeros(100, dtype=np.int32))
+        self.assertIsNotNone(cache.get(SearchQuery(full="1")))
+        self.assertIsNone(cache.get(SearchQuery(full="2")))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        cache.put(SearchQuery(full="big"), np.zeros(10_000, dtype=np.int32))
+        self.assertIsNone(cache.get(SearchQuery(full="big")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_slot_index import SLOT_BITS, SlotBitmapIndex
+
+
+def _random_masks(rng, n):
+    lo = np.zeros(n, dtype=np.uint64)
+    hi = np.zeros(n, dtype=np.uint64)
+    for r in range(n):
+        for b in rng.choice(SLOT_BITS, size=rng.integers(0, 5), replace=False):
+            if b < 64:
+                lo[r] |= np.uint64(1) << np.uint64(b)
+            else:
+                hi[r] |= np.uint64(1) << np.uint64(b - 64)
+    return lo, hi
+
+
+class TestSlotBitmapIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.rng = rng
+        # 130 rows: the last packed word is partial
+        self.lo, self.hi = _random_masks(rng, 130)
+        self.tba = (self.lo | self.hi) == 0
+        self.tba[::3] = False
+        self.index = SlotBitmapIndex(self.lo, self.hi, self.tba)
+
+    def selections(self):
+        yield 0, 0
+        yield 1 << 16, 0
+        # Small selections take the candidate path, large ones the complement path
+        for k in (1, 3, 20, 80, SLOT_BITS):
+            bits = self.rng.choice(SLOT_BITS, size=k, replace=False)
+            yield sum(1 << int(b) for b in bits if b < 64), sum(1 << int(b - 64) for b in bits if b >= 64)
+
+    def test_matches_mask_arithmetic(self):
+        lo, hi = self.lo, self.hi
+        for sel_lo, sel_hi in self.selections():
+            s_lo, s_hi = np.uint64(sel_lo), np.uint64(sel_hi)
+            overlap = ((lo & s_lo) != 0) | ((hi & s_hi) != 0)
+            contained = ((lo & ~s_lo) == 0) & ((hi & ~s_hi) == 0)
+            free = (((lo & s_lo) == 0) & ((hi & s_hi) == 0)) | self.tba
+            self.assertEqual(self.index.overlaps(sel_lo, sel_hi).tolist(), overlap.tolist())
+            self.assertEqual(self.index.contained(sel_lo, sel_hi).tolist(), contained.tolist())
+            self.assertEqual(self.index.free_of(sel_lo, sel_hi).tolist(), free.tolist())
+
+    def test_empty_catalog(self):
+        empty = np.zeros(0, dtype=np.uint64)
+        index = SlotBitmapIndex(empty, empty, np.zeros(0, dtype=bool))
+        self.assertEqual(index.overlaps(3, 0).size, 0)
+        self.assertEqual(index.contained(3, 0).size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_excel import _build_courses_df_from_raw
+from app_snapshot import load_snapshot, save_snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        raw = pd.DataFrame({
+            "開課序號": ["0012", "3", "x", "0040"],
+            "開課代碼": ["CSU0001", "MAU0002", "", "GU0003"],
+            "系所": ["資工系", "數學系", "", "通識"],
+            "中文課程名稱": ["程式設計", "微積分", "", "自然與科學[通識：自然科學 邏輯運算]"],
+            "教師": ["王小明", "李大華", "", "陳"],
+            "學分": [3, 2.5, None, 2],
+            "必/選": ["必", "選", "", "選"],
+            "全/半": ["半", "全", "", "半"],
+            "地點時間": ["一 3-4 公館", "", "", "五 A-B"],
+            "限修人數": [50, 40, None, 60],
+            "選修人數": [10, 40, None, 0],
+            "備註": [None, "英語授課", None, None],
+        })
+        self.df = _build_courses_df_from_raw(raw)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        snap_dir = Path(self.tmp.name) / "snap"
+        save_snapshot(self.df, "課程", snap_dir, "abc")
+        loaded = load_snapshot(snap_dir, "abc")
+        self.assertIsNotNone(loaded)
+        df, sheet = loaded
+        self.assertEqual(sheet, "課程")
+        self.assertEqual(list(df.columns), list(self.df.columns))
+        for col in self.df.columns:
+            self.assertTrue(df[col].equals(self.df[col]), col)
+        self.assertEqual(df["_mask_lo"].dtype, np.uint64)
+        row = int(np.flatnonzero(df["_cid"].to_numpy() == 12)[0])
+        self.assertEqual(df.loc[row, "_slots_set"], {"一-3", "一-4"})
+        self.assertTrue(pd.isna(df.loc[row, "備註"]))
+
+    def test_digest_mismatch_is_miss(self):
+        snap_dir = Path(self.tmp.name) / "snap"
+        save_snapshot(self.df, "課程", snap_dir, "abc")
+        self.assertIsNone(load_snapshot(snap_dir, "def"))
+        self.assertIsNone(load_snapshot(Path(self.tmp.name) / "missing", "abc"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_course_store import contains_mask
+from app_text_index import BigramIndex
+
+
+class TestBigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.values = np.array(["程式設計(一)", "微積分", "", "ab ba", "aba", "設計思考 程式", "王小明 3"], dtype=object)
+        self.index = BigramIndex(self.values)
+
+    def test_matches_linear_scan(self):
+        for tok in ["程式", "程", "設計", "程式設計", "aba", "ab", "a", " ", "3", "計思", "zz", "積分x"]:
+            self.assertEqual(self.index.contains(tok).tolist(), contains_mask(self.values, tok).tolist(), tok)
+
+    def test_rows_restriction(self):
+        rows = np.array([0, 3, 4, 5])
+        self.assertEqual(self.index.lookup("程式", rows).tolist(), [0, 5])
+        self.assertEqual(self.index.contains("ab", rows).tolist(), [False, True, True, False])
+        self.assertEqual(self.index.contains("", rows).tolist(), [True] * 4)
+
+    def test_postings_are_sorted_int32(self):
+        hits = self.index.lookup("a")
+        self.assertEqual(hits.dtype, np.int32)
+        self.assertEqual(hits.tolist(), [3, 4])
+        self.assertEqual(len(BigramIndex(np.array([], dtype=object)).lookup("a")), 0)
+
+    def test_with_rows_matches_rebuild(self):
+        values = self.values.copy()
+        values[[1, 4]] = ["微分方程", "ab 程式"]
+        patched = self.index.with_rows(values, np.array([1, 4]))
+        fresh = BigramIndex(values)
+        self.assertEqual(patched._keys.tolist(), fresh._keys.tolist())
+        self.assertEqual(patched._offsets.tolist(), fresh._offsets.tolist())
+        self.assertEqual(patched._rows.tolist(), fresh._rows.tolist())
+        self.assertEqual(patched.lookup("程式").tolist(), [0, 4, 5])
+        self.assertEqual(self.index.lookup("積分").tolist(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+# Ensure we can import from the parent directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_parse_pool import parse_unique_values, shutdown_parse_pool
+from app_utils import (
+    _slot_sort_key,
+    compile_time_texts,
+    free_on_days,
+    masks_to_day_periods,
+    max_periods_per_day,
+    no_period_after,
+    no_period_before,
+    parse_time_text,
+    slots_set_to_masks,
+)
+
+BUNDLED_XLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_data", "course_inputs", "2025_1_16_課程.xls")
+
+
+class TestCompileTimeTexts(unittest.TestCase):
+    def assert_matches_reference(self, texts):
+        compiled = compile_time_texts(texts)
+        for i, text in enumerate(texts):
+            ref = parse_time_text(text)
+            lo, hi = slots_set_to_masks(ref.slots)
+            self.assertEqual(int(compiled.mask_lo[i]), int(lo), text)
+            self.assertEqual(int(compiled.mask_hi[i]), int(hi), text)
+            self.assertEqual(bool(compiled.tba[i]), ref.tba, text)
+            self.assertEqual(compiled.slot_names(i), sorted(ref.slots, key=_slot_sort_key), text)
+
+    def test_edge_cases(self):
+        self.assert_matches_reference([
+            "", "nan", None, "   ", "x", "一",
+            "三 10-A 公衛213", "四 4-2", "五 D-10", "一 a-b",
+            "一 3 ,二 4；三 5", "一 6-7 新物716, 五 3-4 新物716",
+            "天 3", "日天 3-4", "一 -3", "二 3-", "一3-１", "一　3",
+        ])
+
+    def test_index_arrays(self):
+        compiled = compile_time_texts(["二 3-4", "", "日 D"])
+        self.assertEqual(compiled.slot_offsets.tolist(), [0, 2, 2, 3])
+        self.assertEqual(compiled.slot_day.tolist(), [1, 1, 6])
+        self.assertEqual(compiled.slot_period.tolist(), [3, 4, 14])
+        self.assertEqual(compiled.mask_lo.dtype, np.uint64)
+
+    def test_unmapped_single_period_is_dropped(self):
+        # parse_time_text keeps "一-１" even though no timetable cell exists for it
+        compiled = compile_time_texts(["一 １"])
+        self.assertEqual(compiled.slot_names(0), [])
+        self.assertTrue(compiled.tba[0])
+
+    @unittest.skipUnless(os.path.exists(BUNDLED_XLS), "bundled catalog not available")
+    def test_bundled_catalog(self):
+        raw = pd.read_excel(BUNDLED_XLS, usecols=["地點時間"])
+        texts = list(raw["地點時間"].fillna("").astype(str).str.strip().unique())
+        self.assert_matches_reference(texts)
+
+    def test_day_periods(self):
+        # 五 straddles the lo/hi boundary (bits 60..74)
+        compiled = compile_time_texts(["五 0", "五 10-A", "日 D", "一 1-3, 三 2", ""])
+        dp = masks_to_day_periods(compiled.mask_lo, compiled.mask_hi)
+        self.assertEqual(dp.shape, (5, 7))
+        self.assertEqual(dp[:, 4].tolist(), [1, (1 << 10) | (1 << 11), 0, 0, 0])
+        self.assertEqual(dp[2, 6], 1 << 14)
+        self.assertEqual(dp[3].tolist(), [0b1110, 0, 0b100, 0, 0, 0, 0])
+        self.assertEqual(free_on_days(dp, [4]).tolist(), [False, False, True, True, True])
+        self.assertEqual(no_period_before(dp, 2).tolist(), [False, True, True, False, True])
+        self.assertEqual(no_period_after(dp, 10).tolist(), [True, False, False, True, True])
+        self.assertEqual(max_periods_per_day(dp).tolist(), [1, 2, 1, 3, 0])
+
+    def test_sharded_parse_matches_serial(self):
+        times = ["二 3-4", "", "日 D", "一 6-7 新物716, 五 3-4 新物716", "x"] * 3
+        names = ["哲學[通識：人文藝術 邏輯運算]", "程式設計", "【通識：自然科學】微積分"]
+        serial = parse_unique_values(times, names, workers=1)
+        try:
+            sharded = parse_unique_values(times, names, workers=2, min_unique=0)
+        finally:
+            shutdown_parse_pool()
+        for field in ("mask_lo", "mask_hi", "tba", "slot_offsets", "slot_day", "slot_period"):
+            self.assertEqual(getattr(serial[0], field).tolist(), getattr(sharded[0], field).tolist(), field)
+        self.assertEqual(serial[1].tolist(), sharded[1].tolist())
+        self.assertEqual(serial[1].tolist()[1], 0)
+        self.assertNotEqual(serial[1].tolist()[0], 0)
+
+
+    def test_cold_pool_needs_large_input(self):
+        import app_parse_pool
+
+        shutdown_parse_pool()
+        with mock.patch.object(app_parse_pool, "_get_pool") as get_pool:
+            parse_unique_values(["一 1"] * 100, ["x"], workers=2)
+        # Too few values to pay for spawning the pool: parsed in this process
+        get_pool.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import pandas as pd
 # Ensure we can import from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app_course_store import CourseStore
 from app_timetable_logic import occupied_masks_from_arrays, build_lane_assignment_sorted
 
 class TestTimetableLogic(unittest.TestCase):
@@ -35,6 +36,7 @@ class TestTimetableLogic(unittest.TestCase):
             "中文課程名稱": ["C1", "C2", "C3", "C4"],
             "_tt_label": ["C1\n0010", "C2\n0020", "C3\n0030", "C4\n0040"]
         })
+        self.store = CourseStore(self.df)
 
     def test_occupied_masks_from_arrays(self):
         # Test subset: 10 and 20
@@ -58,7 +60,7 @@ class TestTimetableLogic(unittest.TestCase):
         # Test 10 and 30 (Conflict on Mon-1)
         # Should result in 2 lanes
         included = np.array([10, 30], dtype=np.int64)
-        lane_map, max_lane = build_lane_assignment_sorted(self.df, included, None)
+        lane_map, max_lane = build_lane_assignment_sorted(self.store, included)
         self.assertEqual(max_lane, 2)
         self.assertEqual(len(lane_map), 2)
         self.assertNotEqual(lane_map[10], lane_map[30])
@@ -66,7 +68,7 @@ class TestTimetableLogic(unittest.TestCase):
         # Test 10 and 20 (No conflict)
         # Should result in 1 lane
         included = np.array([10, 20], dtype=np.int64)
-        lane_map, max_lane = build_lane_assignment_sorted(self.df, included, None)
+        lane_map, max_lane = build_lane_assignment_sorted(self.store, included)
         self.assertEqual(max_lane, 1)
         self.assertEqual(lane_map[10], 1)
         self.assertEqual(lane_map[20], 1)